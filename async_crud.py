@@ -0,0 +1,93 @@
+"""
+Async CRUD operations for the hot read paths
+Mirrors crud.py for AsyncSession. Queries are built by the shared statement
+builders in crud.py so both paths stay in sync; writes reuse crud's message
+building and stats bookkeeping via run_sync.
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+import models
+import crud
+
+# === Session Operations ===
+
+async def get_session(db: AsyncSession, session_id: str) -> Optional[models.Session]:
+    """Get a session by ID"""
+    return await db.get(models.Session, session_id)
+
+async def get_user_sessions(db: AsyncSession, user_id: Optional[str] = None, limit: int = 50) -> List[models.Session]:
+    """Get all sessions for a user, ordered by most recent"""
+    result = await db.scalars(crud.user_sessions_query(user_id, limit))
+    return list(result)
+
+async def get_user_sessions_with_stats(
+    db: AsyncSession,
+    user_id: Optional[str] = None,
+    limit: int = 50,
+    preview_length: int = 100,
+    before: Optional[str] = None
+) -> List[Tuple[models.Session, int, Optional[str]]]:
+    """
+    Get sessions for a user with message count and first-message preview
+    Returns: list of (session, message_count, preview_or_None)
+    """
+    result = await db.execute(crud.user_sessions_with_stats_query(user_id, limit, preview_length, before))
+    return [(session, int(message_count), preview_text) for session, message_count, preview_text in result.all()]
+
+# === Message Operations ===
+
+async def create_message(
+    db: AsyncSession,
+    session_id: str,
+    role: str,
+    content: str,
+    domain: Optional[str] = None,
+    confidence: Optional[float] = None,
+    sources: Optional[List[str]] = None,
+    status: Optional[str] = None,
+    retrieval_time: Optional[float] = None,
+    generation_time: Optional[float] = None,
+    extra_metadata: Optional[dict] = None
+) -> models.Message:
+    """
+    Create a new message in a session (single commit, stats included)
+    """
+    message = crud.build_message(
+        session_id, role, content, domain, confidence, sources,
+        status, retrieval_time, generation_time, extra_metadata
+    )
+
+    session = await get_session(db, session_id)
+    if session and session.user_id:
+        def record_stats(sync_db):
+            first_in_session = not crud._session_has_messages(sync_db, session_id)
+            crud._record_message_stats(sync_db, session.user_id, [message], first_in_session)
+        await db.run_sync(record_stats)
+
+    db.add(message)
+    if session:
+        session.updated_at = message.timestamp
+    await db.commit()
+
+    return message
+
+async def get_session_messages(db: AsyncSession, session_id: str, limit: int = 100) -> List[models.Message]:
+    """Get all messages for a session, ordered by timestamp"""
+    result = await db.scalars(crud.session_messages_query(session_id, limit))
+    return list(result)
+
+async def get_session_messages_page(
+    db: AsyncSession,
+    session_id: str,
+    limit: int = 50,
+    after: Optional[str] = None
+) -> List[models.Message]:
+    """Get a page of messages for a session (keyset cursor, see crud.get_session_messages_page)"""
+    result = await db.scalars(crud.session_messages_page_query(session_id, limit, after))
+    return list(result)
+
+async def get_message(db: AsyncSession, message_id: str) -> Optional[models.Message]:
+    """Get a specific message"""
+    result = await db.scalars(select(models.Message).where(models.Message.message_id == message_id))
+    return result.first()
@@ -0,0 +1,151 @@
+"""
+Benchmark for concurrent history reads
+Serves the session list and message history through a sync (thread pool +
+Session) and an async (AsyncSession) FastAPI route, drives both with the same
+number of concurrent clients and reports requests/second and latency.
+
+Usage:
+    python benchmarks/bench_history_reads.py [--concurrency 64] [--requests 2000]
+Set DATABASE_URL to benchmark against Postgres (needs asyncpg); defaults to a
+temp SQLite file (needs aiosqlite). The results decide the DB_ASYNC_READS
+default: on for PostgreSQL, off for SQLite.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Both paths are benchmarked, so the async engine is needed whatever the default
+os.environ.setdefault("DB_ASYNC_READS", "true")
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_history.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI
+from database import SessionLocal, engine, get_db, get_async_db, get_async_engine
+import models
+import crud
+import async_crud
+
+BENCH_USER = "bench-history-user"
+
+def seed(sessions: int, messages_per_session: int) -> list:
+    """Create one user with `sessions` sessions; returns their ids"""
+    db = SessionLocal()
+    try:
+        db.query(models.Session).filter(models.Session.user_id == BENCH_USER).delete()
+        db.query(models.User).filter(models.User.user_id == BENCH_USER).delete()
+        db.add(models.User(user_id=BENCH_USER, name="Bench"))
+        db.commit()
+
+        base = datetime.utcnow() - timedelta(days=7)
+        session_ids = []
+        for i in range(sessions):
+            session = models.Session(user_id=BENCH_USER, title=f"Session {i}", updated_at=base + timedelta(hours=i))
+            db.add(session)
+            db.flush()
+            session_ids.append(session.session_id)
+
+        rows = []
+        for session_index, session_id in enumerate(session_ids):
+            for i in range(messages_per_session):
+                rows.append({
+                    "session_id": session_id,
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "content": f"Message {i} about sleep and stress. " * 4,
+                    "timestamp": base + timedelta(hours=session_index, seconds=i),
+                    "message_metadata": {},
+                    "source_document_uids": []
+                })
+        db.bulk_insert_mappings(models.Message, rows)
+        db.commit()
+        return session_ids
+    finally:
+        db.close()
+
+def build_app() -> FastAPI:
+    """Minimal app with the same queries as /api/sessions/list and /messages"""
+    app = FastAPI()
+
+    @app.get("/sync/sessions")
+    def sync_sessions(db = Depends(get_db)):
+        return len(crud.get_user_sessions_with_stats(db, BENCH_USER, 20))
+
+    @app.get("/sync/messages/{session_id}")
+    def sync_messages(session_id: str, db = Depends(get_db)):
+        crud.get_session(db, session_id)
+        return len(crud.get_session_messages_page(db, session_id, 50))
+
+    @app.get("/async/sessions")
+    async def async_sessions(db = Depends(get_async_db)):
+        return len(await async_crud.get_user_sessions_with_stats(db, BENCH_USER, 20))
+
+    @app.get("/async/messages/{session_id}")
+    async def async_messages(session_id: str, db = Depends(get_async_db)):
+        await async_crud.get_session(db, session_id)
+        return len(await async_crud.get_session_messages_page(db, session_id, 50))
+
+    return app
+
+async def run(app: FastAPI, prefix: str, session_ids: list, concurrency: int, total: int) -> dict:
+    """Fire `total` requests (alternating list/history) from `concurrency` clients"""
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    counter = iter(range(total))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for i in counter:
+                if i % 2 == 0:
+                    url = f"{prefix}/sessions"
+                else:
+                    url = f"{prefix}/messages/{session_ids[i % len(session_ids)]}"
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    }
+
+async def main_async(args):
+    app = build_app()
+    session_ids = seed(args.sessions, args.messages)
+
+    # Warm both pools so connection setup isn't measured
+    for prefix in ("/sync", "/async"):
+        await run(app, prefix, session_ids, args.concurrency, args.concurrency * 2)
+
+    print(f"{args.requests} requests, concurrency {args.concurrency} ({engine.url.get_backend_name()})")
+    print(f"  {'path':<8} {'req/s':>9} {'p50':>10} {'p99':>10}")
+    for prefix in ("/sync", "/async"):
+        r = await run(app, prefix, session_ids, args.concurrency, args.requests)
+        print(f"  {prefix[1:]:<8} {r['rps']:9.1f} {r['p50_ms']:8.2f}ms {r['p99_ms']:8.2f}ms")
+
+    await get_async_engine().dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async history reads")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=100, help="Messages per session")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark for cold import time
+Imports each module in a fresh interpreter (as a worker does on cold start)
+and reports the wall time, plus the slowest imports underneath it from
+python -X importtime. API keys are unset by default, so the run also checks
+that the app imports offline.
+
+Compare against an older revision by pointing --tree at a checkout of it:
+    git worktree add /tmp/ombee-before <commit>
+    python benchmarks/bench_import_time.py --tree /tmp/ombee-before --keep-keys
+
+Usage:
+    python benchmarks/bench_import_time.py [--runs 5] [--top 10] [--modules main src.retriever]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["src.config", "src.monitoring", "src.llm", "src.retriever", "main"]
+API_KEYS = ["PINECONE_API_KEY", "COHERE_API_KEY", "GROQ_API_KEY", "PHOENIX_API_KEY"]
+
+def run_import(module: str, tree: str, env: dict, importtime: bool = False):
+    """Import module in a new interpreter; returns (seconds, stderr)"""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", f"import {module}"]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=tree, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        last_line = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+        raise RuntimeError(f"import {module} failed: {last_line}")
+    return elapsed, result.stderr
+
+def slowest_imports(stderr: str, top: int):
+    """(cumulative_us, module) for the slowest imports in -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import time")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list for the last module")
+    parser.add_argument("--tree", default=ROOT, help="Checkout to benchmark (default: this one)")
+    parser.add_argument("--keep-keys", action="store_true", help="Keep API keys from the environment (older trees require them)")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    if not args.keep_keys:
+        for key in API_KEYS:
+            env.pop(key, None)
+
+    # Warm the OS file cache and compile bytecode once so runs compare imports, not disk
+    for module in args.modules:
+        run_import(module, args.tree, dict(env, PYTHONDONTWRITEBYTECODE=""))
+
+    print(f"Cold import times in {args.tree} ({args.runs} runs, keys {'kept' if args.keep_keys else 'unset'})")
+    print(f"  {'module':<20} {'median':>9} {'min':>9}")
+    for module in args.modules:
+        times = [run_import(module, args.tree, env)[0] for _ in range(args.runs)]
+        print(f"  {module:<20} {statistics.median(times) * 1000:7.0f}ms {min(times) * 1000:7.0f}ms")
+
+    _, stderr = run_import(args.modules[-1], args.tree, env, importtime=True)
+    print(f"Slowest imports under {args.modules[-1]} (cumulative):")
+    for microseconds, name in slowest_imports(stderr, args.top):
+        print(f"  {microseconds / 1000:8.1f}ms  {name.strip()}")
+
+if __name__ == "__main__":
+    main()
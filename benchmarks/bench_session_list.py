@@ -0,0 +1,130 @@
+"""
+Benchmark for the session sidebar query (/api/sessions/list)
+Compares the old per-session approach (two message queries per session) with
+crud.get_user_sessions_with_stats on a user with 10k messages. Other users'
+messages are seeded alongside (--users), so a query that aggregates the whole
+messages table is slower than one that only touches this user's sessions.
+
+Usage:
+    python benchmarks/bench_session_list.py [--sessions 50] [--messages 10000] [--users 10]
+Set DATABASE_URL to benchmark against Postgres; defaults to a temp SQLite file.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_sessions.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from database import SessionLocal, engine
+import models
+import crud
+
+BENCH_USER = "bench-session-list-user"
+
+def bench_users(users: int) -> list:
+    """BENCH_USER (the one listed) followed by users - 1 others"""
+    return [BENCH_USER] + [f"{BENCH_USER}-{i}" for i in range(1, users)]
+
+def seed(db, user_id: str, sessions: int, messages: int):
+    """Create a user with `messages` messages spread across `sessions` sessions"""
+    db.query(models.Session).filter(models.Session.user_id == user_id).delete()
+    db.query(models.User).filter(models.User.user_id == user_id).delete()
+    db.add(models.User(user_id=user_id, name="Bench"))
+    db.commit()
+
+    base = datetime.utcnow() - timedelta(days=30)
+    session_ids = []
+    for i in range(sessions):
+        session = models.Session(user_id=user_id, title=f"Session {i}", updated_at=base + timedelta(hours=i))
+        db.add(session)
+        db.flush()
+        session_ids.append(session.session_id)
+
+    rows = []
+    for i in range(messages):
+        rows.append({
+            "session_id": session_ids[i % sessions],
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i} about sleep, stress and nutrition. " * 5,
+            "timestamp": base + timedelta(seconds=i),
+            "message_metadata": {},
+            "source_document_uids": []
+        })
+    db.bulk_insert_mappings(models.Message, rows)
+    db.commit()
+
+def old_list_sessions(db, limit: int):
+    """The previous endpoint logic: N+1 queries and full Message rows for counting"""
+    result = []
+    for session in crud.get_user_sessions(db, BENCH_USER, limit):
+        messages = crud.get_session_messages(db, session.session_id, limit=1)
+        message_count = len(crud.get_session_messages(db, session.session_id, limit=1000))
+        preview = messages[0].content[:100] if messages else "New conversation"
+        result.append((session.session_id, message_count, preview))
+    return result
+
+def new_list_sessions(db, limit: int):
+    return [
+        (session.session_id, message_count, preview or "New conversation")
+        for session, message_count, preview in crud.get_user_sessions_with_stats(db, BENCH_USER, limit)
+    ]
+
+def measure(func, limit: int, repeats: int):
+    """Return (best_seconds, statements_per_call)"""
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        best = float("inf")
+        for _ in range(repeats):
+            db = SessionLocal()
+            try:
+                start = time.perf_counter()
+                func(db, limit)
+                best = min(best, time.perf_counter() - start)
+            finally:
+                db.close()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return best, statements[0] // repeats
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/sessions/list queries")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=10, help="Users seeded with the same sessions/messages each")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for user_id in bench_users(args.users):
+            seed(db, user_id, args.sessions, args.messages)
+    finally:
+        db.close()
+
+    # Sanity check: both approaches agree (the old one caps counts at 1000)
+    if args.messages / args.sessions <= 1000:
+        db = SessionLocal()
+        try:
+            assert sorted(old_list_sessions(db, args.sessions)) == sorted(new_list_sessions(db, args.sessions))
+        finally:
+            db.close()
+
+    print(f"{args.sessions} sessions, {args.messages} messages per user, {args.users} users ({engine.url.get_backend_name()})")
+    for name, func in (("per-session (old)", old_list_sessions), ("aggregated (new)", new_list_sessions)):
+        seconds, statements = measure(func, args.sessions, args.repeats)
+        print(f"  {name:<18} {seconds * 1000:8.1f} ms  {statements:4d} queries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark for persisting one chat turn
+Compares the original write path with crud.create_chat_turn, reporting
+commits, statements and latency per turn. The original path is reproduced
+inline (old_turn / old_create_message), since crud.create_message has changed
+since: per message a session lookup, a first-message check, insert + stats,
+commit, refresh, and a second commit for session.updated_at; plus a separate
+title commit on a session's first turn - on a session factory that expires
+objects on commit, as SessionLocal used to. All turns share one session, so
+--turns 1 shows the first-turn cost.
+
+Usage:
+    python benchmarks/bench_turn_writes.py [--turns 200]
+Set DATABASE_URL to benchmark against Postgres; defaults to a temp SQLite file.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_turns.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from database import SessionLocal, engine
+import models
+import crud
+
+BENCH_USER = "bench-turn-writes-user"
+ASSISTANT_FIELDS = {
+    "domain": "holistic",
+    "confidence": 0.9,
+    "sources": ["sleep_hygiene.txt (score: 0.82)", "stress.txt (score: 0.77)"],
+    "status": "live",
+    "retrieval_time": 0.21,
+    "generation_time": 1.3
+}
+
+# The original session factory (expire_on_commit defaulted to True)
+OldSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def old_create_message(db, session_id: str, role: str, content: str, **fields):
+    """crud.create_message as it was before create_chat_turn: two commits and a refresh"""
+    session = crud.get_session(db, session_id)
+    first_in_session = session is not None and db.query(models.Message.message_id)\
+        .filter(models.Message.session_id == session_id)\
+        .first() is None
+    message = crud.build_message(session_id, role, content, **fields)
+    db.add(message)
+    if session and session.user_id:
+        crud._record_message_stats(db, session.user_id, [message], first_in_session)
+    db.commit()
+    db.refresh(message)
+    if session:
+        session.updated_at = datetime.utcnow()
+        db.commit()
+    return message
+
+def old_turn(db, session_id: str, i: int):
+    """Original /api/chat write path: user message, title commit, assistant message"""
+    session = crud.get_session(db, session_id)
+    old_create_message(db, session_id, "user", f"Question {i}")
+    if not session.title:
+        session.title = f"Question {i}"
+        db.commit()
+    old_create_message(db, session_id, "assistant", f"Answer {i}", **ASSISTANT_FIELDS)
+
+def new_turn(db, session_id: str, i: int):
+    """Single-transaction turn writer"""
+    session = crud.get_session(db, session_id)
+    crud.create_chat_turn(db, session, f"Question {i}", f"Answer {i}", title=f"Question {i}", **ASSISTANT_FIELDS)
+
+def measure(func, turns: int, session_factory=SessionLocal) -> dict:
+    counters = {"commits": 0, "statements": 0}
+
+    def on_commit(conn):
+        counters["commits"] += 1
+
+    def on_statement(*args):
+        counters["statements"] += 1
+
+    db = session_factory()
+    try:
+        session = crud.create_session(db, BENCH_USER)
+        event.listen(engine, "commit", on_commit)
+        event.listen(engine, "before_cursor_execute", on_statement)
+        try:
+            latencies = []
+            for i in range(turns):
+                start = time.perf_counter()
+                func(db, session.session_id, i)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            event.remove(engine, "commit", on_commit)
+            event.remove(engine, "before_cursor_execute", on_statement)
+    finally:
+        db.close()
+
+    latencies.sort()
+    return {
+        "commits": counters["commits"] / turns,
+        "statements": counters["statements"] / turns,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat turn persistence")
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if not crud.get_user(db, BENCH_USER):
+            crud.create_user(db, user_id=BENCH_USER, name="Bench")
+    finally:
+        db.close()
+
+    print(f"{args.turns} turns ({engine.url.get_backend_name()})")
+    print(f"  {'path':<22} {'commits':>8} {'stmts':>7} {'p50':>9} {'mean':>9}")
+    for name, func, factory in (
+        ("per-message (old)", old_turn, OldSessionLocal),
+        ("create_chat_turn (new)", new_turn, SessionLocal)
+    ):
+        r = measure(func, args.turns, factory)
+        print(f"  {name:<22} {r['commits']:8.1f} {r['statements']:7.1f} {r['p50_ms']:7.2f}ms {r['mean_ms']:7.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark for the local vector store
+Builds a LocalVectorStore of random unit vectors (Cohere embed-v3 size) and
+reports query latency for exact search and for the IVF index, plus IVF
+recall@k against the exact results.
+
+Usage:
+    python benchmarks/bench_vector_search.py [--vectors 20000] [--nlist 128] [--nprobe 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from src.vector_store import LocalVectorStore
+
+def clustered_vectors(count: int, dimension: int, clusters: int, rng) -> np.ndarray:
+    """Unit vectors grouped around random topics (closer to real embeddings than uniform noise)"""
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def measure(store: LocalVectorStore, queries: np.ndarray, top_k: int):
+    """Return (p50_ms, p99_ms, result ids per query)"""
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        matches = store.query(query, top_k=top_k)["matches"]
+        latencies.append(time.perf_counter() - start)
+        results.append([match["id"] for match in matches])
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return latencies[len(latencies) // 2] * 1000, p99 * 1000, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local vector search")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=128)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = clustered_vectors(args.vectors, args.dimension, 200, rng)
+    queries = clustered_vectors(args.queries, args.dimension, 200, rng)
+
+    path = tempfile.mkdtemp()
+    store = LocalVectorStore(path, nlist=0)
+    start = time.perf_counter()
+    for offset in range(0, args.vectors, 1000):
+        store.upsert([
+            {"id": f"chunk-{offset + i}", "values": vector, "metadata": {"text": f"chunk {offset + i}"}}
+            for i, vector in enumerate(data[offset:offset + 1000])
+        ])
+    print(f"{args.vectors} x {args.dimension} float32 vectors, loaded in {time.perf_counter() - start:.1f}s")
+
+    exact_p50, exact_p99, exact = measure(store, queries, args.top_k)
+
+    ivf_store = LocalVectorStore(path, nlist=args.nlist, nprobe=args.nprobe)
+    start = time.perf_counter()
+    ivf_store.train()
+    train_seconds = time.perf_counter() - start
+    ivf_p50, ivf_p99, approximate = measure(ivf_store, queries, args.top_k)
+    recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact)])
+
+    print(f"  {'search':<24} {'p50':>9} {'p99':>9}")
+    print(f"  {'exact':<24} {exact_p50:7.2f}ms {exact_p99:7.2f}ms")
+    label = f"ivf nlist={args.nlist} nprobe={args.nprobe}"
+    print(f"  {label:<24} {ivf_p50:7.2f}ms {ivf_p99:7.2f}ms  recall@{args.top_k}={recall:.3f} (trained in {train_seconds:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Load test for /api/chat
+Fires chat requests at increasing concurrency against a running API and probes
+/api/health alongside, so we can see that throughput scales with in-flight
+requests and that health latency no longer tracks LLM latency. The health
+probe also records the sync pool's checked_out count: a chat turn only holds a
+connection for its context reads and the final write, so it should stay well
+below the concurrency level while generations are in flight. Requests continue
+one existing session (so each turn reads history) unless --new-sessions is set.
+
+Usage:
+    uvicorn main:app --port 8000
+    python benchmarks/load_chat.py --url http://localhost:8000 --requests 32
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+DEFAULT_QUERY = "How can I improve my sleep quality?"
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of floats"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+async def run_level(client: httpx.AsyncClient, url: str, concurrency: int, total: int, query: str, session_id: str = None) -> dict:
+    """Run `total` chat requests with at most `concurrency` in flight"""
+    payload = {"message": query}
+    if session_id:
+        payload["session_id"] = session_id
+    semaphore = asyncio.Semaphore(concurrency)
+    chat_latencies = []
+    health_latencies = []
+    checked_out = []
+    errors = 0
+    done = asyncio.Event()
+
+    async def one_chat():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{url}/api/chat", json=payload)
+                response.raise_for_status()
+            except Exception:
+                errors += 1
+            chat_latencies.append(time.perf_counter() - start)
+
+    async def probe_health():
+        while not done.is_set():
+            start = time.perf_counter()
+            try:
+                response = await client.get(f"{url}/api/health")
+                pool = response.json()["components"].get("database_pool", {})
+                if "checked_out" in pool:
+                    checked_out.append(pool["checked_out"])
+            except Exception:
+                pass
+            health_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.05)
+
+    prober = asyncio.create_task(probe_health())
+    start = time.perf_counter()
+    await asyncio.gather(*(one_chat() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+
+    return {
+        "concurrency": concurrency,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "chat_p50": statistics.median(chat_latencies),
+        "chat_p99": percentile(chat_latencies, 99),
+        "health_p99": percentile(health_latencies, 99),
+        "max_checked_out": max(checked_out, default=0),
+        "mean_checked_out": statistics.mean(checked_out) if checked_out else 0.0,
+        "errors": errors,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for /api/chat")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=32, help="Chat requests per concurrency level")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--query", default=DEFAULT_QUERY)
+    parser.add_argument("--new-sessions", action="store_true", help="Start a new session per request instead of continuing one")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    async with httpx.AsyncClient(timeout=120) as client:
+        session_id = None
+        if not args.new_sessions:
+            response = await client.post(f"{args.url.rstrip('/')}/api/chat", json={"message": args.query})
+            response.raise_for_status()
+            session_id = response.json()["session_id"]
+        print(f"{'conc':>5} {'req/s':>8} {'chat p50':>9} {'chat p99':>9} {'health p99':>11} {'pool max':>9} {'pool avg':>9} {'errors':>7}")
+        for level in levels:
+            r = await run_level(client, args.url.rstrip("/"), level, args.requests, args.query, session_id)
+            print(
+                f"{r['concurrency']:>5} {r['throughput_rps']:>8.2f} {r['chat_p50']:>8.2f}s "
+                f"{r['chat_p99']:>8.2f}s {r['health_p99'] * 1000:>9.1f}ms {r['max_checked_out']:>9} "
+                f"{r['mean_checked_out']:>9.2f} {r['errors']:>7}"
+            )
+
+if __name__ == "__main__":
+    asyncio.run(main())
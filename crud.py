@@ -1,13 +1,32 @@
 """
 CRUD operations for database models
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, select, case, tuple_
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Tuple
+from datetime import datetime, timedelta
 import models
+import base64
 import hashlib
 import uuid
 
+# === Keyset Pagination ===
+
+def encode_cursor(sort_value: datetime, row_id: str) -> str:
+    """Opaque cursor for keyset pagination: (sort timestamp, primary key)"""
+    raw = f"{sort_value.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor from encode_cursor. Raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        sort_value, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(sort_value), row_id
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
 # === Session Operations ===
 
 def create_session(db: Session, user_id: Optional[str] = None, title: Optional[str] = None) -> models.Session:
@@ -18,6 +37,10 @@ def create_session(db: Session, user_id: Optional[str] = None, title: Optional[s
     db.refresh(session)
     return session
 
+def new_session(user_id: Optional[str] = None, title: Optional[str] = None) -> models.Session:
+    """Build an unsaved session with its ID assigned (persisted later, e.g. by create_chat_turn)"""
+    return models.Session(session_id=str(uuid.uuid4()), user_id=user_id, title=title)
+
 def get_session(db: Session, session_id: str) -> Optional[models.Session]:
     """Get a session by ID"""
     return db.query(models.Session).filter(models.Session.session_id == session_id).first()
@@ -26,27 +49,86 @@ def delete_session(db: Session, session_id: str) -> bool:
     """Delete a session and all its messages"""
     session = get_session(db, session_id)
     if session:
+        if session.user_id:
+            _remove_session_stats(db, session)
         db.delete(session)
         db.commit()
         return True
     return False
 
-def get_user_sessions(db: Session, user_id: Optional[str] = None, limit: int = 50) -> List[models.Session]:
-    """Get all sessions for a user, ordered by most recent"""
-    query = db.query(models.Session)
+def user_sessions_query(user_id: Optional[str] = None, limit: int = 50):
+    """SELECT for get_user_sessions (shared with async_crud)"""
+    query = select(models.Session)
     
     if user_id:
-        query = query.filter(models.Session.user_id == user_id)
+        query = query.where(models.Session.user_id == user_id)
     else:
         # Get anonymous sessions (no user_id)
-        query = query.filter(models.Session.user_id == None)
+        query = query.where(models.Session.user_id == None)
     
-    return query.order_by(models.Session.updated_at.desc()).limit(limit).all()
+    return query.order_by(models.Session.updated_at.desc()).limit(limit)
 
-# === Message Operations ===
+def get_user_sessions(db: Session, user_id: Optional[str] = None, limit: int = 50) -> List[models.Session]:
+    """Get all sessions for a user, ordered by most recent"""
+    return list(db.scalars(user_sessions_query(user_id, limit)))
 
-def create_message(
+def user_sessions_with_stats_query(
+    user_id: Optional[str] = None,
+    limit: int = 50,
+    preview_length: int = 100,
+    before: Optional[str] = None
+):
+    """SELECT for get_user_sessions_with_stats (shared with async_crud)"""
+    # Correlated per session (index ix_messages_session_timestamp), so only
+    # the listed sessions' messages are counted - never the whole table
+    message_count = select(func.count(models.Message.message_id))\
+        .where(models.Message.session_id == models.Session.session_id)\
+        .correlate(models.Session)\
+        .scalar_subquery()
+
+    first_message = aliased(models.Message)
+    preview = select(func.substr(first_message.content, 1, preview_length))\
+        .where(first_message.session_id == models.Session.session_id)\
+        .order_by(first_message.timestamp.asc())\
+        .limit(1)\
+        .correlate(models.Session)\
+        .scalar_subquery()
+
+    query = select(models.Session, message_count, preview)
+
+    if user_id:
+        query = query.where(models.Session.user_id == user_id)
+    else:
+        # Get anonymous sessions (no user_id)
+        query = query.where(models.Session.user_id == None)
+
+    if before:
+        updated_at, session_id = decode_cursor(before)
+        query = query.where(
+            tuple_(models.Session.updated_at, models.Session.session_id) < tuple_(updated_at, session_id)
+        )
+
+    return query.order_by(models.Session.updated_at.desc(), models.Session.session_id.desc()).limit(limit)
+
+def get_user_sessions_with_stats(
     db: Session,
+    user_id: Optional[str] = None,
+    limit: int = 50,
+    preview_length: int = 100,
+    before: Optional[str] = None
+) -> List[Tuple[models.Session, int, Optional[str]]]:
+    """
+    Get sessions for a user with message count and first-message preview
+    in a single query (no per-session round trips).
+    before: keyset cursor - only sessions older than it (most recent first)
+    Returns: list of (session, message_count, preview_or_None)
+    """
+    rows = db.execute(user_sessions_with_stats_query(user_id, limit, preview_length, before)).all()
+    return [(session, int(message_count), preview_text) for session, message_count, preview_text in rows]
+
+# === Message Operations ===
+
+def build_message(
     session_id: str,
     role: str,
     content: str,
@@ -55,11 +137,12 @@ def create_message(
     sources: Optional[List[str]] = None,
     status: Optional[str] = None,
     retrieval_time: Optional[float] = None,
-    generation_time: Optional[float] = None
+    generation_time: Optional[float] = None,
+    extra_metadata: Optional[dict] = None
 ) -> models.Message:
     """
-    Create a new message in a session
-    Automatically generates content hash
+    Build (but don't persist) a message with metadata, content hash and source UIDs
+    extra_metadata is merged into message_metadata (e.g. cache tags)
     """
     # Build metadata
     metadata = {}
@@ -71,6 +154,8 @@ def create_message(
         metadata['sources'] = sources
     if status:
         metadata['status'] = status
+    if extra_metadata:
+        metadata.update(extra_metadata)
     
     # Generate content hash
     content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
@@ -80,37 +165,148 @@ def create_message(
     if sources:
         source_uids = [f"UID:doc:{hash(src)}" for src in sources]
     
-    message = models.Message(
+    # IDs and timestamps are set here so callers can read them after commit without a refresh
+    return models.Message(
+        message_id=str(uuid.uuid4()),
         session_id=session_id,
         role=role,
         content=content,
         content_hash=content_hash,
+        timestamp=datetime.utcnow(),
         message_metadata=metadata,
         retrieval_time=retrieval_time,
         generation_time=generation_time,
         source_document_uids=source_uids
     )
+
+def create_message(
+    db: Session,
+    session_id: str,
+    role: str,
+    content: str,
+    domain: Optional[str] = None,
+    confidence: Optional[float] = None,
+    sources: Optional[List[str]] = None,
+    status: Optional[str] = None,
+    retrieval_time: Optional[float] = None,
+    generation_time: Optional[float] = None,
+    extra_metadata: Optional[dict] = None
+) -> models.Message:
+    """
+    Create a new message in a session
+    Automatically generates content hash
+    extra_metadata is merged into message_metadata (e.g. cache tags)
+    """
+    message = build_message(
+        session_id, role, content, domain, confidence, sources,
+        status, retrieval_time, generation_time, extra_metadata
+    )
+    
+    session = get_session(db, session_id)
+    if session and session.user_id:
+        # Same transaction as the insert, so counters never drift from messages
+        first_in_session = not _session_has_messages(db, session_id)
+        _record_message_stats(db, session.user_id, [message], first_in_session)
     
     db.add(message)
-    db.commit()
-    db.refresh(message)
     
     # Update session timestamp
-    session = get_session(db, session_id)
     if session:
-        from datetime import datetime
-        session.updated_at = datetime.utcnow()
-        db.commit()
+        session.updated_at = message.timestamp
+    db.commit()
     
     return message
 
+def set_statement_timeout(db: Session, seconds: float):
+    """Statement timeout for the rest of the current transaction (PostgreSQL only)"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            select(func.set_config("statement_timeout", str(max(1, int(seconds * 1000))), True))
+        )
+
+def create_chat_turn(
+    db: Session,
+    session: models.Session,
+    user_content: str,
+    assistant_content: str,
+    title: Optional[str] = None,
+    timeout: Optional[float] = None,
+    **assistant_fields
+) -> Tuple[models.Message, models.Message]:
+    """
+    Persist a whole chat turn in one transaction: the user message, the
+    assistant message, the session title/updated_at and the user's stats.
+    session may be new (not yet added); it is inserted in the same commit.
+    timeout (seconds) bounds each statement of the transaction on PostgreSQL
+    so a slow database cannot hold the request past its deadline.
+    assistant_fields are passed to build_message (domain, sources, ...).
+    Returns: (user_message, assistant_message)
+    """
+    if timeout:
+        set_statement_timeout(db, timeout)
+    is_new_session = session not in db
+    if is_new_session:
+        db.add(session)
+    
+    user_message = build_message(session.session_id, "user", user_content)
+    assistant_message = build_message(session.session_id, "assistant", assistant_content, **assistant_fields)
+    # Keep history order stable even if both timestamps land on the same tick
+    if assistant_message.timestamp <= user_message.timestamp:
+        assistant_message.timestamp = user_message.timestamp + timedelta(microseconds=1)
+    
+    if session.user_id:
+        first_in_session = is_new_session or not _session_has_messages(db, session.session_id)
+        _record_message_stats(db, session.user_id, [user_message, assistant_message], first_in_session)
+    
+    db.add_all([user_message, assistant_message])
+    if title and not session.title:
+        session.title = title
+    session.updated_at = assistant_message.timestamp
+    db.commit()
+    
+    return user_message, assistant_message
+
+def session_messages_query(session_id: str, limit: int = 100):
+    """SELECT for get_session_messages (shared with async_crud)"""
+    return select(models.Message)\
+        .where(models.Message.session_id == session_id)\
+        .order_by(models.Message.timestamp.asc())\
+        .limit(limit)
+
 def get_session_messages(db: Session, session_id: str, limit: int = 100) -> List[models.Message]:
     """Get all messages for a session, ordered by timestamp"""
-    return db.query(models.Message)\
+    return list(db.scalars(session_messages_query(session_id, limit)))
+
+def get_recent_session_messages(db: Session, session_id: str, limit: int = 10) -> List[models.Message]:
+    """Get the latest `limit` messages for a session, oldest first"""
+    messages = db.query(models.Message)\
         .filter(models.Message.session_id == session_id)\
-        .order_by(models.Message.timestamp.asc())\
+        .order_by(models.Message.timestamp.desc(), models.Message.message_id.desc())\
         .limit(limit)\
         .all()
+    return list(reversed(messages))
+
+def session_messages_page_query(session_id: str, limit: int = 50, after: Optional[str] = None):
+    """SELECT for get_session_messages_page (shared with async_crud)"""
+    query = select(models.Message).where(models.Message.session_id == session_id)
+    if after:
+        timestamp, message_id = decode_cursor(after)
+        query = query.where(
+            tuple_(models.Message.timestamp, models.Message.message_id) > tuple_(timestamp, message_id)
+        )
+    return query.order_by(models.Message.timestamp.asc(), models.Message.message_id.asc()).limit(limit)
+
+def get_session_messages_page(
+    db: Session,
+    session_id: str,
+    limit: int = 50,
+    after: Optional[str] = None
+) -> List[models.Message]:
+    """
+    Get a page of messages for a session, ordered by timestamp.
+    after: keyset cursor - only messages after it (no OFFSET scans)
+    """
+    return list(db.scalars(session_messages_page_query(session_id, limit, after)))
 
 def get_message(db: Session, message_id: str) -> Optional[models.Message]:
     """Get a single message by ID"""
@@ -154,26 +350,16 @@ def update_user_preferences(db: Session, user_id: str, preferences: dict) -> Opt
         db.refresh(user)
     return user
 
-def get_user_stats(db: Session, user_id: Optional[str] = None) -> dict:
-    """Get user statistics - only counting sessions with messages"""
-    
-    # Get all sessions for the user
-    sessions_query = db.query(models.Session)
-    if user_id:
-        sessions_query = sessions_query.filter(models.Session.user_id == user_id)
-    
-    all_sessions = sessions_query.all()
-    
+def compute_user_stats(db: Session, user_id: Optional[str] = None) -> dict:
+    """
+    Compute user statistics from full message history (slow for heavy users).
+    Used for anonymous/global stats and to rebuild the user_stats table.
+    """
     # Count only sessions that have messages
-    sessions_with_messages = 0
-    for session in all_sessions:
-        message_count = db.query(func.count(models.Message.message_id))\
-            .filter(models.Message.session_id == session.session_id)\
-            .scalar() or 0
-        if message_count > 0:
-            sessions_with_messages += 1
-    
-    total_sessions = sessions_with_messages
+    sessions_query = db.query(func.count(func.distinct(models.Message.session_id)))
+    if user_id:
+        sessions_query = sessions_query.join(models.Session).filter(models.Session.user_id == user_id)
+    total_sessions = sessions_query.scalar() or 0
     
     # Count all messages for this user
     message_query = db.query(func.count(models.Message.message_id))
@@ -192,29 +378,165 @@ def get_user_stats(db: Session, user_id: Optional[str] = None) -> dict:
     domain_query = db.query(models.Message.message_metadata).filter(models.Message.role == 'assistant')
     if user_id:
         domain_query = domain_query.join(models.Session).filter(models.Session.user_id == user_id)
+    domains_used = _count_domains(row[0] for row in domain_query.all())
     
-    domains_used = {}
-    for message in domain_query.all():
-        metadata = message[0] if isinstance(message, tuple) else message.message_metadata
-        if metadata and isinstance(metadata, dict) and 'domain' in metadata:
-            domain = metadata['domain']
-            domains_used[domain] = domains_used.get(domain, 0) + 1
-    
-    # Calculate average response time
-    avg_time_query = db.query(func.avg(models.Message.generation_time))\
+    # Generation time totals (average = sum / count)
+    time_query = db.query(func.sum(models.Message.generation_time), func.count(models.Message.generation_time))\
         .filter(models.Message.generation_time != None)
     if user_id:
-        avg_time_query = avg_time_query.join(models.Session).filter(models.Session.user_id == user_id)
-    avg_response_time = avg_time_query.scalar()
+        time_query = time_query.join(models.Session).filter(models.Session.user_id == user_id)
+    generation_time_sum, generation_time_count = time_query.one()
     
+    return _stats_dict(
+        total_sessions, total_messages, total_queries, domains_used,
+        generation_time_sum or 0.0, generation_time_count or 0
+    )
+
+def get_user_stats(db: Session, user_id: Optional[str] = None) -> dict:
+    """
+    Get user statistics - only counting sessions with messages.
+    Reads the incrementally maintained user_stats row; users without a row
+    yet (e.g. history from before the table existed) are backfilled once.
+    """
+    if not user_id:
+        return compute_user_stats(db)
+    
+    stats = db.query(models.UserStats).filter(models.UserStats.user_id == user_id).first()
+    if stats is None:
+        stats = rebuild_user_stats(db, user_id)
+    
+    return _stats_dict(
+        stats.total_sessions, stats.total_messages, stats.total_queries, stats.domains_used or {},
+        stats.generation_time_sum, stats.generation_time_count
+    )
+
+def rebuild_user_stats(db: Session, user_id: str) -> models.UserStats:
+    """Recompute one user's stats row from full history and store it"""
+    computed = compute_user_stats(db, user_id)
+    stats = db.query(models.UserStats).filter(models.UserStats.user_id == user_id).with_for_update().first()
+    if stats is None:
+        stats = models.UserStats(user_id=user_id)
+        db.add(stats)
+    stats.total_sessions = computed["total_sessions"]
+    stats.total_messages = computed["total_messages"]
+    stats.total_queries = computed["total_queries"]
+    stats.domains_used = computed["domains_used"]
+    stats.generation_time_sum = computed["generation_time_sum"]
+    stats.generation_time_count = computed["generation_time_count"]
+    db.commit()
+    db.refresh(stats)
+    return stats
+
+def rebuild_all_user_stats(db: Session) -> int:
+    """Rebuild stats rows for every user with sessions. Returns number of users rebuilt"""
+    user_ids = [row[0] for row in db.query(models.Session.user_id).filter(models.Session.user_id != None).distinct()]
+    for user_id in user_ids:
+        rebuild_user_stats(db, user_id)
+    return len(user_ids)
+
+def _stats_dict(total_sessions, total_messages, total_queries, domains_used, generation_time_sum, generation_time_count) -> dict:
     return {
         "total_sessions": total_sessions,
         "total_messages": total_messages,
         "total_queries": total_queries,
         "domains_used": domains_used,
-        "avg_response_time": float(avg_response_time) if avg_response_time else None
+        "avg_response_time": float(generation_time_sum) / generation_time_count if generation_time_count else None,
+        "generation_time_sum": float(generation_time_sum),
+        "generation_time_count": generation_time_count
     }
 
+def _count_domains(metadata_rows) -> dict:
+    domains_used = {}
+    for metadata in metadata_rows:
+        if metadata and isinstance(metadata, dict) and 'domain' in metadata:
+            domain = metadata['domain']
+            domains_used[domain] = domains_used.get(domain, 0) + 1
+    return domains_used
+
+def _locked_user_stats(db: Session, user_id: str) -> models.UserStats:
+    """Get (row-locked) or create the stats row for a user, without committing"""
+    stats = db.query(models.UserStats).filter(models.UserStats.user_id == user_id).with_for_update().first()
+    if stats is not None:
+        return stats
+    
+    # First write for this user: seed from existing history so counts stay exact
+    computed = compute_user_stats(db, user_id)
+    stats = models.UserStats(
+        user_id=user_id,
+        total_sessions=computed["total_sessions"],
+        total_messages=computed["total_messages"],
+        total_queries=computed["total_queries"],
+        domains_used=computed["domains_used"],
+        generation_time_sum=computed["generation_time_sum"],
+        generation_time_count=computed["generation_time_count"]
+    )
+    try:
+        with db.begin_nested():
+            db.add(stats)
+    except IntegrityError:
+        # Another request created it concurrently
+        stats = db.query(models.UserStats).filter(models.UserStats.user_id == user_id).with_for_update().first()
+    return stats
+
+def _session_has_messages(db: Session, session_id: str) -> bool:
+    return db.query(models.Message.message_id)\
+        .filter(models.Message.session_id == session_id)\
+        .first() is not None
+
+def _record_message_stats(
+    db: Session,
+    user_id: str,
+    messages: List[models.Message],
+    first_in_session: bool
+):
+    """Apply new (unflushed) messages to the user's stats row (caller commits)"""
+    stats = _locked_user_stats(db, user_id)
+    if first_in_session:
+        stats.total_sessions += 1
+    domains = dict(stats.domains_used or {})
+    for message in messages:
+        stats.total_messages += 1
+        if message.role == 'user':
+            stats.total_queries += 1
+        domain = (message.message_metadata or {}).get('domain')
+        if message.role == 'assistant' and domain:
+            domains[domain] = domains.get(domain, 0) + 1
+        if message.generation_time is not None:
+            stats.generation_time_sum += message.generation_time
+            stats.generation_time_count += 1
+    stats.domains_used = domains
+
+def _remove_session_stats(db: Session, session: models.Session):
+    """Subtract a session's messages from its user's stats row (caller commits)"""
+    message_count, query_count, generation_time_sum, generation_time_count = db.query(
+        func.count(models.Message.message_id),
+        func.sum(case((models.Message.role == 'user', 1), else_=0)),
+        func.sum(models.Message.generation_time),
+        func.count(models.Message.generation_time)
+    ).filter(models.Message.session_id == session.session_id).one()
+    if not message_count:
+        return
+    
+    stats = _locked_user_stats(db, session.user_id)
+    stats.total_sessions = max(0, stats.total_sessions - 1)
+    stats.total_messages = max(0, stats.total_messages - message_count)
+    stats.total_queries = max(0, stats.total_queries - (query_count or 0))
+    stats.generation_time_sum = max(0.0, stats.generation_time_sum - (generation_time_sum or 0.0))
+    stats.generation_time_count = max(0, stats.generation_time_count - generation_time_count)
+    
+    session_domains = _count_domains(
+        row[0] for row in db.query(models.Message.message_metadata)
+        .filter(models.Message.session_id == session.session_id, models.Message.role == 'assistant')
+    )
+    domains = dict(stats.domains_used or {})
+    for domain, count in session_domains.items():
+        remaining = domains.get(domain, 0) - count
+        if remaining > 0:
+            domains[domain] = remaining
+        else:
+            domains.pop(domain, None)
+    stats.domains_used = domains
+
 # === Audit Log Operations ===
 
 def create_audit_log(
@@ -1,9 +1,13 @@
 """
 Database connection and session management
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, NullPool
+from collections import deque
 import os
+import threading
+import time
 
 # Database URL - PostgreSQL for production, SQLite for local dev
 DATABASE_URL = os.getenv(
@@ -15,14 +19,176 @@ DATABASE_URL = os.getenv(
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# === Connection Pool Configuration ===
+# DB_MAX_CONNECTIONS is the connection budget for the whole service; it is split
+# across uvicorn workers (WEB_CONCURRENCY) unless DB_POOL_SIZE is set explicitly.
+# Each worker's share (DB_POOL_SIZE + DB_MAX_OVERFLOW) is the ceiling for BOTH of
+# its engines: DB_ASYNC_POOL_SHARE of it goes to the async engine (read-heavy
+# endpoints), the rest to the sync engine - see split_pool. With DB_ASYNC_READS
+# off there is no async engine and the sync engine gets the whole share.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds; beats server/proxy idle timeouts
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_ASYNC_POOL_SHARE = min(1.0, max(0.0, float(os.getenv("DB_ASYNC_POOL_SHARE", "0.34"))))
+# History reads on the async engine only pay off with a truly async driver
+# (asyncpg); aiosqlite runs each connection on a thread and is slower than
+# the sync path (benchmarks/bench_history_reads.py), so SQLite defaults to off
+DB_ASYNC_READS = os.getenv(
+    "DB_ASYNC_READS", "true" if DATABASE_URL.startswith("postgresql") else "false"
+).lower() == "true"
+# PgBouncer (transaction pooling) does the pooling itself: don't hold connections here
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+def pool_sizing(max_connections: int, workers: int) -> tuple:
+    """
+    Split a per-service connection budget into (pool_size, max_overflow) per worker.
+    Two thirds are kept open; the rest is burst capacity.
+    """
+    per_worker = max(2, max_connections // workers)
+    pool_size = max(1, (per_worker * 2) // 3)
+    return pool_size, per_worker - pool_size
+
+def split_pool(pool_size: int, max_overflow: int, async_share: float) -> tuple:
+    """
+    Split one worker's (pool_size, max_overflow) between its two engines.
+    Returns: ((sync_pool_size, sync_max_overflow), (async_pool_size, async_max_overflow)),
+    adding up to the input. Each pool keeps at least one connection (pool_size=0
+    would mean unlimited), so a 1-connection budget with no overflow becomes 2.
+    """
+    async_size = max(1, min(pool_size - 1, round(pool_size * async_share)))
+    sync_size = pool_size - async_size
+    async_overflow = round(max_overflow * async_share)
+    sync_overflow = max_overflow - async_overflow
+    if sync_size < 1:
+        # pool_size == 1: the async pool's connection comes out of the overflow
+        sync_size = 1
+        if async_overflow:
+            async_overflow -= 1
+        elif sync_overflow:
+            sync_overflow -= 1
+    return (sync_size, sync_overflow), (async_size, async_overflow)
+
+if os.getenv("DB_POOL_SIZE"):
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0"))
+else:
+    DB_POOL_SIZE, DB_MAX_OVERFLOW = pool_sizing(DB_MAX_CONNECTIONS, WEB_CONCURRENCY)
+
+# Per-engine sizes within the worker's budget
+if DB_ASYNC_READS:
+    (DB_SYNC_POOL_SIZE, DB_SYNC_MAX_OVERFLOW), (DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW) = split_pool(
+        DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_ASYNC_POOL_SHARE
+    )
+else:
+    DB_SYNC_POOL_SIZE, DB_SYNC_MAX_OVERFLOW = DB_POOL_SIZE, DB_MAX_OVERFLOW
+    DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW = 0, 0
+
+class PoolStats:
+    """Connection checkout wait times and pool events for this worker"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.invalidations = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self._waits.append(seconds)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def record_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            checkouts, timeouts, invalidations = self.checkouts, self.timeouts, self.invalidations
+        return {
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "invalidations": invalidations,
+            "wait_ms_p50": round(waits[len(waits) // 2] * 1000.0, 2) if waits else None,
+            "wait_ms_p99": round(waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000.0, 2) if waits else None,
+            "wait_ms_max": round(waits[-1] * 1000.0, 2) if waits else None
+        }
+
+pool_stats = PoolStats()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record_wait(time.perf_counter() - start)
+        return connection
+
+def build_engine_kwargs(url: str) -> dict:
+    """Engine/pool arguments for a database URL, from the environment"""
+    if "sqlite" in url:
+        return {
+            "connect_args": {"check_same_thread": False},
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": DB_SYNC_POOL_SIZE,
+            "max_overflow": DB_SYNC_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT
+        }
+    if DB_PGBOUNCER:
+        return {"poolclass": NullPool, "pool_pre_ping": DB_POOL_PRE_PING}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_SYNC_POOL_SIZE,
+        "max_overflow": DB_SYNC_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
 # Create engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+engine = create_engine(DATABASE_URL, **build_engine_kwargs(DATABASE_URL))
+
+@event.listens_for(engine, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    # Stale connections caught by pre-ping or failing mid-query
+    pool_stats.record_invalidation()
+
+def get_pool_status() -> dict:
+    """Pool occupancy and checkout wait metrics (exposed on /api/health)"""
+    pool = engine.pool
+    status = {
+        "pool_class": type(pool).__name__,
+        "workers": WEB_CONCURRENCY,
+        "pgbouncer_mode": DB_PGBOUNCER,
+        "async_reads": DB_ASYNC_READS
+    }
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "max_overflow": DB_SYNC_MAX_OVERFLOW,
+            "async_pool_size": DB_ASYNC_POOL_SIZE,
+            "async_max_overflow": DB_ASYNC_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow())  # Negative until the base pool fills
+        })
+    status.update(pool_stats.summary())
+    return status
 
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: objects stay readable after commit without a reload SELECT
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Dependency for FastAPI
 def get_db():
@@ -31,4 +197,102 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# === Async Engine ===
+# Read-heavy endpoints use an AsyncSession (when DB_ASYNC_READS is on) so they
+# don't tie up a worker thread per request. The async engine gets its own pool, DB_ASYNC_POOL_SHARE of the
+# worker's connection budget (see split_pool); it is
+# created on first use so the sync-only paths (scripts, manage.py) never need
+# the async drivers (asyncpg / aiosqlite) installed.
+
+def async_database_url(url: str) -> str:
+    """Map a sync database URL to its async driver"""
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql+psycopg2://"):
+        return url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+def build_async_engine_kwargs(url: str) -> dict:
+    """Async engine/pool arguments for a database URL, from the environment"""
+    from sqlalchemy.engine import make_url
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    if "sqlite" in url:
+        return {
+            "poolclass": AsyncAdaptedQueuePool,
+            "pool_size": DB_ASYNC_POOL_SIZE,
+            "max_overflow": DB_ASYNC_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT
+        }
+
+    kwargs = {"connect_args": {}}
+    # asyncpg doesn't understand libpq's sslmode query parameter
+    sslmode = make_url(url).query.get("sslmode")
+    if sslmode and sslmode != "disable":
+        kwargs["connect_args"]["ssl"] = "require" if sslmode in ("require", "prefer", "allow") else True
+    if DB_PGBOUNCER:
+        # Transaction pooling breaks asyncpg's prepared statement cache
+        kwargs["connect_args"]["statement_cache_size"] = 0
+        kwargs.update({"poolclass": NullPool, "pool_pre_ping": DB_POOL_PRE_PING})
+        return kwargs
+    kwargs.update({
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": DB_ASYNC_POOL_SIZE,
+        "max_overflow": DB_ASYNC_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    })
+    return kwargs
+
+_async_engine = None
+_async_sessionmaker = None
+_async_lock = threading.Lock()
+
+def get_async_engine():
+    """The process-wide AsyncEngine (created on first use)"""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        with _async_lock:
+            if _async_engine is None:
+                from sqlalchemy.engine import make_url
+                from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+                url = make_url(async_database_url(DATABASE_URL))
+                kwargs = build_async_engine_kwargs(DATABASE_URL)
+                if "ssl" in kwargs.get("connect_args", {}):
+                    url = url.difference_update_query(["sslmode"])
+                _async_engine = create_async_engine(url, **kwargs)
+                _async_sessionmaker = async_sessionmaker(
+                    _async_engine, autoflush=False, expire_on_commit=False
+                )
+    return _async_engine
+
+def AsyncSessionLocal():
+    """New AsyncSession bound to the async engine"""
+    get_async_engine()
+    return _async_sessionmaker()
+
+async def get_async_db():
+    """Async database session dependency"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db():
+    """
+    Session dependency for the history read endpoints: an AsyncSession when
+    DB_ASYNC_READS is on, otherwise a sync Session (use it via run_blocking)
+    """
+    if DB_ASYNC_READS:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
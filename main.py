@@ -2,33 +2,62 @@
 Ombee AI FastAPI Backend
 Production-ready with patent architecture foundations
 """
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
+from functools import partial
+from contextlib import asynccontextmanager
 import os
+import json
+import logging
+import time
 from datetime import datetime
+import anyio
 
 # Import database models and operations
-from database import SessionLocal, engine, get_db
+from database import SessionLocal, engine, get_db, get_read_db, get_pool_status, DB_ASYNC_READS
 import models
 import crud
+import async_crud
 
 # Import existing RAG components
 from src.router import detect_domain
-from src.retriever import retrieve_context
-from src.llm import generate_response
+from src.retriever import retrieve_planned_context, previous_turn_chunks, embed_query, get_embedding_cache_stats
+from src.planner import plan_retrieval, fit_plan_to_budget, get_retrieval_plan_stats
+from src.session_cache import get_session_cache
+from src.resilience import Deadline, breaker_states
+from src.context import get_context_budget_stats
+from src.bm25 import get_bm25_index
+from src.llm import generate_completion, stream_response, is_error_response, get_completion_cache_stats, MODEL, MAX_TOKENS
+from src.scheduler import get_groq_scheduler, get_cohere_scheduler
+from src.answer_cache import get_answer_cache, answer_scope
 from src.demo_responses import get_demo_response, get_coming_soon_message
-from src.monitoring import get_monitor
+from src.monitoring import get_monitor, get_latency_tracker
+from src.config import (
+    CHAT_REQUEST_SLO, DEADLINE_PERSIST_RESERVE, DEADLINE_GENERATION_RESERVE, PERSIST_MIN_TIMEOUT,
+    HYBRID_SEARCH_ENABLED
+)
+
+log = logging.getLogger(__name__)
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+def init_app():
+    """Create missing database tables and start monitoring (at startup, not at import)"""
+    models.Base.metadata.create_all(bind=engine)
+    get_monitor()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await anyio.to_thread.run_sync(init_app)
+    yield
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Ombee AI API",
     description="Multi-domain RAG chatbot with patent-ready architecture",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware for frontend
@@ -44,9 +73,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-monitor = get_monitor()
+# Response header carrying the keyset cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+latency_tracker = get_latency_tracker()
+
+# Bounded worker pool for the blocking parts of the chat pipeline (DB, Cohere,
+# Pinecone, Groq). Keeps the event loop free so one slow LLM call doesn't
+# stall every other request on this worker.
+CHAT_EXECUTOR_WORKERS = int(os.getenv("CHAT_EXECUTOR_WORKERS", "32"))
+chat_limiter = anyio.CapacityLimiter(CHAT_EXECUTOR_WORKERS)
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the bounded chat executor"""
+    return await anyio.to_thread.run_sync(partial(func, *args, **kwargs), limiter=chat_limiter)
+
+async def read_history(sync_func, async_func, db, *args, **kwargs):
+    """Run a history read with the crud module matching get_read_db's session (see DB_ASYNC_READS)"""
+    if DB_ASYNC_READS:
+        return await async_func(db, *args, **kwargs)
+    return await run_blocking(sync_func, db, *args, **kwargs)
 
 # === Request/Response Models ===
 
@@ -129,7 +178,7 @@ async def root():
     }
 
 @app.post("/api/sessions/create", response_model=SessionResponse)
-async def create_session(
+def create_session(
     session_data: SessionCreate,
     db = Depends(get_db)
 ):
@@ -148,20 +197,27 @@ async def create_session(
 
 @app.get("/api/sessions/list", response_model=List[SessionListItem])
 async def list_sessions(
+    response: Response,
     user_id: Optional[str] = None,
     limit: int = 50,
-    db = Depends(get_db)
+    cursor: Optional[str] = None,
+    db = Depends(get_read_db)
 ):
-    """List all sessions for a user"""
+    """
+    List all sessions for a user
+    Keyset-paginated: pass the X-Next-Cursor header back as ?cursor= for older sessions
+    """
     try:
-        sessions = crud.get_user_sessions(db, user_id, limit)
+        sessions = await read_history(
+            crud.get_user_sessions_with_stats, async_crud.get_user_sessions_with_stats, db, user_id, limit, before=cursor
+        )
+        if len(sessions) == limit:
+            last_session = sessions[-1][0]
+            response.headers[NEXT_CURSOR_HEADER] = crud.encode_cursor(last_session.updated_at, last_session.session_id)
         
         result = []
-        for session in sessions:
-            # Get message count and preview
-            messages = crud.get_session_messages(db, session.session_id, limit=1)
-            message_count = len(crud.get_session_messages(db, session.session_id, limit=1000))
-            preview = messages[0].content[:100] if messages else "New conversation"
+        for session, message_count, preview in sessions:
+            preview = preview or "New conversation"
             
             result.append(SessionListItem(
                 session_id=session.session_id,
@@ -173,9 +229,194 @@ async def list_sessions(
             ))
         
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list sessions: {str(e)}")
 
+async def prepare_turn(request: ChatRequest, db):
+    """
+    Shared setup for a chat turn: resolve the session (new sessions are only
+    built in memory) and build the conversation context. Nothing is written
+    here - the whole turn is persisted at the end by crud.create_chat_turn -
+    and no connection is held once the reads are done.
+    Returns: (session, user_context, conversation_context)
+    """
+    # Get or create session
+    if request.session_id:
+        session = await run_blocking(crud.get_session, db, request.session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+    else:
+        session = crud.new_session(request.user_id)
+    
+    user = await run_blocking(crud.get_user, db, request.user_id) if request.user_id else None
+    user_context = user.preferences if user else None
+
+    # Get recent conversation history for context
+    conversation_context = ""
+    if request.session_id:
+        recent_messages = await run_blocking(crud.get_recent_session_messages, db, session.session_id, limit=5)
+        conversation_context = "\n".join([
+            f"{'User' if msg.role == 'user' else 'Assistant'}: {msg.content[:200]}" 
+            for msg in recent_messages
+        ])
+
+    # End the read transaction so the connection goes back to the pool while
+    # retrieval and generation run; create_chat_turn checks one out again.
+    # commit (not rollback/close) keeps the session object attached and loaded.
+    await run_blocking(db.commit)
+    
+    return session, user_context, conversation_context
+
+def session_title(message: str) -> str:
+    """Auto-generated session title from the first user message"""
+    return message[:50] + ("..." if len(message) > 50 else "")
+
+def context_budget_metadata(report: Optional[dict]) -> Optional[dict]:
+    """message_metadata tag with the prompt context size and tokens saved by the budgeter"""
+    if not report:
+        return None
+    return {
+        "context_budget": {
+            "tokens": report["tokens_after"],
+            "tokens_saved": report["tokens_saved"],
+            "chunks_kept": report["chunks_kept"],
+            "duplicates_dropped": report["duplicates_dropped"]
+        }
+    }
+
+def retrieval_plan_metadata(plan: dict) -> dict:
+    """message_metadata tag recording the retrieval planner's decision"""
+    return {"retrieval_plan": {"action": plan["action"], "top_k": plan["top_k"], "reason": plan["reason"]}}
+
+def generation_metadata(result: dict) -> dict:
+    """message_metadata tag with the model that answered (see src.llm.generate_completion)"""
+    return {
+        "generation": {
+            "model": result["model"],
+            "attempts": result["attempts"],
+            "fallback": result["model"] is not None and result["model"] != MODEL,
+            "truncated": result.get("truncated", False)
+        }
+    }
+
+def deadline_metadata(deadline: Deadline, max_tokens: Optional[int] = None) -> dict:
+    """message_metadata tag with the request's time budget and what was spent of it"""
+    return {
+        "deadline": {
+            "slo": deadline.budget,
+            "elapsed": round(deadline.elapsed(), 3),
+            "max_tokens": max_tokens
+        }
+    }
+
+DEADLINE_EXPIRED_RESPONSE = (
+    "I'm sorry, I couldn't put an answer together in time. Please try asking again in a moment."
+)
+
+def generation_deadline(deadline: Deadline) -> Deadline:
+    """Generation gets what is left, minus the time kept for persisting the turn"""
+    return deadline.shortened(DEADLINE_PERSIST_RESERVE)
+
+def persist_timeout(deadline: Deadline) -> float:
+    """Statement timeout for saving the turn - never so short that a late turn is lost"""
+    return max(PERSIST_MIN_TIMEOUT, deadline.remaining())
+
+async def build_prompt_context(request: ChatRequest, session, confidence: float, conversation_context: str, deadline: Deadline):
+    """
+    Plan retrieval for a holistic turn (skip small talk, reuse the previous
+    turn's chunks for follow-ups, otherwise retrieve with an adaptive top_k)
+    and assemble the prompt context. Retrieval must finish early enough to
+    leave the generation and persist reserves of the request deadline; when
+    time is short it fetches fewer chunks or is skipped.
+    Returns: (context, sources, retrieval_time, budget_report, extra_metadata, plan)
+    """
+    has_previous = bool(request.session_id and previous_turn_chunks(session.session_id))
+    plan = plan_retrieval(request.message, confidence, conversation_context, has_previous)
+    retrieval_deadline = deadline.shortened(DEADLINE_GENERATION_RESERVE + DEADLINE_PERSIST_RESERVE)
+    plan = fit_plan_to_budget(
+        plan, retrieval_deadline.remaining(), latency_tracker.percentile("retrieval.total", 95)
+    )
+    log.debug("Retrieval plan for session %s: %s top_k=%s (%s)", session.session_id, plan["action"], plan["top_k"], plan["reason"])
+    context, sources, retrieval_time, budget_report = await run_blocking(
+        retrieve_planned_context, request.message, plan, conversation_context, session.session_id, retrieval_deadline
+    )
+    extra_metadata = {**(context_budget_metadata(budget_report) or {}), **retrieval_plan_metadata(plan)}
+    if budget_report and budget_report.get("degraded"):
+        # Retrieval was unavailable - the turn is answered without documents
+        extra_metadata["retrieval_degraded"] = budget_report["degraded"]
+    return context, sources, retrieval_time, budget_report, extra_metadata, plan
+
+async def find_cached_answer(request: ChatRequest, user_context, conversation_context: str, deadline: Deadline = None):
+    """
+    Look up a semantically similar prior answer for a first-turn holistic query.
+    Returns: (scope, query_vector, hit) where hit is (payload, similarity) or None
+    """
+    cache = get_answer_cache()
+    # Follow-ups depend on conversation history, so only standalone questions are cached
+    if cache is None or conversation_context:
+        return None, None, None
+    try:
+        scope = answer_scope(request.user_id, user_context)
+        query_vector = await run_blocking(embed_query, request.message, deadline=deadline)
+        return scope, query_vector, cache.lookup(scope, query_vector)
+    except Exception as e:
+        print(f"Answer cache lookup failed: {e}")
+        return None, None, None
+
+def is_full_answer(metadata: Optional[dict]) -> bool:
+    """
+    Whether a turn's answer is the full-quality one: retrieval was not degraded,
+    the primary model answered and neither the token budget nor the stream
+    was cut by the deadline.
+    """
+    metadata = metadata or {}
+    if metadata.get("retrieval_degraded"):
+        return False
+    generation = metadata.get("generation", {})
+    if generation.get("fallback") or generation.get("truncated"):
+        return False
+    max_tokens = metadata.get("deadline", {}).get("max_tokens")
+    return max_tokens is None or max_tokens >= MAX_TOKENS
+
+def remember_answer(scope, query_vector, assistant_message, sources, status, metadata: Optional[dict] = None):
+    """Store a fresh live answer in the semantic answer cache (full-quality answers only)"""
+    cache = get_answer_cache()
+    if cache is None or scope is None or status != 'live' or is_error_response(assistant_message.content):
+        return
+    if not is_full_answer(metadata):
+        return
+    cache.store(scope, query_vector, {
+        "response": assistant_message.content,
+        "sources": sources,
+        "message_id": assistant_message.message_id
+    })
+
+def cache_hit_metadata(payload: dict, similarity: float) -> dict:
+    """message_metadata tag for replies served from the answer cache"""
+    return {
+        "answer_cache": {
+            "hit": True,
+            "similarity": round(similarity, 4),
+            "source_message_id": payload["message_id"]
+        }
+    }
+
+async def log_to_monitor(request: ChatRequest, **fields):
+    """Log a chat turn to Phoenix monitoring, never failing the request"""
+    monitor = get_monitor()
+    if monitor and monitor.tracer:
+        try:
+            await run_blocking(
+                monitor.log_query,
+                query=request.message,
+                user_id=request.user_id,
+                **fields
+            )
+        except Exception as e:
+            print(f"Phoenix logging failed: {e}")
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
@@ -183,41 +424,12 @@ async def chat(
 ):
     """
     Main chat endpoint - processes user query through RAG pipeline
+    Blocking stages run on the bounded chat executor (see run_blocking)
+    Every stage shares one deadline so the reply is back within CHAT_REQUEST_SLO
     """
+    deadline = Deadline(CHAT_REQUEST_SLO)
     try:
-        # Get or create session
-        if request.session_id:
-            session = crud.get_session(db, request.session_id)
-            if not session:
-                raise HTTPException(status_code=404, detail="Session not found")
-        else:
-            session = crud.create_session(db, request.user_id)
-        
-        # Store user message
-        user_message = crud.create_message(
-            db=db,
-            session_id=session.session_id,
-            role="user",
-            content=request.message
-        )
-        
-        # Auto-generate session title from first user message
-        if not session.title:
-            session.title = request.message[:50] + ("..." if len(request.message) > 50 else "")
-            db.commit()
-        
-        user = crud.get_user(db, request.user_id)
-        user_context = user.preferences if user else None
-
-        # Get conversation history for context
-        history = crud.get_session_messages(db, session.session_id, limit=10)
-        conversation_context = ""
-        if len(history) > 1:
-            recent_messages = history[-6:-1] if len(history) > 6 else history[:-1]
-            conversation_context = "\n".join([
-                f"{'User' if msg.role == 'user' else 'Assistant'}: {msg.content[:200]}" 
-                for msg in recent_messages
-            ])
+        session, user_context, conversation_context = await prepare_turn(request, db)
         
         # Domain routing
         domain, confidence = detect_domain(request.message)
@@ -231,6 +443,13 @@ async def chat(
         generation_time = None
         cumulative_tokens = None
         cumulative_cost = None
+        cache_scope = None
+        query_vector = None
+        cached = None
+        extra_metadata = None
+        budget_report = None
+        plan = None
+        max_tokens = None
         
         # Check for demo response
         demo_response = get_demo_response(request.message, domain)
@@ -240,22 +459,45 @@ async def chat(
             sources = demo_response['sources']
             status = demo_response['status']
             
+        elif domain == 'holistic' and deadline.expired():
+            # Too late to retrieve and generate within the SLO: say so right away
+            response_text = DEADLINE_EXPIRED_RESPONSE
+            status = 'timeout'
+            
         elif domain == 'holistic':
             # Real RAG pipeline
             try:
-                # Retrieve context
-                context, sources, retrieval_time = retrieve_context(request.message)
-                
-                # Add conversation history to context if available
-                if conversation_context:
-                    context = f"Previous conversation:\n{conversation_context}\n\n---\n\nRelevant documents:\n{context}"
-                
-                # Generate response
-                response_text, generation_time, cumulative_tokens, cumulative_cost = generate_response(
-                    request.message,
-                    context,
-                    user_context=user_context
+                cache_scope, query_vector, cached = await find_cached_answer(
+                    request, user_context, conversation_context, deadline
                 )
+                if cached:
+                    # Near-duplicate of a prior question in the same scope
+                    payload, similarity = cached
+                    response_text = payload['response']
+                    sources = payload['sources']
+                    extra_metadata = cache_hit_metadata(payload, similarity)
+                else:
+                    # Retrieve context (with conversation history, trimmed to the prompt budget)
+                    context, sources, retrieval_time, budget_report, extra_metadata, plan = await build_prompt_context(
+                        request, session, confidence, conversation_context, deadline
+                    )
+                    
+                    # Generate response (model cascade: primary, hedged/fallback when slow),
+                    # max_tokens sized to the time left
+                    generation = await run_blocking(
+                        generate_completion,
+                        request.message,
+                        context,
+                        user_context=user_context,
+                        user_id=request.user_id,
+                        deadline=generation_deadline(deadline)
+                    )
+                    response_text = generation["response"]
+                    generation_time = generation["generation_time"]
+                    cumulative_tokens = generation["tokens"]
+                    cumulative_cost = generation["cost"]
+                    max_tokens = generation["max_tokens"]
+                    extra_metadata = {**(extra_metadata or {}), **generation_metadata(generation)}
                 status = 'live'
             except Exception as e:
                 response_text = f"I encountered an error processing your request: {str(e)}"
@@ -267,39 +509,45 @@ async def chat(
             sources = []
             status = 'coming-soon'
         
-        # Store AI response with patent-ready fields
-        assistant_message = crud.create_message(
-            db=db,
-            session_id=session.session_id,
-            role="assistant",
-            content=response_text,
+        extra_metadata = {**(extra_metadata or {}), **deadline_metadata(deadline, max_tokens)}
+        
+        # Store user message, AI response (patent-ready fields) and session title in one transaction
+        user_message, assistant_message = await run_blocking(
+            crud.create_chat_turn,
+            db,
+            session,
+            request.message,
+            response_text,
+            title=session_title(request.message),
+            timeout=persist_timeout(deadline),
             domain=domain,
             confidence=confidence,
             sources=sources,
             status=status,
             retrieval_time=retrieval_time,
-            generation_time=generation_time
+            generation_time=generation_time,
+            extra_metadata=extra_metadata
         )
+        if not cached:
+            remember_answer(cache_scope, query_vector, assistant_message, sources, status, extra_metadata)
         
         # Log to Phoenix monitoring
-        if monitor and monitor.tracer:
-            try:
-                monitor.log_query(
-                    query=request.message,
-                    domain=domain,
-                    confidence=confidence,
-                    response=response_text,
-                    sources=sources,
-                    context=context,
-                    status=status,
-                    retrieval_time=retrieval_time,
-                    generation_time=generation_time,
-                    cumulative_tokens=cumulative_tokens,
-                    cumulative_cost=cumulative_cost,
-                    user_id=request.user_id
-                )
-            except Exception as e:
-                print(f"Phoenix logging failed: {e}")
+        await log_to_monitor(
+            request,
+            domain=domain,
+            confidence=confidence,
+            response=response_text,
+            sources=sources,
+            context=context,
+            status=status,
+            retrieval_time=retrieval_time,
+            generation_time=generation_time,
+            cumulative_tokens=cumulative_tokens,
+            cumulative_cost=cumulative_cost,
+            answer_cache_hit=bool(cached),
+            prompt_tokens_saved=budget_report["tokens_saved"] if budget_report else None,
+            retrieval_action=plan["action"] if plan else None
+        )
         
         # Prepare source UIDs (patent-ready field)
         source_uids = [f"UID:doc:{hash(src)}" for src in sources] if sources else []
@@ -322,19 +570,211 @@ async def chat(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
 
+def sse_event(event: str, data: dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    db = Depends(get_db)
+):
+    """
+    Streaming chat endpoint - same pipeline as /api/chat, delivered as
+    server-sent events: routing, sources, token (repeated), then done.
+    The assistant message is persisted once the stream finishes.
+    Stages share one deadline, as in /api/chat.
+    """
+    deadline = Deadline(CHAT_REQUEST_SLO)
+    try:
+        session, user_context, conversation_context = await prepare_turn(request, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
+
+    async def event_stream():
+        start = time.time()
+        domain, confidence = detect_domain(request.message)
+        yield sse_event("routing", {
+            "session_id": session.session_id,
+            "domain": domain,
+            "confidence": confidence
+        })
+
+        response_text = ""
+        sources = []
+        status = ""
+        context = ""
+        retrieval_time = None
+        generation_time = None
+        time_to_first_token = None
+        cumulative_tokens = None
+        cumulative_cost = None
+        cache_scope = None
+        query_vector = None
+        cached = None
+        extra_metadata = None
+        budget_report = None
+        plan = None
+        max_tokens = None
+
+        try:
+            demo_response = get_demo_response(request.message, domain)
+
+            if demo_response:
+                response_text = demo_response['response']
+                sources = demo_response['sources']
+                status = demo_response['status']
+                yield sse_event("sources", {"sources": sources})
+                time_to_first_token = time.time() - start
+                yield sse_event("token", {"text": response_text})
+
+            elif domain == 'holistic' and deadline.expired():
+                response_text = DEADLINE_EXPIRED_RESPONSE
+                status = 'timeout'
+                yield sse_event("sources", {"sources": sources})
+                time_to_first_token = time.time() - start
+                yield sse_event("token", {"text": response_text})
+
+            elif domain == 'holistic':
+                cache_scope, query_vector, cached = await find_cached_answer(
+                    request, user_context, conversation_context, deadline
+                )
+                if cached:
+                    payload, similarity = cached
+                    response_text = payload['response']
+                    sources = payload['sources']
+                    extra_metadata = cache_hit_metadata(payload, similarity)
+                    yield sse_event("sources", {"sources": sources})
+                    time_to_first_token = time.time() - start
+                    yield sse_event("token", {"text": response_text})
+                    stream = iter(())
+                else:
+                    context, sources, retrieval_time, budget_report, extra_metadata, plan = await build_prompt_context(
+                        request, session, confidence, conversation_context, deadline
+                    )
+                    yield sse_event("sources", {"sources": sources})
+                    stream = stream_response(
+                        request.message, context, user_context=user_context, user_id=request.user_id,
+                        deadline=generation_deadline(deadline)
+                    )
+
+                while True:
+                    event = await run_blocking(next, stream, None)
+                    if event is None:
+                        break
+                    if event["type"] == "token":
+                        if time_to_first_token is None:
+                            time_to_first_token = time.time() - start
+                        yield sse_event("token", {"text": event["text"]})
+                    elif event["type"] == "done":
+                        response_text = event["response"]
+                        generation_time = event["generation_time"]
+                        cumulative_tokens = event["tokens"]
+                        cumulative_cost = event["cost"]
+                        max_tokens = event.get("max_tokens")
+                        if event.get("model") or event.get("attempts"):
+                            extra_metadata = {**(extra_metadata or {}), **generation_metadata(event)}
+                status = 'live'
+
+            else:
+                response_text = get_coming_soon_message(domain, request.message)
+                status = 'coming-soon'
+                yield sse_event("sources", {"sources": sources})
+                time_to_first_token = time.time() - start
+                yield sse_event("token", {"text": response_text})
+
+        except Exception as e:
+            response_text = f"I encountered an error processing your request: {str(e)}"
+            sources = []
+            status = 'error'
+            yield sse_event("error", {"detail": response_text})
+
+        latency_tracker.record("chat_stream.ttft", time_to_first_token)
+        extra_metadata = {**(extra_metadata or {}), **deadline_metadata(deadline, max_tokens)}
+
+        try:
+            # Same hash and metadata as the non-streaming endpoint
+            user_message, assistant_message = await run_blocking(
+                crud.create_chat_turn,
+                db,
+                session,
+                request.message,
+                response_text,
+                title=session_title(request.message),
+                timeout=persist_timeout(deadline),
+                domain=domain,
+                confidence=confidence,
+                sources=sources,
+                status=status,
+                retrieval_time=retrieval_time,
+                generation_time=generation_time,
+                extra_metadata=extra_metadata
+            )
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Failed to save response: {str(e)}"})
+            return
+        if not cached:
+            remember_answer(cache_scope, query_vector, assistant_message, sources, status, extra_metadata)
+
+        await log_to_monitor(
+            request,
+            domain=domain,
+            confidence=confidence,
+            response=response_text,
+            sources=sources,
+            latency=time.time() - start,
+            context=context,
+            status=status,
+            retrieval_time=retrieval_time,
+            generation_time=generation_time,
+            cumulative_tokens=cumulative_tokens,
+            cumulative_cost=cumulative_cost,
+            time_to_first_token=time_to_first_token,
+            answer_cache_hit=bool(cached),
+            prompt_tokens_saved=budget_report["tokens_saved"] if budget_report else None,
+            retrieval_action=plan["action"] if plan else None
+        )
+
+        yield sse_event("done", {
+            "session_id": session.session_id,
+            "message_id": assistant_message.message_id,
+            "status": status,
+            "timestamp": assistant_message.timestamp.isoformat(),
+            "content_hash": assistant_message.content_hash,
+            "source_document_uids": assistant_message.source_document_uids or [],
+            "time_to_first_token": time_to_first_token
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/sessions/{session_id}/messages", response_model=List[MessageHistory])
 async def get_messages(
     session_id: str,
+    response: Response,
     limit: int = 50,
-    db = Depends(get_db)
+    cursor: Optional[str] = None,
+    db = Depends(get_read_db)
 ):
-    """Get message history for a session"""
+    """
+    Get message history for a session
+    Keyset-paginated: pass the X-Next-Cursor header back as ?cursor= for the next page
+    """
     try:
-        session = crud.get_session(db, session_id)
+        session = await read_history(crud.get_session, async_crud.get_session, db, session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        messages = crud.get_session_messages(db, session_id, limit)
+        messages = await read_history(
+            crud.get_session_messages_page, async_crud.get_session_messages_page, db, session_id, limit, after=cursor
+        )
+        if len(messages) == limit:
+            response.headers[NEXT_CURSOR_HEADER] = crud.encode_cursor(messages[-1].timestamp, messages[-1].message_id)
         
         return [
             MessageHistory(
@@ -349,11 +789,13 @@ async def get_messages(
         ]
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch messages: {str(e)}")
 
 @app.delete("/api/sessions/{session_id}")
-async def delete_session(
+def delete_session(
     session_id: str,
     db = Depends(get_db)
 ):
@@ -362,6 +804,7 @@ async def delete_session(
         success = crud.delete_session(db, session_id)
         if not success:
             raise HTTPException(status_code=404, detail="Session not found")
+        get_session_cache().evict(session_id)
         
         return {"status": "success", "message": "Session deleted"}
     except HTTPException:
@@ -372,7 +815,7 @@ async def delete_session(
 # === User Endpoints ===
 
 @app.post("/api/users/create")
-async def create_user(
+def create_user(
     user_data: UserCreate,
     db = Depends(get_db)
 ):
@@ -396,7 +839,7 @@ async def create_user(
         raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
 
 @app.get("/api/users/{user_id}", response_model=UserProfile)
-async def get_user_profile(
+def get_user_profile(
     user_id: str,
     db = Depends(get_db)
 ):
@@ -419,7 +862,7 @@ async def get_user_profile(
         raise HTTPException(status_code=500, detail=f"Failed to get user: {str(e)}")
 
 @app.put("/api/users/{user_id}/preferences")
-async def update_user_preferences(
+def update_user_preferences(
     user_id: str,
     prefs: UserPreferencesUpdate,
     db = Depends(get_db)
@@ -443,7 +886,7 @@ async def update_user_preferences(
         raise HTTPException(status_code=500, detail=f"Failed to update preferences: {str(e)}")
 
 @app.get("/api/stats/{user_id}", response_model=UserStats)
-async def get_user_stats(
+def get_user_stats(
     user_id: str,
     db = Depends(get_db)
 ):
@@ -456,11 +899,16 @@ async def get_user_stats(
 
 @app.get("/api/health")
 async def health_check():
-    """Detailed health check"""
+    """Detailed health check (degraded while any circuit breaker is open)"""
+    breakers = breaker_states()
+    monitor = get_monitor()
     return {
-        "status": "healthy",
+        "status": "degraded" if any(b["state"] != "closed" for b in breakers.values()) else "healthy",
+        "circuit_breakers": breakers,
         "components": {
             "database": "connected",
+            "database_pool": get_pool_status(),
+            "lexical_index_size": len(get_bm25_index()) if HYBRID_SEARCH_ENABLED else None,
             "pinecone": "connected" if os.getenv("PINECONE_API_KEY") else "not configured",
             "cohere": "connected" if os.getenv("COHERE_API_KEY") else "not configured",
             "groq": "connected" if os.getenv("GROQ_API_KEY") else "not configured",
@@ -469,6 +917,25 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/api/metrics")
+async def metrics():
+    """In-process latency, cache, prompt budget and retrieval planner metrics"""
+    answer_cache = get_answer_cache()
+    return {
+        "latency": latency_tracker.summary(),
+        "caches": {
+            "query_embeddings": get_embedding_cache_stats(),
+            "answers": answer_cache.stats() if answer_cache else None,
+            "session_retrieval": get_session_cache().stats(),
+            "completions": get_completion_cache_stats()
+        },
+        "context_budget": get_context_budget_stats(),
+        "retrieval_plan": get_retrieval_plan_stats(),
+        "groq_scheduler": get_groq_scheduler().stats(),
+        "cohere_scheduler": get_cohere_scheduler().stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 @app.get("/test-db")
 def test_database():
     """Test database connection"""
@@ -0,0 +1,134 @@
+"""
+Management commands for Ombee AI
+Usage:
+    python manage.py migrate [--concurrently]
+    python manage.py rebuild-stats [--user USER_ID]
+    python manage.py ingest PATH [PATH ...] [--workers N]
+    python manage.py rebuild-lexical [--if-empty]
+"""
+import argparse
+import os
+from database import SessionLocal, engine
+import models
+import crud
+import migrations
+
+def migrate(args):
+    """Create missing tables and indexes on an existing database"""
+    ensured = migrations.run_migrations(engine, concurrently=args.concurrently)
+    print(f"Schema up to date ({len(ensured)} indexes ensured)")
+
+def rebuild_stats(args):
+    """Backfill/rebuild the user_stats table from message history"""
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.user:
+            crud.rebuild_user_stats(db, args.user)
+            print(f"Rebuilt stats for user {args.user}")
+        else:
+            count = crud.rebuild_all_user_stats(db)
+            print(f"Rebuilt stats for {count} users")
+    finally:
+        db.close()
+
+def collect_documents(paths: list) -> list:
+    """(filename, content) for every .txt file under the given files/directories"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(".txt"))
+        else:
+            files.append(path)
+    documents = []
+    for file_path in files:
+        with open(file_path, encoding="utf-8") as f:
+            documents.append((os.path.basename(file_path), f.read()))
+    return documents
+
+def ingest(args):
+    """Bulk-load .txt documents into the knowledge base"""
+    from src.config import INGEST_WORKERS
+    from src.ingest import ingest_documents
+    from src.answer_cache import bump_kb_version
+
+    workers = args.workers or INGEST_WORKERS
+    documents = collect_documents(args.paths)
+    print(f"Ingesting {len(documents)} documents with {workers} workers")
+
+    def on_document(filename, result, error, stats):
+        if error:
+            status = f"FAILED: {error}"
+        elif result["skipped"]:
+            status = "unchanged"
+        else:
+            status = f"{result['embedded']} new, {result['unchanged']} unchanged, {result['deleted']} removed chunks"
+        print(
+            f"[{stats.processed}/{stats.total_documents}] {filename}: {status} "
+            f"({stats.chunks_per_second:.1f} chunks/sec, "
+            f"cohere limit {stats.throttle['cohere']['limit']}, vector store limit {stats.throttle['vector_store']['limit']})"
+        )
+
+    stats = ingest_documents(documents, on_document=on_document, workers=workers)
+    if stats.documents:
+        bump_kb_version()
+    print(
+        f"Done: {stats.documents} updated, {stats.skipped_documents} unchanged, {stats.failed_documents} failed, "
+        f"{stats.chunks} chunks embedded, {stats.deleted_chunks} deleted "
+        f"in {stats.seconds:.1f}s ({stats.chunks_per_second:.1f} chunks/sec, {stats.throttle['retries']} retries)"
+    )
+
+def rebuild_lexical(args):
+    """Rebuild the local BM25 keyword index from the chunks in the vector store"""
+    from src.bm25 import get_bm25_index
+    from src.vector_store import get_vector_store
+
+    lexical = get_bm25_index()
+    if args.if_empty and len(lexical):
+        print(f"Keyword index already holds {len(lexical)} chunks, skipping")
+        return
+
+    seen = set()
+    for batch in get_vector_store().records(batch_size=args.batch_size):
+        chunks = [
+            {"id": record["id"], "text": record["metadata"]["text"], "metadata": record["metadata"]}
+            for record in batch if record["metadata"].get("text")
+        ]
+        lexical.add(chunks)
+        seen.update(chunk["id"] for chunk in chunks)
+        print(f"Indexed {len(seen)} chunks")
+    stale = [id_ for id_ in lexical.ids() if id_ not in seen]
+    lexical.delete(stale)
+    print(f"Keyword index rebuilt: {len(seen)} chunks ({len(stale)} stale removed)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Ombee AI management commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Create missing tables and indexes")
+    migrate_parser.add_argument(
+        "--concurrently", action="store_true",
+        help="PostgreSQL: build indexes without blocking writes"
+    )
+    migrate_parser.set_defaults(func=migrate)
+
+    stats_parser = subparsers.add_parser("rebuild-stats", help="Rebuild per-user stats from message history")
+    stats_parser.add_argument("--user", help="Only rebuild this user_id")
+    stats_parser.set_defaults(func=rebuild_stats)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Chunk, embed and upload .txt documents")
+    ingest_parser.add_argument("paths", nargs="+", help="Files or directories of .txt files")
+    ingest_parser.add_argument("--workers", type=int, default=None, help="Documents processed in parallel (default: INGEST_WORKERS)")
+    ingest_parser.set_defaults(func=ingest)
+
+    lexical_parser = subparsers.add_parser("rebuild-lexical", help="Rebuild the BM25 keyword index from the vector store")
+    lexical_parser.add_argument("--if-empty", action="store_true", help="Only rebuild when the local index is empty (deploys)")
+    lexical_parser.add_argument("--batch-size", type=int, default=100, help="Records fetched per vector store call")
+    lexical_parser.set_defaults(func=rebuild_lexical)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
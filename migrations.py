@@ -0,0 +1,37 @@
+"""
+Schema migrations for existing databases
+create_all() only creates missing tables, so indexes added to models later
+never reach databases created before them. run_migrations() creates any
+missing tables and indexes idempotently (IF NOT EXISTS), so it is safe to
+run on every deploy and from several workers at once.
+"""
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+import models
+
+def run_migrations(engine: Engine, concurrently: bool = False) -> list:
+    """
+    Create missing tables and indexes.
+    concurrently: on PostgreSQL, build indexes with CREATE INDEX CONCURRENTLY
+    so large tables stay writable during the build.
+    Returns: names of indexes that were ensured
+    """
+    models.Base.metadata.create_all(bind=engine)
+
+    use_concurrently = concurrently and engine.dialect.name == "postgresql"
+    ensured = []
+    for table in models.Base.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda idx: idx.name):
+            if use_concurrently:
+                # CONCURRENTLY cannot run inside a transaction block
+                index.dialect_options["postgresql"]["concurrently"] = True
+                try:
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                        conn.execute(CreateIndex(index, if_not_exists=True))
+                finally:
+                    index.dialect_options["postgresql"]["concurrently"] = False
+            else:
+                with engine.begin() as conn:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+            ensured.append(index.name)
+    return ensured
@@ -2,7 +2,7 @@
 Database models with patent-ready architecture
 Patent-ready architecture with UID placeholders
 """
-from sqlalchemy import Column, String, DateTime, Float, Text, Boolean, JSON, ForeignKey, Integer
+from sqlalchemy import Column, String, DateTime, Float, Text, Boolean, JSON, ForeignKey, Integer, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -26,6 +26,19 @@ class User(Base):
     # Relationships
     sessions = relationship("Session", back_populates="user", cascade="all, delete-orphan")
 
+class UserStats(Base):
+    """Per-user aggregate counters, maintained incrementally by crud writes"""
+    __tablename__ = "user_stats"
+    
+    user_id = Column(String, primary_key=True)
+    total_sessions = Column(Integer, default=0, nullable=False)  # Sessions with at least one message
+    total_messages = Column(Integer, default=0, nullable=False)
+    total_queries = Column(Integer, default=0, nullable=False)  # Messages with role='user'
+    domains_used = Column(JSON, default=dict)  # Domain -> assistant message count
+    generation_time_sum = Column(Float, default=0.0, nullable=False)  # Seconds
+    generation_time_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Session(Base):
     """Chat sessions with conversation history"""
     __tablename__ = "sessions"
@@ -40,6 +53,11 @@ class Session(Base):
     # Relationships
     user = relationship("User", back_populates="sessions")
     messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
+    
+    # Session list: filter by user, newest first (session_id breaks ties for keyset pagination)
+    __table_args__ = (
+        Index("ix_sessions_user_updated", "user_id", "updated_at", "session_id"),
+    )
 
 class Message(Base):
     """Individual messages in conversations"""
@@ -64,6 +82,11 @@ class Message(Base):
     # Relationships
     session = relationship("Session", back_populates="messages")
     
+    # Session history: filter by session, ordered by time (message_id breaks ties for keyset pagination)
+    __table_args__ = (
+        Index("ix_messages_session_timestamp", "session_id", "timestamp", "message_id"),
+    )
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # Auto-generate content hash on creation
@@ -87,6 +110,10 @@ class AuditLog(Base):
     details = Column(JSON, default=dict)  # Additional context
     trust_score = Column(Float, nullable=True)  # PATENT: Trust/reputation score
     verified = Column(Boolean, default=False)  # PATENT: Cryptographic verification status
+    
+    __table_args__ = (
+        Index("ix_audit_logs_timestamp", "timestamp"),
+    )
 
 class AIAgent(Base):
     """AI Agent tracking (PATENT: SubUID system for agent hierarchy)"""
@@ -4,10 +4,10 @@ Access at: http://localhost:8501/admin_upload
 """
 
 import streamlit as st
-from pinecone import Pinecone
-import cohere
 import hashlib
-from src.config import ADMIN_PASSWORD_HASH, PINECONE_API_KEY, COHERE_API_KEY, PINECONE_INDEX_NAME
+from src.config import ADMIN_PASSWORD_HASH
+from src.answer_cache import bump_kb_version
+from src.ingest import get_clients, ingest_documents
 
 def check_password():
     """Returns `True` if the user had the correct password."""
@@ -39,43 +39,10 @@ def check_password():
     else:
         return True
 
-def process_and_upload_document(file_content, filename):
-    """Process document and upload to Pinecone using Cohere embeddings"""
-    try:
-        # Initialize clients
-        pc = Pinecone(api_key=PINECONE_API_KEY)
-        co = cohere.Client(api_key=COHERE_API_KEY)
-        
-        # FIXED: Remove the second parameter - let Pinecone auto-detect the host
-        index = pc.Index(PINECONE_INDEX_NAME)
-        
-        # Create document ID
-        doc_id = filename.replace('.txt', '').replace(' ', '_').replace('.', '_')
-        
-        # Get embedding from Cohere
-        response = co.embed(
-            texts=[file_content],
-            model="embed-english-v3.0",
-            input_type="search_document"
-        )
-        embedding = response.embeddings[0]
-        
-        # Prepare vector
-        vector = {
-            "id": doc_id,
-            "values": embedding,
-            "metadata": {
-                "source": filename,
-                "text": file_content[:1000]  # Store first 1000 chars
-            }
-        }
-        
-        # Upload to Pinecone
-        index.upsert(vectors=[vector])
-        
-        return True, None
-    except Exception as e:
-        return False, str(e)
+@st.cache_resource
+def get_ingestion_clients():
+    """Vector store and Cohere client shared by all uploads in this process"""
+    return get_clients()
 
 # Page config
 st.set_page_config(
@@ -140,39 +107,57 @@ with col1:
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            success_count = 0
-            error_count = 0
-            
-            for idx, file in enumerate(uploaded_files):
-                status_text.text(f"Processing {file.name}...")
-                
-                # Read file content
-                content = file.read().decode('utf-8')
-                
-                # Process and upload
-                success, error = process_and_upload_document(content, file.name)
-                
-                if success:
-                    success_count += 1
-                    st.success(f"✅ Uploaded: {file.name}")
+            def on_document(filename, result, error, stats):
+                if error:
+                    st.error(f"❌ Failed: {filename} - {error}")
+                elif result["skipped"]:
+                    st.info(f"⏭️ Unchanged: {filename}")
                 else:
-                    error_count += 1
-                    st.error(f"❌ Failed: {file.name} - {error}")
-                
-                # Update progress
-                progress_bar.progress((idx + 1) / len(uploaded_files))
+                    st.success(
+                        f"✅ Uploaded: {filename} ({result['embedded']} new chunks, "
+                        f"{result['unchanged']} unchanged, {result['deleted']} removed)"
+                    )
+                progress_bar.progress(stats.processed / stats.total_documents)
+                status_text.text(
+                    f"Processed {stats.processed}/{stats.total_documents} files - "
+                    f"{stats.chunks_per_second:.1f} chunks/sec - "
+                    f"concurrency: Cohere {stats.throttle['cohere']['limit']:.0f}, vector store {stats.throttle['vector_store']['limit']:.0f}"
+                )
+            
+            status_text.text("Processing...")
+            documents = [(file.name, file.read().decode('utf-8')) for file in uploaded_files]
+            index, co = get_ingestion_clients()
+            stats = ingest_documents(documents, index, co, on_document=on_document)
+            success_count = stats.documents
+            error_count = stats.failed_documents
             
             status_text.empty()
             progress_bar.empty()
             
+            # Knowledge base changed - invalidate cached answers in every API worker
+            if success_count > 0:
+                bump_kb_version()
+            
             # Final summary
             st.markdown("---")
             st.markdown("### 📊 Upload Summary")
-            col_a, col_b = st.columns(2)
+            col_a, col_b, col_c, col_d, col_e = st.columns(5)
             with col_a:
                 st.metric("✅ Successful", success_count)
             with col_b:
+                st.metric("⏭️ Unchanged", stats.skipped_documents)
+            with col_c:
                 st.metric("❌ Failed", error_count)
+            with col_d:
+                st.metric("🧩 Chunks", stats.chunks)
+            with col_e:
+                st.metric("⚡ Chunks/sec", f"{stats.chunks_per_second:.1f}")
+            st.caption(
+                f"{stats.tokens:,} tokens embedded in {stats.seconds:.1f}s - "
+                f"{stats.unchanged_chunks} unchanged chunks reused, {stats.deleted_chunks} removed - "
+                f"{stats.throttle['retries']} retries, "
+                f"{stats.throttle['cohere']['throttled'] + stats.throttle['vector_store']['throttled']} rate-limited calls"
+            )
             
             if success_count > 0:
                 st.balloons()
@@ -190,7 +175,8 @@ with col2:
     - Only .txt files are supported
     - Files should be UTF-8 encoded
     - Large files may take longer to process
-    - Each file creates one vector in Pinecone
+    - Each file is split into overlapping chunks; each chunk is one vector
+    - Re-uploading a file only re-embeds chunks that changed
     
     **File Naming:**
     Use descriptive names like:
@@ -205,8 +191,7 @@ with col2:
     st.markdown("### 📊 Current Index Stats")
     
     try:
-        pc = Pinecone(api_key=PINECONE_API_KEY)
-        index = pc.Index(PINECONE_INDEX_NAME)
+        index, _ = get_ingestion_clients()
         stats = index.describe_index_stats()
         
         st.metric("Total Vectors", stats['total_vector_count'])
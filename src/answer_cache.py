@@ -0,0 +1,185 @@
+"""
+Semantic answer cache for holistic questions.
+Reuses a prior answer when a new query's embedding is close enough to a cached
+one (cosine similarity >= threshold). Entries are partitioned by scope so
+personalized answers never leak across users, and the whole cache is dropped
+when the knowledge base version changes (see bump_kb_version).
+"""
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+from src.config import (
+    CACHE_DIR, ANSWER_CACHE_ENABLED, ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_MAX_SCOPES
+)
+
+KB_VERSION_FILE = os.path.join(CACHE_DIR, "kb_version") if CACHE_DIR else None
+_local_kb_version = 0
+
+def kb_version() -> int:
+    """Current knowledge base version (shared via OMBEE_CACHE_DIR when set)"""
+    if KB_VERSION_FILE:
+        try:
+            return os.stat(KB_VERSION_FILE).st_mtime_ns
+        except OSError:
+            return 0
+    return _local_kb_version
+
+def bump_kb_version():
+    """Mark the knowledge base as changed, invalidating cached answers in every worker"""
+    global _local_kb_version
+    _local_kb_version += 1
+    if KB_VERSION_FILE:
+        try:
+            os.makedirs(os.path.dirname(KB_VERSION_FILE), exist_ok=True)
+            with open(KB_VERSION_FILE, "w") as f:
+                f.write(str(time.time_ns()))
+        except OSError as e:
+            print(f"Failed to bump knowledge base version: {e}")
+
+def answer_scope(user_id: Optional[str], user_context=None) -> str:
+    """
+    Cache partition for a request. Non-personalized answers share the global
+    scope; personalized ones are keyed by user and profile contents.
+    """
+    if not user_context:
+        return "global"
+    profile = json.dumps(user_context, sort_keys=True, default=str)
+    digest = hashlib.sha256(f"{user_id}\x00{profile}".encode("utf-8")).hexdigest()
+    return f"user:{digest}"
+
+class _ScopeEntries:
+    """Embeddings matrix and payloads for one scope, oldest first"""
+
+    def __init__(self, dim: int):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.payloads = []
+        self.created = []
+
+class SemanticAnswerCache:
+    """Similarity-based answer cache partitioned by scope"""
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int, max_scopes: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_scopes = max_scopes
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+        self._kb_version = kb_version()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def lookup(self, scope: str, vector: np.ndarray):
+        """
+        Find the most similar cached answer in a scope.
+        Returns: (payload, similarity) or None
+        """
+        query = _normalize(vector)
+        with self._lock:
+            self._check_kb_version()
+            entries = self._scopes.get(scope)
+            if entries is None or not entries.payloads or entries.vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            self._scopes.move_to_end(scope)
+            self._expire(entries)
+            if not entries.payloads:
+                self.misses += 1
+                return None
+
+            similarities = entries.vectors @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entries.payloads[best], similarity
+
+    def store(self, scope: str, vector: np.ndarray, payload: dict):
+        """Add an answer to a scope, evicting the oldest entries/scopes past their limits"""
+        row = _normalize(vector)
+        with self._lock:
+            self._check_kb_version()
+            entries = self._scopes.get(scope)
+            if entries is None or entries.vectors.shape[1] != row.shape[0]:
+                entries = self._scopes[scope] = _ScopeEntries(row.shape[0])
+            self._scopes.move_to_end(scope)
+
+            entries.vectors = np.vstack([entries.vectors, row[None, :]])
+            entries.payloads.append(payload)
+            entries.created.append(time.time())
+            overflow = len(entries.payloads) - self.max_entries
+            if overflow > 0:
+                entries.vectors = entries.vectors[overflow:]
+                del entries.payloads[:overflow]
+                del entries.created[:overflow]
+
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+
+    def invalidate(self, scope: Optional[str] = None):
+        """Drop one scope, or everything when scope is None"""
+        with self._lock:
+            if scope is None:
+                self._scopes.clear()
+            else:
+                self._scopes.pop(scope, None)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters and size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "scopes": len(self._scopes),
+                "entries": sum(len(e.payloads) for e in self._scopes.values()),
+                "threshold": self.threshold
+            }
+
+    def _check_kb_version(self):
+        # Caller holds the lock
+        current = kb_version()
+        if current != self._kb_version:
+            self._scopes.clear()
+            self._kb_version = current
+            self.invalidations += 1
+
+    def _expire(self, entries: _ScopeEntries):
+        # Entries are appended in time order, so expired ones form a prefix
+        cutoff = time.time() - self.ttl
+        expired = 0
+        while expired < len(entries.created) and entries.created[expired] < cutoff:
+            expired += 1
+        if expired:
+            entries.vectors = entries.vectors[expired:]
+            del entries.payloads[:expired]
+            del entries.created[:expired]
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl=ANSWER_CACHE_TTL,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    max_scopes=ANSWER_CACHE_MAX_SCOPES
+)
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """The process-wide answer cache, or None when disabled"""
+    return answer_cache if ANSWER_CACHE_ENABLED else None
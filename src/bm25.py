@@ -0,0 +1,188 @@
+"""
+In-process BM25 keyword index over ingested chunks.
+Dense retrieval misses rare exact terms (supplement names, "intermittent
+fasting"); BM25 catches them. The index lives in a SQLite file (postings as
+(term, chunk_id, tf) rows, WITHOUT ROWID) so it is compact, shared by every
+worker on the host and updated incrementally by the ingestion pipeline.
+Writes go through one connection under a lock; searches use a read-only
+connection per thread so concurrent queries run in parallel (WAL mode).
+Hosts with no local copy (fresh deploys) fill it from the vector store with
+`python manage.py rebuild-lexical`.
+"""
+from src.config import BM25_INDEX_PATH
+from collections import Counter
+from typing import List
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+
+K1 = 1.2
+B = 0.75
+
+_TERM_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from had has have how i if in into is it its "
+    "me my no not of on or our so than that the their them then there these they this to was "
+    "we were what when where which who why will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms without stopwords"""
+    return [term for term in _TERM_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+class BM25Index:
+    """Persistent BM25 index keyed by chunk id"""
+
+    def __init__(self, path: str = BM25_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, length INTEGER NOT NULL, metadata TEXT NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS postings "
+            "(term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, id)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_postings_id ON postings (id)")
+        self._db.commit()
+
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's read-only connection (searches never wait on the write lock)"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA query_only=ON")
+        return db
+
+    def _stat(self, key: str, db: sqlite3.Connection = None) -> int:
+        row = (db or self._db).execute("SELECT value FROM stats WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _add_stat(self, key: str, delta: int):
+        self._db.execute(
+            "INSERT INTO stats (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+            (key, delta)
+        )
+
+    def _delete_locked(self, ids: List[str]) -> int:
+        removed = 0
+        for id_ in ids:
+            row = self._db.execute("SELECT length FROM chunks WHERE id = ?", (id_,)).fetchone()
+            if row is None:
+                continue
+            self._db.execute("DELETE FROM postings WHERE id = ?", (id_,))
+            self._db.execute("DELETE FROM chunks WHERE id = ?", (id_,))
+            self._add_stat("documents", -1)
+            self._add_stat("total_length", -row[0])
+            removed += 1
+        return removed
+
+    def add(self, chunks: List[dict]):
+        """Index (or re-index) {"id", "text", "metadata"} chunks"""
+        if not chunks:
+            return
+        with self._lock:
+            try:
+                self._delete_locked([chunk["id"] for chunk in chunks])
+                for chunk in chunks:
+                    terms = Counter(tokenize(chunk["text"]))
+                    length = sum(terms.values())
+                    self._db.execute(
+                        "INSERT INTO chunks (id, length, metadata) VALUES (?, ?, ?)",
+                        (chunk["id"], length, json.dumps(chunk.get("metadata") or {"text": chunk["text"]}))
+                    )
+                    self._db.executemany(
+                        "INSERT INTO postings (term, id, tf) VALUES (?, ?, ?)",
+                        [(term, chunk["id"], tf) for term, tf in terms.items()]
+                    )
+                    self._add_stat("documents", 1)
+                    self._add_stat("total_length", length)
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+
+    def delete(self, ids: List[str]) -> int:
+        """Remove chunks from the index; returns how many were present"""
+        with self._lock:
+            try:
+                removed = self._delete_locked(ids)
+                self._db.commit()
+                return removed
+            except Exception:
+                self._db.rollback()
+                raise
+
+    def __len__(self) -> int:
+        return self._stat("documents", self._reader())
+
+    def ids(self) -> List[str]:
+        """Every indexed chunk id"""
+        return [row[0] for row in self._reader().execute("SELECT id FROM chunks")]
+
+    def search(self, query: str, top_k: int = 10) -> List[dict]:
+        """
+        BM25-ranked chunks for a query
+        Returns: [{"id", "score", "metadata"}, ...], best first
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        db = self._reader()
+        db.execute("BEGIN")  # Stats, postings and metadata from one snapshot
+        try:
+            return self._score(db, terms, top_k)
+        finally:
+            db.commit()
+
+    def _score(self, db: sqlite3.Connection, terms: set, top_k: int) -> List[dict]:
+        """search() body, run inside a read transaction on db"""
+        documents = self._stat("documents", db)
+        if documents <= 0:
+            return []
+        avg_length = max(self._stat("total_length", db) / documents, 1e-9)
+        placeholders = ",".join("?" * len(terms))
+        postings = db.execute(
+            f"SELECT p.term, p.id, p.tf, c.length FROM postings p JOIN chunks c ON c.id = p.id "
+            f"WHERE p.term IN ({placeholders})",
+            list(terms)
+        ).fetchall()
+
+        df = Counter(term for term, _, _, _ in postings)
+        scores = {}
+        for term, id_, tf, length in postings:
+            idf = math.log(1 + (documents - df[term] + 0.5) / (df[term] + 0.5))
+            norm = tf + K1 * (1 - B + B * length / avg_length)
+            scores[id_] = scores.get(id_, 0.0) + idf * tf * (K1 + 1) / norm
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        if not best:
+            return []
+        placeholders = ",".join("?" * len(best))
+        metadata = dict(db.execute(
+            f"SELECT id, metadata FROM chunks WHERE id IN ({placeholders})",
+            [id_ for id_, _ in best]
+        ).fetchall())
+        return [
+            {"id": id_, "score": score, "metadata": json.loads(metadata.get(id_, "{}"))}
+            for id_, score in best
+        ]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_bm25_index() -> BM25Index:
+    """The shared BM25 index (opened on first use)"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = BM25Index()
+    return _index
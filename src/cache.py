@@ -0,0 +1,146 @@
+"""
+Two-tier cache used by the RAG pipeline.
+- Memory tier: TTL + LRU eviction, bounded by an item-size function (e.g. bytes)
+- Disk tier (optional): SQLite file shared by all uvicorn workers on the host
+"""
+import sqlite3
+import threading
+import time
+import os
+from cachetools import TTLCache
+
+class TieredCache:
+    """In-process TTL/LRU cache with an optional shared SQLite tier"""
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int,
+        ttl: float,
+        getsizeof=None,
+        disk_path: str = None,
+        serialize=None,
+        deserialize=None
+    ):
+        self.name = name
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=max_size, ttl=ttl, getsizeof=getsizeof)
+        self._lock = threading.Lock()
+        self._serialize = serialize or (lambda value: value)
+        self._deserialize = deserialize or (lambda blob: blob)
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._disk_writes = 0
+        if disk_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+                self._db = sqlite3.connect(disk_path, timeout=5, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self._table} "
+                    "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"{name} cache: disk tier disabled ({e})")
+                self._db = None
+
+    @property
+    def _table(self) -> str:
+        return "cache_" + "".join(c if c.isalnum() else "_" for c in self.name)
+
+    def get(self, key: str):
+        """Return the cached value or None"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self.memory_hits += 1
+                return value
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, value)
+        return value
+
+    def set(self, key: str, value):
+        """Store a value in both tiers"""
+        with self._lock:
+            self._put_memory(key, value)
+        self._disk_set(key, value)
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                try:
+                    self._db.execute(f"DELETE FROM {self._table}")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"{self.name} cache: disk clear failed ({e})")
+
+    def stats(self) -> dict:
+        """Hit/miss counters and memory usage"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+                "entries": len(self._memory),
+                "size": self._memory.currsize,
+                "max_size": self._memory.maxsize,
+                "disk_tier": self._db is not None
+            }
+
+    def _put_memory(self, key: str, value):
+        # Values larger than the whole cache are simply not kept in memory
+        try:
+            self._memory[key] = value
+        except ValueError:
+            pass
+
+    def _disk_get(self, key: str):
+        if self._db is None:
+            return None
+        with self._db_lock:
+            try:
+                row = self._db.execute(
+                    f"SELECT value, expires_at FROM {self._table} WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"{self.name} cache: disk read failed ({e})")
+                return None
+        if row is None or row[1] < time.time():
+            return None
+        return self._deserialize(row[0])
+
+    def _disk_set(self, key: str, value):
+        if self._db is None:
+            return
+        with self._db_lock:
+            try:
+                now = time.time()
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self._table} (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, self._serialize(value), now + self.ttl)
+                )
+                self._disk_writes += 1
+                if self._disk_writes % 256 == 0:
+                    # Purge expired rows occasionally rather than on every write
+                    self._db.execute(f"DELETE FROM {self._table} WHERE expires_at < ?", (now,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"{self.name} cache: disk write failed ({e})")
@@ -0,0 +1,48 @@
+"""
+Lazy, process-wide clients for the external services (Cohere, Groq).
+Nothing is imported or connected until a client is first used, so importing
+the app is fast and works offline (no keys, no network). Each factory is
+thread-safe: concurrent first calls build one client. A failed creation is
+not cached - the next call tries again (the callers' circuit breakers keep
+that from hammering a dead service).
+The vector store has its own factory, src.vector_store.get_vector_store.
+"""
+from src.config import require_setting, COHERE_TIMEOUT
+import threading
+
+_clients = {}
+_locks = {}
+_locks_lock = threading.Lock()
+
+def _lazy(name: str, factory):
+    """The cached client name, created with factory() on first use"""
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _locks_lock:
+        lock = _locks.setdefault(name, threading.Lock())
+    with lock:
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = factory()
+            print(f"{name} client ready")
+        return client
+
+def new_cohere_client(timeout: float = COHERE_TIMEOUT):
+    """A fresh Cohere client (ingestion runs use their own, with a longer timeout)"""
+    import cohere
+
+    return cohere.Client(api_key=require_setting("COHERE_API_KEY"), timeout=timeout)
+
+def get_cohere_client():
+    """Shared Cohere client for query embeddings"""
+    return _lazy("Cohere", new_cohere_client)
+
+def get_groq_client():
+    """Shared Groq client for completions"""
+    def create():
+        from groq import Groq
+
+        return Groq(api_key=require_setting("GROQ_API_KEY"))
+
+    return _lazy("Groq", create)
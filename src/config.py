@@ -15,24 +15,143 @@ def get_env(key: str, default=None, required=False):
         raise EnvironmentError(f"Missing required environment variable: {key}")
     return value
 
+def require_setting(key: str):
+    """
+    A setting that must be configured, checked where it is used rather than
+    at import (so the app imports without keys, e.g. in tests and offline).
+    """
+    value = globals().get(key)
+    if not value:
+        raise EnvironmentError(f"Missing required environment variable: {key}")
+    return value
+
 # === Database Configuration ===
 DATABASE_URL = get_env("DATABASE_URL")
 
 # === Vector Database (Pinecone) Configuration ===
-PINECONE_API_KEY = get_env("PINECONE_API_KEY",required=True)
+PINECONE_API_KEY = get_env("PINECONE_API_KEY")  # Required when the client is created (require_setting)
 PINECONE_ENVIRONMENT = get_env("PINECONE_ENVIRONMENT","us-east-1")
 PINECONE_INDEX_NAME = get_env("PINECONE_INDEX_NAME","ombee-holistic")
 
+# === Vector Store Configuration ===
+VECTOR_STORE = get_env("VECTOR_STORE", "pinecone").lower()  # "pinecone" or "local"
+LOCAL_VECTOR_STORE_PATH = get_env("LOCAL_VECTOR_STORE_PATH", os.path.join(get_env("OMBEE_CACHE_DIR") or ".", "vector_store"))
+LOCAL_VECTOR_STORE_NLIST = int(get_env("LOCAL_VECTOR_STORE_NLIST", "0"))  # IVF lists; 0 = exact search only
+LOCAL_VECTOR_STORE_NPROBE = int(get_env("LOCAL_VECTOR_STORE_NPROBE", "8"))  # IVF lists scanned per query
+
+# === Hybrid Retrieval Configuration ===
+HYBRID_SEARCH_ENABLED = get_env("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+BM25_INDEX_PATH = get_env("BM25_INDEX_PATH", os.path.join(get_env("OMBEE_CACHE_DIR") or ".", "bm25.sqlite3"))
+HYBRID_CANDIDATES = int(get_env("HYBRID_CANDIDATES", "20"))  # Results fetched from each retriever before fusion
+RRF_K = int(get_env("RRF_K", "60"))  # Reciprocal rank fusion constant
+
+# === Re-ranking Configuration ===
+RETRIEVAL_FETCH_K = int(get_env("RETRIEVAL_FETCH_K", "20"))  # Vector matches fetched before re-ranking
+RETRIEVAL_MIN_SCORE = float(get_env("RETRIEVAL_MIN_SCORE", "0.2"))  # Drop vector matches below this cosine score
+MMR_ENABLED = get_env("MMR_ENABLED", "true").lower() == "true"
+MMR_LAMBDA = float(get_env("MMR_LAMBDA", "0.7"))  # 1.0 = pure relevance, 0.0 = pure diversity
+
+# === Retrieval Planner Configuration ===
+RETRIEVAL_PLANNER_ENABLED = get_env("RETRIEVAL_PLANNER_ENABLED", "true").lower() == "true"
+RETRIEVAL_TOP_K = int(get_env("RETRIEVAL_TOP_K", "5"))  # Chunks per query before the planner adjusts it
+RETRIEVAL_MIN_K = int(get_env("RETRIEVAL_MIN_K", "2"))
+RETRIEVAL_MAX_K = int(get_env("RETRIEVAL_MAX_K", "10"))
+
+# === Session Retrieval Cache Configuration ===
+SESSION_CACHE_TURNS = int(get_env("SESSION_CACHE_TURNS", "3"))  # Recent turns of chunks kept per session
+SESSION_CACHE_MAX_MB = float(get_env("SESSION_CACHE_MAX_MB", "32"))
+SESSION_CACHE_TTL = int(get_env("SESSION_CACHE_TTL", "1800"))  # seconds since the session's last turn
+SESSION_CACHE_MIN_OVERLAP = float(get_env("SESSION_CACHE_MIN_OVERLAP", "0.6"))  # Share of query terms a cached chunk must contain
+
+# === Context Budget Configuration ===
+CONTEXT_BUDGET_TOKENS = int(get_env("CONTEXT_BUDGET_TOKENS", "1500"))  # Retrieved documents per prompt
+CONTEXT_HISTORY_TOKENS = int(get_env("CONTEXT_HISTORY_TOKENS", "400"))  # Conversation history per prompt
+CONTEXT_DEDUP_THRESHOLD = float(get_env("CONTEXT_DEDUP_THRESHOLD", "0.8"))  # Trigram Jaccard for near-duplicates
+CONTEXT_MIN_CHUNK_TOKENS = int(get_env("CONTEXT_MIN_CHUNK_TOKENS", "64"))  # Smallest truncated chunk worth keeping
+
 # === Embeddings (Cohere) Configuration ===
-COHERE_API_KEY = get_env("COHERE_API_KEY",required=True)
+COHERE_API_KEY = get_env("COHERE_API_KEY")  # Required when the client is created (require_setting)
+EMBED_MODEL = get_env("COHERE_EMBED_MODEL", "embed-english-v3.0")
 
 # === LLM (Groq) Configuration ===
-GROQ_API_KEY = get_env("GROQ_API_KEY",required=True)
+GROQ_API_KEY = get_env("GROQ_API_KEY")  # Required when the client is created (require_setting)
+GROQ_MODEL = get_env("GROQ_MODEL", "llama-3.3-70b-versatile")
+# Smaller, faster models tried (in order) when the primary is slow or failing
+GROQ_FALLBACK_MODELS = [m.strip() for m in get_env("GROQ_FALLBACK_MODELS", "llama-3.1-8b-instant").split(",") if m.strip()]
+GENERATION_SLO = float(get_env("GENERATION_SLO", "4"))  # Seconds before a slow model is hedged at the latest
+HEDGE_MIN_DELAY = float(get_env("HEDGE_MIN_DELAY", "0.5"))  # Never hedge earlier than this
+GENERATION_TIMEOUT = float(get_env("GENERATION_TIMEOUT", "20"))  # Per-model request timeout (seconds)
 
 # === Monitoring (Arize Phoenix) Configuration ===
 PHOENIX_API_KEY=get_env("PHOENIX_API_KEY")
 PHOENIX_COLLECTOR_ENDPOINT=get_env("PHOENIX_COLLECTOR_ENDPOINT", "https://app.phoenix.arize.com")
 
+# === Resilience Configuration ===
+COHERE_TIMEOUT = float(get_env("COHERE_TIMEOUT", "5"))  # Seconds per query embedding call
+VECTOR_STORE_TIMEOUT = float(get_env("VECTOR_STORE_TIMEOUT", "5"))  # Seconds per vector search
+INGEST_REQUEST_TIMEOUT = float(get_env("INGEST_REQUEST_TIMEOUT", "60"))  # Seconds per ingestion embed/upsert call
+RETRY_MAX_ATTEMPTS = int(get_env("RETRY_MAX_ATTEMPTS", "2"))  # Retries after the first try (request path)
+RETRY_BACKOFF_BASE = float(get_env("RETRY_BACKOFF_BASE", "0.2"))  # Seconds; full-jitter exponential
+BREAKER_FAILURE_THRESHOLD = int(get_env("BREAKER_FAILURE_THRESHOLD", "5"))  # Consecutive failures that open a breaker
+BREAKER_RECOVERY_TIME = float(get_env("BREAKER_RECOVERY_TIME", "30"))  # Seconds before a probe call is let through
+
+# === Request Deadline Configuration ===
+CHAT_REQUEST_SLO = float(get_env("CHAT_REQUEST_SLO", "10"))  # Seconds a chat request may take end to end
+DEADLINE_PERSIST_RESERVE = float(get_env("DEADLINE_PERSIST_RESERVE", "0.5"))  # Kept back for the database writes
+DEADLINE_GENERATION_RESERVE = float(get_env("DEADLINE_GENERATION_RESERVE", "2.5"))  # Kept back for generation while retrieving
+RETRIEVAL_MIN_BUDGET = float(get_env("RETRIEVAL_MIN_BUDGET", "0.3"))  # Below this, skip retrieval
+GENERATION_TOKENS_PER_SECOND = float(get_env("GENERATION_TOKENS_PER_SECOND", "100"))  # Conservative output rate for sizing max_tokens
+GENERATION_MIN_TOKENS = int(get_env("GENERATION_MIN_TOKENS", "64"))  # max_tokens never shrinks below this
+PERSIST_MIN_TIMEOUT = float(get_env("PERSIST_MIN_TIMEOUT", "2"))  # Statement timeout floor for the chat turn write
+
+# === Groq Scheduler Configuration ===
+GROQ_MAX_CONCURRENCY = int(get_env("GROQ_MAX_CONCURRENCY", "16"))  # In-flight completions per process (0 = unlimited)
+GROQ_MAX_CONCURRENCY_PER_USER = int(get_env("GROQ_MAX_CONCURRENCY_PER_USER", "2"))  # 0 = unlimited
+GROQ_RPM_LIMIT = float(get_env("GROQ_RPM_LIMIT", "1000"))  # Requests per minute (0 disables)
+GROQ_TPM_LIMIT = float(get_env("GROQ_TPM_LIMIT", "300000"))  # Tokens per minute (0 disables)
+GROQ_QUEUE_TIMEOUT = float(get_env("GROQ_QUEUE_TIMEOUT", "60"))  # Seconds a call may wait for a slot
+
+# === Cohere Scheduler Configuration ===
+# Query embeddings (interactive) and ingestion embeds (background) share these
+COHERE_MAX_CONCURRENCY = int(get_env("COHERE_MAX_CONCURRENCY", "16"))  # In-flight embed calls per process (0 = unlimited)
+COHERE_RPM_LIMIT = float(get_env("COHERE_RPM_LIMIT", "2000"))  # Embed calls per minute (0 disables)
+COHERE_QUEUE_TIMEOUT = float(get_env("COHERE_QUEUE_TIMEOUT", "60"))  # Seconds a call may wait for a slot
+
+# === Caching Configuration ===
+# Directory for shared on-disk cache tiers (SQLite); unset disables disk tiers
+CACHE_DIR = get_env("OMBEE_CACHE_DIR")
+EMBEDDING_CACHE_MAX_MB = float(get_env("EMBEDDING_CACHE_MAX_MB", "32"))
+EMBEDDING_CACHE_TTL = float(get_env("EMBEDDING_CACHE_TTL", "86400"))  # Seconds
+
+# Semantic answer cache (reuse answers for near-duplicate questions)
+ANSWER_CACHE_ENABLED = get_env("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(get_env("ANSWER_CACHE_THRESHOLD", "0.92"))  # Cosine similarity
+ANSWER_CACHE_TTL = float(get_env("ANSWER_CACHE_TTL", "21600"))  # Seconds
+ANSWER_CACHE_MAX_ENTRIES = int(get_env("ANSWER_CACHE_MAX_ENTRIES", "1000"))  # Per scope
+ANSWER_CACHE_MAX_SCOPES = int(get_env("ANSWER_CACHE_MAX_SCOPES", "500"))
+
+# LLM completion cache (exact replay of identical Groq requests)
+COMPLETION_CACHE_ENABLED = get_env("COMPLETION_CACHE_ENABLED", "true").lower() == "true"
+COMPLETION_CACHE_MAX_MB = float(get_env("COMPLETION_CACHE_MAX_MB", "16"))
+COMPLETION_CACHE_TTL = float(get_env("COMPLETION_CACHE_TTL", "21600"))  # Seconds
+# Cache personalized prompts too (user_context is part of the key); false bypasses them
+COMPLETION_CACHE_PERSONALIZED = get_env("COMPLETION_CACHE_PERSONALIZED", "true").lower() == "true"
+# Groq list prices used to report dollars saved (USD per million tokens)
+GROQ_INPUT_PRICE_PER_M = float(get_env("GROQ_INPUT_PRICE_PER_M", "0.59"))
+GROQ_OUTPUT_PRICE_PER_M = float(get_env("GROQ_OUTPUT_PRICE_PER_M", "0.79"))
+
+# === Ingestion Configuration ===
+CHUNK_TOKENS = int(get_env("CHUNK_TOKENS", "400"))  # Max tokens per chunk
+CHUNK_OVERLAP_TOKENS = int(get_env("CHUNK_OVERLAP_TOKENS", "60"))  # Shared between neighbouring chunks
+EMBED_BATCH_SIZE = int(get_env("EMBED_BATCH_SIZE", "96"))  # Texts per Cohere embed call (API max 96)
+UPSERT_BATCH_SIZE = int(get_env("UPSERT_BATCH_SIZE", "100"))  # Vectors per Pinecone upsert
+INGEST_WORKERS = int(get_env("INGEST_WORKERS", "8"))  # Documents processed in parallel
+INGEST_MAX_CONCURRENCY = int(get_env("INGEST_MAX_CONCURRENCY", "8"))  # Adaptive cap on in-flight calls per API
+INGEST_LATENCY_TARGET = float(get_env("INGEST_LATENCY_TARGET", "5"))  # Seconds; slower calls shrink concurrency
+INGEST_MAX_RETRIES = int(get_env("INGEST_MAX_RETRIES", "5"))
+# Per-document/per-chunk SHA-256 record of what is in the index (skips unchanged content)
+INGEST_MANIFEST_PATH = get_env("INGEST_MANIFEST_PATH", os.path.join(CACHE_DIR or ".", "ingest_manifest.json"))
+
 # === Supabase Configuration ===
 SUPABASE_URL = get_env("SUPABASE_URL")
 SUPABASE_API_KEY = get_env("SUPABASE_API_KEY")
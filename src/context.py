@@ -0,0 +1,148 @@
+"""
+Context budgeter: assembles the retrieved chunks (and conversation history)
+that go into the LLM prompt under a token budget.
+- near-duplicate chunks (word-trigram Jaccard >= threshold) are dropped
+- chunks are ranked by score and kept in that order until the document
+  budget is spent; the last one is truncated if enough room is left
+- history keeps the most recent lines that fit its own budget
+Each call reports the tokens it saved versus sending everything.
+"""
+from src.config import (
+    CONTEXT_BUDGET_TOKENS, CONTEXT_HISTORY_TOKENS,
+    CONTEXT_DEDUP_THRESHOLD, CONTEXT_MIN_CHUNK_TOKENS
+)
+from src.tokens import count_tokens, chunk_text
+from typing import List, Tuple
+import re
+import threading
+
+CHUNK_SEPARATOR = "\n\n---\n\n"
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def format_context(documents: str, conversation: str = "") -> str:
+    """Prompt context: conversation history (if any) followed by documents"""
+    if conversation:
+        return f"Previous conversation:\n{conversation}{CHUNK_SEPARATOR}Relevant documents:\n{documents}"
+    return documents
+
+def trim_history(conversation: str, budget: int) -> str:
+    """Most recent history lines that fit in budget tokens"""
+    kept = []
+    used = 0
+    for line in reversed(conversation.splitlines()):
+        tokens = count_tokens(line)
+        if used + tokens > budget:
+            break
+        kept.insert(0, line)
+        used += tokens
+    return "\n".join(kept)
+
+def _rank_key(chunk: dict) -> tuple:
+    """Sort key: scored chunks first, by descending score (sorted() keeps ties in order)"""
+    score = chunk.get("score")
+    return (0, -score) if score is not None else (1, 0.0)
+
+def assemble_context(
+    chunks: List[dict],
+    conversation: str = "",
+    budget: int = CONTEXT_BUDGET_TOKENS,
+    history_budget: int = CONTEXT_HISTORY_TOKENS,
+    dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD
+) -> Tuple[str, List[dict], dict]:
+    """
+    Build the prompt context from chunks ({"text"[, "score"], ...}; other keys
+    are passed through), e.g. fresh search results merged with session-cached
+    chunks. Chunks are ranked by score, highest first, before dedup and budget
+    truncation, so the budget always goes to the most relevant ones; chunks
+    without a score (keyword-only matches) follow in their given order.
+    Returns: (context, kept_chunks, report) where report has tokens_before,
+    tokens_after, tokens_saved, chunks_in, chunks_kept, duplicates_dropped
+    """
+    naive = format_context(CHUNK_SEPARATOR.join(chunk["text"] for chunk in chunks), conversation)
+    ranked = sorted(chunks, key=_rank_key)
+
+    kept = []
+    kept_shingles = []
+    duplicates = 0
+    used = 0
+    for chunk in ranked:
+        text = chunk["text"].strip()
+        if not text:
+            continue
+        shingles = _shingles(text)
+        if any(jaccard(shingles, other) >= dedup_threshold for other in kept_shingles):
+            duplicates += 1
+            continue
+        tokens = count_tokens(text)
+        remaining = budget - used
+        if tokens > remaining:
+            if remaining >= CONTEXT_MIN_CHUNK_TOKENS:
+                # Keep the opening of the chunk that doesn't fit
+                text = chunk_text(text, remaining, 0)[0]
+                kept.append({**chunk, "text": text, "truncated": True})
+                used += count_tokens(text)
+            break
+        kept.append(chunk if text == chunk["text"] else {**chunk, "text": text})
+        kept_shingles.append(shingles)
+        used += tokens
+
+    history = trim_history(conversation, history_budget) if conversation else ""
+    documents = CHUNK_SEPARATOR.join(chunk["text"] for chunk in kept) if kept else "No relevant information found."
+    context = format_context(documents, history)
+
+    tokens_before = count_tokens(naive)
+    tokens_after = count_tokens(context)
+    report = {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": max(0, tokens_before - tokens_after),
+        "chunks_in": len(chunks),
+        "chunks_kept": len(kept),
+        "duplicates_dropped": duplicates
+    }
+    context_budget_stats.record(report)
+    return context, kept, report
+
+class ContextBudgetStats:
+    """Running totals of prompt tokens saved by the budgeter (per process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.duplicates_dropped = 0
+
+    def record(self, report: dict):
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += report["tokens_before"]
+            self.tokens_after += report["tokens_after"]
+            self.duplicates_dropped += report["duplicates_dropped"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            saved = max(0, self.tokens_before - self.tokens_after)
+            return {
+                "requests": self.requests,
+                "prompt_tokens_before": self.tokens_before,
+                "prompt_tokens_after": self.tokens_after,
+                "prompt_tokens_saved": saved,
+                "avg_tokens_saved": round(saved / self.requests, 1) if self.requests else None,
+                "duplicates_dropped": self.duplicates_dropped
+            }
+
+context_budget_stats = ContextBudgetStats()
+
+def get_context_budget_stats() -> dict:
+    return context_budget_stats.stats()
@@ -0,0 +1,469 @@
+"""
+Knowledge-base ingestion pipeline
+Documents are split into overlapping token-bounded chunks, embedded with
+Cohere in batches and upserted to the vector store (Pinecone or the local
+index, see src.vector_store) in batches over a single client. Each chunk is
+its own vector: id "<doc_id>#<chunk hash>" with the chunk text and its
+position in the document as metadata.
+
+Documents are processed by a bounded thread pool. Outbound Cohere and
+vector store calls go through per-dependency AIMD limiters: concurrency grows
+by one slot per window of fast successes and halves on a 429 (or shrinks
+when latency exceeds the target), so bulk loads run as fast as the rate
+limits allow without failing. Failed calls are retried with jittered
+exponential backoff behind per-dependency circuit breakers (src.resilience).
+Cohere calls also queue on the process's Cohere scheduler at background
+priority, so query embeddings for chat in the same process go first.
+
+Re-ingestion is incremental: a local manifest records a SHA-256 per document
+and per chunk. Unchanged documents are skipped, only new chunks are embedded,
+and vectors for chunks that disappeared are deleted. Chunk ids are derived
+from the chunk hash, so inserting text early in a document does not
+invalidate every chunk after it. The BM25 keyword index (src.bm25) is kept
+in step with the same chunk diff.
+"""
+from src.config import (
+    EMBED_MODEL,
+    CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, EMBED_BATCH_SIZE, UPSERT_BATCH_SIZE,
+    INGEST_WORKERS, INGEST_MAX_CONCURRENCY, INGEST_LATENCY_TARGET, INGEST_MAX_RETRIES,
+    INGEST_MANIFEST_PATH, INGEST_REQUEST_TIMEOUT, HYBRID_SEARCH_ENABLED
+)
+from src.tokens import chunk_text, count_tokens
+from src.vector_store import get_vector_store
+from src.clients import new_cohere_client
+from src.bm25 import BM25Index, get_bm25_index
+from src.resilience import is_rate_limited, call as resilient_call
+from src.scheduler import get_cohere_scheduler, BACKGROUND
+from models import Message
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+
+# Cohere accepts at most 96 texts per embed call
+COHERE_MAX_BATCH = 96
+# Pinecone accepts at most 1000 ids per delete call
+PINECONE_MAX_DELETE = 1000
+
+# Same SHA-256 content hash as stored on chat messages
+content_hash = Message._generate_content_hash
+
+def legacy_doc_id(filename: str) -> str:
+    """Vector id the old single-vector uploader used (collides across filenames)"""
+    return filename.replace('.txt', '').replace(' ', '_').replace('.', '_')
+
+def make_doc_id(filename: str) -> str:
+    """
+    Document id derived from the filename: a readable slug plus a short hash
+    of the exact filename, so "a b.txt" and "a_b.txt" no longer collide
+    """
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", os.path.splitext(filename)[0]).strip("_") or "doc"
+    return f"{slug}-{hashlib.sha256(filename.encode('utf-8')).hexdigest()[:8]}"
+
+def chunk_id(doc_id: str, chunk_hash: str) -> str:
+    return f"{doc_id}#{chunk_hash[:16]}"
+
+def chunking_signature() -> str:
+    """Settings that change chunk boundaries or vectors; a change forces a full re-embed"""
+    return f"{EMBED_MODEL}:{CHUNK_TOKENS}:{CHUNK_OVERLAP_TOKENS}"
+
+def build_chunks(filename: str, content: str) -> List[dict]:
+    """
+    Split a document into chunk records (identical chunks are kept once)
+    Returns: list of {"id", "hash", "text", "metadata"}
+    """
+    doc_id = make_doc_id(filename)
+    chunks = []
+    seen = set()
+    for text in chunk_text(content, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS):
+        chunk_hash = content_hash(text)
+        if chunk_hash in seen:
+            continue
+        seen.add(chunk_hash)
+        chunks.append({"id": chunk_id(doc_id, chunk_hash), "hash": chunk_hash, "text": text})
+    for i, chunk in enumerate(chunks):
+        chunk["metadata"] = {
+            "source": filename,
+            "doc_id": doc_id,
+            "chunk_index": i,
+            "token_count": count_tokens(chunk["text"]),
+            "text": chunk["text"]
+        }
+    return chunks
+
+# === Manifest ===
+
+class IngestionManifest:
+    """
+    Local record of what is in the vector index, one entry per document:
+    {"source", "sha256", "chunking", "chunk_count", "chunks": {chunk_id: {"sha256", "index"}}, "updated_at"}
+    Saved atomically after every document so an interrupted bulk load resumes.
+    """
+
+    def __init__(self, path: str = INGEST_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.documents = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.documents = json.load(f).get("documents", {})
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        with self._lock:
+            return self.documents.get(doc_id)
+
+    def put(self, doc_id: str, record: dict):
+        with self._lock:
+            self.documents[doc_id] = record
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"documents": self.documents}, f)
+        os.replace(tmp_path, self.path)
+
+def batched(items: list, size: int) -> Iterable[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+# === Backpressure ===
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit for one dependency.
+    +1 slot per `limit` fast successes; x0.5 on 429; x0.9 when slower than
+    latency_target. A failure only decreases the limit if its call started
+    after the previous decrease, so one overloaded window counts once.
+    """
+
+    def __init__(self, name: str, maximum: int, minimum: int = 1, latency_target: float = INGEST_LATENCY_TARGET):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.latency_target = latency_target
+        self.limit = float(max(self.minimum, min(self.maximum, 2)))
+        self.in_flight = 0
+        self.throttled = 0
+        self.slow = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> float:
+        """Wait for a slot; returns the call's start time for release()"""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, throttled: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled or now - started > self.latency_target:
+                if throttled:
+                    self.throttled += 1
+                else:
+                    self.slow += 1
+                if started >= self._last_decrease:
+                    factor = 0.5 if throttled else 0.9
+                    self.limit = max(float(self.minimum), self.limit * factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "throttled": self.throttled,
+                "slow": self.slow
+            }
+
+class IngestionThrottle:
+    """Adaptive limiters and retry policy for outbound ingestion calls"""
+
+    def __init__(self, max_concurrency: int = INGEST_MAX_CONCURRENCY, max_retries: int = INGEST_MAX_RETRIES):
+        self.max_retries = max_retries
+        self.limiters = {
+            "cohere": AdaptiveConcurrency("cohere", max_concurrency),
+            "vector_store": AdaptiveConcurrency("vector_store", max_concurrency)
+        }
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def call(self, dependency: str, func: Callable, *args, **kwargs):
+        """
+        Run func under the dependency's limiter and circuit breaker, retrying
+        transient failures (see src.resilience.call). Ingestion has its own
+        breakers ("ingest:<dependency>") so a bulk load never opens the ones
+        chat retrieval uses; rate limits are left to the limiter and backoff.
+        """
+        limiter = self.limiters[dependency]
+
+        def attempt(timeout):
+            # Queue for the scheduler first so the limiter only times the call itself
+            with background_slot(dependency) as ticket:
+                started = limiter.acquire()
+                try:
+                    result = func(*args, **request_timeout(dependency, timeout), **kwargs)
+                except Exception as e:
+                    ticket["rate_limited"] = is_rate_limited(e)
+                    limiter.release(started, throttled=ticket["rate_limited"])
+                    raise
+                limiter.release(started)
+                return result
+
+        return resilient_call(
+            f"ingest:{dependency}", attempt, INGEST_REQUEST_TIMEOUT,
+            retries=self.max_retries, backoff_base=0.5, on_retry=self._count_retry
+        )
+
+    def _count_retry(self, error: Exception):
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            retries = self.retries
+        return {"retries": retries, **{name: limiter.stats() for name, limiter in self.limiters.items()}}
+
+def request_timeout(dependency: str, timeout: float) -> dict:
+    """Client kwargs bounding one Cohere / vector store request (no client-side retries)"""
+    if dependency == "cohere":
+        return {"request_options": {"timeout_in_seconds": max(1, math.ceil(timeout)), "max_retries": 0}}
+    return {"timeout": timeout}
+
+def background_slot(dependency: str):
+    """Cohere calls take a background slot on the Cohere scheduler; vector store calls are not scheduled"""
+    if dependency == "cohere":
+        return get_cohere_scheduler().slot(priority=BACKGROUND)
+    return nullcontext({})
+
+def _direct_call(dependency: str, func: Callable, *args, **kwargs):
+    with background_slot(dependency):
+        return func(*args, **request_timeout(dependency, INGEST_REQUEST_TIMEOUT), **kwargs)
+
+# === Pipeline ===
+
+def embed_texts(co, texts: List[str], batch_size: int = EMBED_BATCH_SIZE, throttle: Optional[IngestionThrottle] = None) -> List[List[float]]:
+    """Embed document texts in batches (one Cohere call per batch)"""
+    call = throttle.call if throttle else _direct_call
+    batch_size = max(1, min(batch_size, COHERE_MAX_BATCH))
+    embeddings = []
+    for batch in batched(texts, batch_size):
+        response = call(
+            "cohere", co.embed,
+            texts=batch,
+            model=EMBED_MODEL,
+            input_type="search_document"
+        )
+        embeddings.extend(response.embeddings)
+    return embeddings
+
+def upsert_chunks(index, chunks: List[dict], embeddings: List[List[float]], batch_size: int = UPSERT_BATCH_SIZE, throttle: Optional[IngestionThrottle] = None) -> int:
+    """Upsert embedded chunks in batches; returns the number of vectors written"""
+    call = throttle.call if throttle else _direct_call
+    vectors = [
+        {"id": chunk["id"], "values": embedding, "metadata": chunk["metadata"]}
+        for chunk, embedding in zip(chunks, embeddings)
+    ]
+    for batch in batched(vectors, batch_size):
+        call("vector_store", index.upsert, vectors=batch)
+    return len(vectors)
+
+def get_clients() -> Tuple[object, object]:
+    """One vector store handle and one Cohere client for a whole ingestion run"""
+    return get_vector_store(), new_cohere_client(INGEST_REQUEST_TIMEOUT)
+
+class IngestionStats:
+    """Counters for one ingestion run (chunks = chunks embedded and written)"""
+
+    def __init__(self, total_documents: int = 0):
+        self.total_documents = total_documents
+        self.documents = 0
+        self.skipped_documents = 0
+        self.failed_documents = 0
+        self.chunks = 0
+        self.unchanged_chunks = 0
+        self.deleted_chunks = 0
+        self.tokens = 0
+        self.started = time.perf_counter()
+        self.finished = None
+        self.throttle = {}
+
+    @property
+    def processed(self) -> int:
+        return self.documents + self.skipped_documents + self.failed_documents
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "documents": self.documents,
+            "skipped_documents": self.skipped_documents,
+            "failed_documents": self.failed_documents,
+            "chunks": self.chunks,
+            "unchanged_chunks": self.unchanged_chunks,
+            "deleted_chunks": self.deleted_chunks,
+            "tokens": self.tokens,
+            "seconds": round(self.seconds, 3),
+            "chunks_per_second": round(self.chunks_per_second, 2),
+            "throttle": self.throttle
+        }
+
+def ingest_document(
+    index,
+    co,
+    filename: str,
+    content: str,
+    throttle: Optional[IngestionThrottle] = None,
+    manifest: Optional[IngestionManifest] = None,
+    lexical: Optional[BM25Index] = None
+) -> dict:
+    """
+    Bring one document's vectors up to date: embed and upsert new chunks,
+    refresh metadata of chunks that only moved, delete removed chunks.
+    lexical: BM25 index to keep in sync (chunks are added/removed with the vectors)
+    Returns: {"skipped", "embedded", "unchanged", "deleted", "tokens"}
+    """
+    call = throttle.call if throttle else _direct_call
+    doc_id = make_doc_id(filename)
+    doc_hash = content_hash(content)
+    signature = chunking_signature()
+    record = manifest.get(doc_id) if manifest else None
+    if record and record.get("chunking") != signature:
+        # Old vectors came from other chunk settings/model: treat every chunk as new
+        record = {**record, "chunks": {chunk: {"sha256": None, "index": None} for chunk in record.get("chunks", {})}}
+
+    if record and record.get("sha256") == doc_hash and record.get("chunking") == signature:
+        if lexical is not None and not record.get("lexical"):
+            # Vectors are current but the keyword index never saw this document
+            lexical.add(build_chunks(filename, content))
+            manifest.put(doc_id, {**record, "lexical": True})
+        return {"skipped": True, "embedded": 0, "unchanged": len(record["chunks"]), "deleted": 0, "tokens": 0}
+
+    chunks = build_chunks(filename, content)
+    previous = record["chunks"] if record else {}
+    new_chunks = [chunk for chunk in chunks if previous.get(chunk["id"], {}).get("sha256") != chunk["hash"]]
+    new_ids = {chunk["id"] for chunk in new_chunks}
+    # The document's chunk count is kept in the manifest only: in vector
+    # metadata it would change on every edit and mark every chunk as moved
+    moved = [
+        chunk for chunk in chunks
+        if chunk["id"] not in new_ids and previous[chunk["id"]]["index"] != chunk["metadata"]["chunk_index"]
+    ]
+    current_ids = {chunk["id"] for chunk in chunks}
+    removed = [chunk for chunk in previous if chunk not in current_ids]
+
+    if new_chunks:
+        embeddings = embed_texts(co, [chunk["text"] for chunk in new_chunks], throttle=throttle)
+        upsert_chunks(index, new_chunks, embeddings, throttle=throttle)
+    for chunk in moved:
+        call("vector_store", index.update, id=chunk["id"], set_metadata={"chunk_index": chunk["metadata"]["chunk_index"]})
+    if lexical is not None:
+        lexical.add(new_chunks if record and record.get("lexical") else chunks)
+        lexical.delete(removed)
+    deleted = len(removed)
+    if not record:
+        # Not seen before: drop the whole-file vector the old uploader may have written
+        removed.append(legacy_doc_id(filename))
+    for batch in batched(removed, PINECONE_MAX_DELETE):
+        call("vector_store", index.delete, ids=batch)
+
+    if manifest:
+        manifest.put(doc_id, {
+            "source": filename,
+            "sha256": doc_hash,
+            "chunking": signature,
+            "lexical": lexical is not None,
+            "chunk_count": len(chunks),
+            "chunks": {
+                chunk["id"]: {"sha256": chunk["hash"], "index": chunk["metadata"]["chunk_index"]}
+                for chunk in chunks
+            },
+            "updated_at": datetime.utcnow().isoformat()
+        })
+
+    return {
+        "skipped": False,
+        "embedded": len(new_chunks),
+        "unchanged": len(chunks) - len(new_chunks),
+        "deleted": deleted,
+        "tokens": sum(chunk["metadata"]["token_count"] for chunk in new_chunks)
+    }
+
+def ingest_documents(
+    documents: List[Tuple[str, str]],
+    index=None,
+    co=None,
+    on_document: Optional[Callable[[str, Optional[dict], Optional[str], IngestionStats], None]] = None,
+    workers: int = INGEST_WORKERS,
+    throttle: Optional[IngestionThrottle] = None,
+    manifest: Optional[IngestionManifest] = None,
+    lexical: Optional[BM25Index] = None
+) -> IngestionStats:
+    """
+    Ingest (filename, content) pairs concurrently over one set of clients.
+    on_document(filename, result_or_None, error_or_None, stats) is called
+    from the calling thread as each document completes (safe for Streamlit);
+    result is ingest_document's return value.
+    """
+    if index is None or co is None:
+        index, co = get_clients()
+    throttle = throttle or IngestionThrottle()
+    manifest = manifest or IngestionManifest()
+    if lexical is None and HYBRID_SEARCH_ENABLED:
+        lexical = get_bm25_index()
+
+    stats = IngestionStats(len(documents))
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest") as pool:
+        futures = {
+            pool.submit(ingest_document, index, co, filename, content, throttle, manifest, lexical): filename
+            for filename, content in documents
+        }
+        for future in as_completed(futures):
+            filename = futures[future]
+            error = None
+            result = None
+            try:
+                result = future.result()
+                if result["skipped"]:
+                    stats.skipped_documents += 1
+                else:
+                    stats.documents += 1
+                stats.chunks += result["embedded"]
+                stats.unchanged_chunks += result["unchanged"]
+                stats.deleted_chunks += result["deleted"]
+                stats.tokens += result["tokens"]
+            except Exception as e:
+                stats.failed_documents += 1
+                error = str(e)
+            stats.throttle = throttle.stats()
+            if on_document:
+                on_document(filename, result, error, stats)
+    stats.finish()
+    return stats
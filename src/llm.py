@@ -1,18 +1,50 @@
-from groq import Groq
-from src.config import GROQ_API_KEY
+from src.config import (
+    GROQ_MODEL, GROQ_FALLBACK_MODELS,
+    GENERATION_SLO, HEDGE_MIN_DELAY, GENERATION_TIMEOUT, RETRY_MAX_ATTEMPTS, CACHE_DIR,
+    GENERATION_TOKENS_PER_SECOND, GENERATION_MIN_TOKENS,
+    COMPLETION_CACHE_ENABLED, COMPLETION_CACHE_MAX_MB, COMPLETION_CACHE_TTL, COMPLETION_CACHE_PERSONALIZED,
+    GROQ_INPUT_PRICE_PER_M, GROQ_OUTPUT_PRICE_PER_M
+)
+from src.cache import TieredCache
+from src.monitoring import get_savings_tracker, get_latency_tracker
+from src.scheduler import get_groq_scheduler, INTERACTIVE
+from src.tokens import count_tokens
+from src.resilience import Deadline, get_breaker, is_rate_limited, call as resilient_call
+from src.clients import get_groq_client
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional
+import hashlib
+import itertools
+import json
+import os
 import time
 import logging
 
-client = Groq(api_key=GROQ_API_KEY)
 log = logging.getLogger(__name__)
+savings_tracker = get_savings_tracker()
+scheduler = get_groq_scheduler()
+latency_tracker = get_latency_tracker()
 
-def generate_response(query: str, context: str, user_context: str = None, conversation_history: str = None):
+# Hedged attempts run here so the caller can wait on whichever answers first
+_cascade_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-cascade")
+
+MODEL = GROQ_MODEL
+MODELS = [MODEL] + [model for model in GROQ_FALLBACK_MODELS if model != MODEL]
+for _model in MODELS:
+    get_breaker(f"groq:{_model}")
+TEMPERATURE = 0.7
+MAX_TOKENS = 300  # Reduced from 500 for more concise responses
+ERROR_RESPONSE = "I apologize, but I encountered an error generating a response. Please try again."
+
+def is_error_response(text: str) -> bool:
+    """True if text is the apology returned when generation failed"""
+    return ERROR_RESPONSE in (text or "")
+
+def build_messages(query: str, context: str, user_context: str = None, conversation_history: str = None) -> list:
     """
-    Generate response using LLM with optional user personalization.
-    Returns: tuple(response_string, generation_time_seconds, cumulative_tokens_or_None, cumulative_cost_or_None)
+    Build the chat messages (system + user prompt) sent to the LLM.
+    Returns: list of {"role", "content"} dicts
     """
-    start = time.time()
-
     # Build system prompt with conversational tone
     system_prompt = """You are Ombee AI, a friendly and knowledgeable health assistant specializing in holistic wellness and nutrition.
 
@@ -58,19 +90,264 @@ User question: {query}
 
 Provide a helpful, concise response. Keep it conversational and to-the-point."""
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+# Identical requests (same model, messages, temperature, max_tokens) replay the
+# stored completion: {"text", "prompt_tokens", "completion_tokens"}
+completion_cache = TieredCache(
+    name="completions",
+    max_size=int(COMPLETION_CACHE_MAX_MB * 1024 * 1024),
+    ttl=COMPLETION_CACHE_TTL,
+    getsizeof=lambda payload: len(payload["text"]) + 100,
+    disk_path=os.path.join(CACHE_DIR, "completions.sqlite3") if CACHE_DIR else None,
+    serialize=lambda payload: json.dumps(payload),
+    deserialize=lambda blob: json.loads(blob)
+)
+
+def completion_key(messages: list, model: str = MODEL, temperature: float = TEMPERATURE, max_tokens: int = MAX_TOKENS) -> str:
+    """Cache key: hash of everything that determines the completion"""
+    request = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True
+    )
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+def is_cacheable(user_context: str = None) -> bool:
+    """
+    Personalized prompts carry user_context in the system message (and so in
+    the key); they are only cached when COMPLETION_CACHE_PERSONALIZED is on
+    """
+    return COMPLETION_CACHE_ENABLED and (not user_context or COMPLETION_CACHE_PERSONALIZED)
+
+def token_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """Dollar cost of a completion at the configured Groq prices"""
+    return ((prompt_tokens or 0) * GROQ_INPUT_PRICE_PER_M + (completion_tokens or 0) * GROQ_OUTPUT_PRICE_PER_M) / 1_000_000
+
+def cached_completion(key: str):
+    """Stored completion payload for a key (recording the tokens saved), or None"""
+    payload = completion_cache.get(key)
+    if payload is None:
+        return None
+    tokens = (payload.get("prompt_tokens") or 0) + (payload.get("completion_tokens") or 0)
+    savings_tracker.record(
+        "completion_cache",
+        tokens=tokens,
+        dollars=token_cost(payload.get("prompt_tokens"), payload.get("completion_tokens"))
+    )
+    log.info("Completion cache hit (%s tokens saved)", tokens)
+    return payload
+
+def store_completion(key: str, text: str, usage):
+    """Cache a successful completion with its token usage"""
+    if not text:
+        return
+    prompt_tokens, completion_tokens = _usage_tokens(usage)
+    completion_cache.set(key, {"text": text, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+
+def get_completion_cache_stats() -> dict:
+    """Hit/miss counters for the completion cache plus tokens and dollars saved"""
+    return {**completion_cache.stats(), "saved": savings_tracker.summary().get("completion_cache")}
+
+def estimate_request_tokens(messages: list, max_tokens: int = MAX_TOKENS) -> int:
+    """Prompt + completion tokens a request may use (charged to the TPM bucket up front)"""
+    return sum(count_tokens(message["content"]) for message in messages) + max_tokens
+
+def deadline_max_tokens(deadline: Optional[Deadline] = None) -> int:
+    """
+    Completion length that fits the time left: whatever the model can
+    generate after its p95 time to first token, clamped to
+    [GENERATION_MIN_TOKENS, MAX_TOKENS]
+    """
+    if deadline is None:
+        return MAX_TOKENS
+    first_token = latency_tracker.percentile(f"llm.{MODEL}.ttft", 95) or HEDGE_MIN_DELAY
+    tokens = int((deadline.remaining() - first_token) * GENERATION_TOKENS_PER_SECOND)
+    return max(GENERATION_MIN_TOKENS, min(MAX_TOKENS, tokens))
+
+def _usage_tokens(usage):
+    """Extract (prompt_tokens, completion_tokens) from a usage object or dict"""
+    if not usage:
+        return None, None
+    if isinstance(usage, dict):
+        return usage.get("prompt_tokens"), usage.get("completion_tokens")
+    return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+
+def _usage_metrics(usage):
+    """Extract (total_tokens, estimated_cost) from a usage object or dict"""
+    tokens = None
+    cost = None
     try:
-        # Generate response
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=300  # Reduced from 500 for more concise responses
+        if usage:
+            tokens = usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+            cost = usage.get("estimated_cost") if isinstance(usage, dict) else getattr(usage, "estimated_cost", None)
+    except Exception:
+        pass
+    return tokens, cost
+
+def hedge_delay(model: str, metric: str = "") -> float:
+    """
+    Seconds to give a model before hedging with the next one: its live p95
+    latency (or time to first token for streams), capped at the SLO
+    """
+    p95 = latency_tracker.percentile(f"llm.{model}{metric}", 95)
+    if p95 is None:
+        return GENERATION_SLO
+    return max(HEDGE_MIN_DELAY, min(GENERATION_SLO, p95))
+
+def run_cascade(attempt, discard=None, metric: str = ""):
+    """
+    Run attempt(model) down the model cascade. The next model is started as
+    soon as the current one fails, or hedged in parallel once it has run past
+    hedge_delay(); the first success wins. Late results from losing attempts
+    are passed to discard() (e.g. to close a stream).
+    Returns: (result, model, attempts) - raises the last error if every model failed
+    """
+    futures = {}
+    pending = set()
+    errors = []
+
+    def launch():
+        model = MODELS[len(futures)]
+        future = _cascade_pool.submit(attempt, model)
+        futures[future] = model
+        pending.add(future)
+
+    launch()
+    while pending:
+        more = len(futures) < len(MODELS)
+        timeout = hedge_delay(MODELS[len(futures) - 1], metric) if more else None
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                log.warning("Model %s failed: %s", futures[future], e)
+                errors.append(e)
+                continue
+            for loser in pending:
+                if discard:
+                    loser.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+            return result, futures[future], len(futures)
+        if more and (not done or not pending):
+            # Primary is past its usual latency (hedge) or has failed (fall back)
+            if done:
+                log.warning("Falling back to %s", MODELS[len(futures)])
+            else:
+                log.info("Hedging to %s", MODELS[len(futures)])
+            launch()
+    raise errors[-1]
+
+def _model_retries() -> int:
+    # With fallbacks configured the cascade is the retry; a lone model retries itself
+    return 0 if len(MODELS) > 1 else RETRY_MAX_ATTEMPTS
+
+def _create_completion(model: str, messages: list, user_id: str, priority: int, deadline: Optional[Deadline] = None, max_tokens: int = MAX_TOKENS):
+    """
+    One non-streaming Groq call for a model, through the outbound scheduler
+    and the model's circuit breaker ("groq:<model>")
+    """
+    def attempt(timeout):
+        with scheduler.slot(user_id, priority, estimate_request_tokens(messages, max_tokens), deadline) as ticket:
+            start = time.time()
+            try:
+                response = get_groq_client().with_options(timeout=timeout, max_retries=0).chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=TEMPERATURE,
+                    max_tokens=max_tokens
+                )
+            except Exception as e:
+                ticket["rate_limited"] = is_rate_limited(e)
+                raise
+            latency_tracker.record(f"llm.{model}", time.time() - start)
+            usage = getattr(response, "usage", None) or getattr(response, "meta", None)
+            ticket["used_tokens"] = _usage_metrics(usage)[0]
+            return response
+
+    return resilient_call(f"groq:{model}", attempt, GENERATION_TIMEOUT, deadline=deadline, retries=_model_retries())
+
+def _open_stream(model: str, messages: list, user_id: str, priority: int, deadline: Optional[Deadline] = None, max_tokens: int = MAX_TOKENS) -> dict:
+    """
+    Start a streaming Groq call and read up to its first token (through the
+    scheduler and the model's circuit breaker).
+    Returns {"stream", "chunks" (iterator), "buffered", "ticket"}; the caller
+    must close it with _close_stream.
+    """
+    def attempt(timeout):
+        ticket = scheduler.acquire(user_id, priority, estimate_request_tokens(messages, max_tokens), deadline)
+        try:
+            start = time.time()
+            stream = get_groq_client().with_options(timeout=timeout, max_retries=0).chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=TEMPERATURE,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            chunks = iter(stream)
+            buffered = []
+            for chunk in chunks:
+                buffered.append(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    break
+            latency_tracker.record(f"llm.{model}.ttft", time.time() - start)
+            return {"stream": stream, "chunks": chunks, "buffered": buffered, "ticket": ticket}
+        except Exception as e:
+            scheduler.release(ticket, rate_limited=is_rate_limited(e))
+            raise
+
+    return resilient_call(f"groq:{model}", attempt, GENERATION_TIMEOUT, deadline=deadline, retries=_model_retries())
+
+def _close_stream(opened: dict):
+    try:
+        close = getattr(opened["stream"], "close", None)
+        if close:
+            close()
+    finally:
+        ticket = opened["ticket"]
+        scheduler.release(ticket, ticket.get("used_tokens"))
+
+def generate_completion(
+    query: str,
+    context: str,
+    user_context: str = None,
+    conversation_history: str = None,
+    user_id: str = None,
+    priority: int = INTERACTIVE,
+    deadline: Optional[Deadline] = None,
+    max_tokens: int = None
+) -> dict:
+    """
+    Generate a response with the model cascade: the primary model, hedged or
+    replaced by the fallbacks when it is slow (past its live p95 / the SLO)
+    or failing. Calls go through the completion cache and outbound scheduler.
+    max_tokens defaults to what fits before the deadline (deadline_max_tokens).
+    Returns: {"response", "generation_time", "tokens", "cost", "model", "attempts", "cached", "max_tokens"}
+    (model is the one that answered; attempts counts models called)
+    """
+    start = time.time()
+    max_tokens = max_tokens or deadline_max_tokens(deadline)
+    messages = build_messages(query, context, user_context, conversation_history)
+    # Keyed on the full-length request: cached answers are complete, and
+    # answers shortened for a deadline are not stored
+    key = completion_key(messages) if is_cacheable(user_context) else None
+    cached = cached_completion(key) if key else None
+    if cached:
+        # Nothing was sent to Groq, so this reply used no tokens
+        return {
+            "response": cached["text"], "generation_time": time.time() - start, "tokens": 0, "cost": 0.0,
+            "model": MODEL, "attempts": 0, "cached": True, "max_tokens": max_tokens
+        }
+
+    try:
+        response, model, attempts = run_cascade(
+            lambda model: _create_completion(model, messages, user_id, priority, deadline, max_tokens)
         )
-        end = time.time()
-        generation_time = end - start
+        generation_time = time.time() - start
 
         # Extract text
         text = ""
@@ -83,20 +360,149 @@ Provide a helpful, concise response. Keep it conversational and to-the-point."""
                 text = ""
 
         # Try to extract usage metrics
-        tokens = None
-        cost = None
-        try:
-            usage = getattr(response, "usage", None) or getattr(response, "meta", None)
-            if usage:
-                tokens = usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
-                cost = usage.get("estimated_cost") if isinstance(usage, dict) else getattr(usage, "estimated_cost", None)
-        except Exception:
-            pass
+        usage = getattr(response, "usage", None) or getattr(response, "meta", None)
+        tokens, cost = _usage_metrics(usage)
+        if key and model == MODEL and max_tokens == MAX_TOKENS:
+            # Fallback answers are not replayed once the primary recovers
+            store_completion(key, text, usage)
 
-        return text, generation_time, tokens, cost
+        return {
+            "response": text, "generation_time": generation_time, "tokens": tokens, "cost": cost,
+            "model": model, "attempts": attempts, "cached": False, "max_tokens": max_tokens
+        }
 
     except Exception as e:
-        end = time.time()
-        generation_time = end - start
         log.exception("LLM generation error")
-        return f"I apologize, but I encountered an error generating a response. Please try again. Error: {str(e)}", generation_time, None, None
\ No newline at end of file
+        return {
+            "response": f"{ERROR_RESPONSE} Error: {str(e)}", "generation_time": time.time() - start,
+            "tokens": None, "cost": None, "model": None, "attempts": None, "cached": False,
+            "max_tokens": max_tokens
+        }
+
+def generate_response(
+    query: str,
+    context: str,
+    user_context: str = None,
+    conversation_history: str = None,
+    user_id: str = None,
+    priority: int = INTERACTIVE,
+    deadline: Optional[Deadline] = None,
+    max_tokens: int = None
+):
+    """
+    Generate response using LLM with optional user personalization (see generate_completion).
+    Returns: tuple(response_string, generation_time_seconds, cumulative_tokens_or_None, cumulative_cost_or_None)
+    """
+    result = generate_completion(query, context, user_context, conversation_history, user_id, priority, deadline, max_tokens)
+    return result["response"], result["generation_time"], result["tokens"], result["cost"]
+
+def stream_response(
+    query: str,
+    context: str,
+    user_context: str = None,
+    conversation_history: str = None,
+    user_id: str = None,
+    priority: int = INTERACTIVE,
+    deadline: Optional[Deadline] = None,
+    max_tokens: int = None
+):
+    """
+    Stream a response token-by-token from the LLM. The model cascade races
+    on time to first token: a fallback stream is opened if the primary has
+    produced nothing by its live p95 TTFT (capped at the SLO).
+    Yields event dicts:
+      {"type": "token", "text": str}
+      {"type": "done", "response": str, "generation_time": float,
+       "time_to_first_token": float | None, "tokens": int | None, "cost": float | None,
+       "model": str | None, "attempts": int, "max_tokens": int, "truncated": bool}
+    max_tokens defaults to what fits before the deadline (deadline_max_tokens).
+    If the deadline passes mid-stream the stream is closed and the answer so
+    far is returned with truncated=True (and not cached).
+    Errors are reported as a final apology token followed by the "done" event.
+    """
+    start = time.time()
+    max_tokens = max_tokens or deadline_max_tokens(deadline)
+    messages = build_messages(query, context, user_context, conversation_history)
+    key = completion_key(messages) if is_cacheable(user_context) else None
+    cached = cached_completion(key) if key else None
+    if cached:
+        yield {"type": "token", "text": cached["text"]}
+        yield {
+            "type": "done",
+            "response": cached["text"],
+            "generation_time": time.time() - start,
+            "time_to_first_token": time.time() - start,
+            "tokens": 0,
+            "cost": 0.0,
+            "model": MODEL,
+            "attempts": 0,
+            "max_tokens": max_tokens,
+            "truncated": False
+        }
+        return
+
+    parts = []
+    time_to_first_token = None
+    tokens = None
+    cost = None
+    usage = None
+    failed = False
+    truncated = False
+    model = None
+    attempts = 0
+
+    try:
+        opened, model, attempts = run_cascade(
+            lambda model: _open_stream(model, messages, user_id, priority, deadline, max_tokens),
+            discard=_close_stream,
+            metric=".ttft"
+        )
+        try:
+            for chunk in itertools.chain(opened["buffered"], opened["chunks"]):
+                if deadline is not None and deadline.expired():
+                    log.warning("Stream from %s cut at the deadline after %s chunks", model, len(parts))
+                    truncated = True
+                    break
+                # Groq reports usage on the final chunk under x_groq
+                x_groq = getattr(chunk, "x_groq", None)
+                if x_groq is not None and getattr(x_groq, "usage", None):
+                    usage = x_groq.usage
+                    tokens, cost = _usage_metrics(usage)
+                    opened["ticket"]["used_tokens"] = tokens
+
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if time_to_first_token is None:
+                    time_to_first_token = time.time() - start
+                parts.append(delta)
+                yield {"type": "token", "text": delta}
+        finally:
+            _close_stream(opened)
+
+    except Exception as e:
+        log.exception("LLM streaming error")
+        failed = True
+        apology = f"{ERROR_RESPONSE} Error: {str(e)}"
+        if parts:
+            apology = "\n\n" + apology
+        parts.append(apology)
+        yield {"type": "token", "text": apology}
+
+    if key and not failed and not truncated and model == MODEL and max_tokens == MAX_TOKENS:
+        store_completion(key, "".join(parts), usage)
+
+    yield {
+        "type": "done",
+        "response": "".join(parts),
+        "generation_time": time.time() - start,
+        "time_to_first_token": time_to_first_token,
+        "tokens": tokens,
+        "cost": cost,
+        "model": model,
+        "attempts": attempts,
+        "max_tokens": max_tokens,
+        "truncated": truncated
+    }
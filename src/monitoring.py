@@ -1,13 +1,10 @@
 """
 Arize Phoenix Cloud Monitoring Setup for Ombee AI
 Sends data to hosted Phoenix Cloud dashboard
+Phoenix and OpenTelemetry are imported (and tracing registered) when the
+monitor is first requested via get_monitor(), not when this module is imported.
 """
 from datetime import datetime
-from phoenix.otel import register
-from opentelemetry import trace
-from opentelemetry.trace import Status, StatusCode
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from src.config import PHOENIX_API_KEY, PHOENIX_COLLECTOR_ENDPOINT
 
 import os
@@ -17,7 +14,9 @@ import time
 import warnings
 import logging
 import contextlib
+import threading
 import traceback
+from collections import deque
 
 # Reduce noisy logs from OpenTelemetry / phoenix / http libs
 logging.getLogger().setLevel(logging.INFO)
@@ -52,13 +51,15 @@ class OmbeeMonitor:
             os.environ["PHOENIX_COLLECTOR_ENDPOINT"] = self.phoenix_collector_endpoint
             os.environ["PHOENIX_PROJECT_NAME"] = self.project_name
 
+            from phoenix.otel import register
+            from opentelemetry import trace
+
             # Suppress prints/warnings from phoenix.register() to keep terminal clean
             buf = io.StringIO()
             with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
                 register()
 
             # Create tracer for span creation
-            provider = trace.get_tracer_provider()
             self.tracer = trace.get_tracer(__name__)
             print("Phoenix Cloud monitoring active!")
             print(f"View dashboard at: {self.phoenix_collector_endpoint}")
@@ -91,6 +92,8 @@ class OmbeeMonitor:
             return
 
         try:
+            from opentelemetry.trace import Status, StatusCode
+
             with self.tracer.start_as_current_span("rag_query") as span:
                 # Core attributes
                 span.set_attribute("input.value", str(query))
@@ -183,9 +186,91 @@ class OmbeeMonitor:
             print(f"Failed to log query to Phoenix: {e}")
             traceback.print_exc()
 
-# Global monitor instance and accessor
+class LatencyTracker:
+    """Rolling in-process latency samples (seconds) per metric name"""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, metric: str, seconds: float):
+        """Record one latency sample for a metric"""
+        if seconds is None:
+            return
+        with self._lock:
+            samples = self._samples.get(metric)
+            if samples is None:
+                samples = self._samples[metric] = deque(maxlen=self.window)
+            samples.append(float(seconds))
+
+    def percentile(self, metric: str, pct: float):
+        """Nearest-rank percentile for a metric, or None if no samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(metric) or ())
+        if not samples:
+            return None
+        idx = min(len(samples) - 1, max(0, int(round(pct / 100 * len(samples))) - 1))
+        return samples[idx]
+
+    def summary(self) -> dict:
+        """Per-metric count, p50, p95 and p99 in milliseconds"""
+        with self._lock:
+            metrics = list(self._samples.keys())
+        result = {}
+        for metric in metrics:
+            with self._lock:
+                count = len(self._samples[metric])
+            result[metric] = {
+                "count": count,
+                "p50_ms": round(self.percentile(metric, 50) * 1000.0, 1),
+                "p95_ms": round(self.percentile(metric, 95) * 1000.0, 1),
+                "p99_ms": round(self.percentile(metric, 99) * 1000.0, 1),
+            }
+        return result
+
+class SavingsTracker:
+    """Running totals of LLM tokens and dollars saved, per source (e.g. completion_cache)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, source: str, tokens: int = 0, dollars: float = 0.0):
+        """Record one avoided LLM call (or part of one)"""
+        with self._lock:
+            totals = self._totals.setdefault(source, {"events": 0, "tokens": 0, "dollars": 0.0})
+            totals["events"] += 1
+            totals["tokens"] += int(tokens or 0)
+            totals["dollars"] += float(dollars or 0.0)
+
+    def summary(self) -> dict:
+        """Per-source events, tokens and dollars saved"""
+        with self._lock:
+            return {
+                source: {**totals, "dollars": round(totals["dollars"], 6)}
+                for source, totals in self._totals.items()
+            }
+
+# Global monitor instance and accessor (started on first get_monitor())
 monitor = OmbeeMonitor(project_name="ombee-ai")
-monitor.start_monitoring()
+_monitor_started = False
+_monitor_lock = threading.Lock()
+
+latency_tracker = LatencyTracker()
+savings_tracker = SavingsTracker()
 
 def get_monitor():
-    return monitor
\ No newline at end of file
+    global _monitor_started
+    if not _monitor_started:
+        with _monitor_lock:
+            if not _monitor_started:
+                monitor.start_monitoring()
+                _monitor_started = True
+    return monitor
+
+def get_latency_tracker():
+    return latency_tracker
+
+def get_savings_tracker():
+    return savings_tracker
\ No newline at end of file
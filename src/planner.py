@@ -0,0 +1,146 @@
+"""
+Retrieval planner: decides per turn whether a holistic query needs retrieval.
+- skip: small talk ("hi", "thanks!") - answer from the conversation alone
+- reuse: follow-ups ("tell me more") - reuse the previous turn's chunks
+- retrieve: everything else, with top_k sized from router confidence and
+  query length (focused questions need fewer chunks, vague or multi-part
+  ones more)
+Under a request deadline the plan is shrunk to the time left (fewer chunks,
+or no retrieval). Each decision is logged and counted so the latency saved
+can be measured.
+"""
+from src.config import (
+    RETRIEVAL_PLANNER_ENABLED, RETRIEVAL_TOP_K,
+    RETRIEVAL_MIN_K, RETRIEVAL_MAX_K, RETRIEVAL_MIN_BUDGET
+)
+from src.bm25 import tokenize
+from typing import Optional
+import re
+import threading
+
+# detect_domain returns exactly this when no keyword matched
+DEFAULT_CONFIDENCE = 0.70
+
+SMALL_TALK = re.compile(
+    r"^(hi|hello|hey|hiya|yo|good (morning|afternoon|evening)|"
+    r"thanks?( you)?( (so|very) much)?|thank you|thx|ty|cheers|"
+    r"ok(ay)?|cool|great|awesome|nice|perfect|got it|sounds good|"
+    r"bye|goodbye|see you( later)?)( \w+)?$"
+)
+FOLLOW_UP = re.compile(
+    r"^(tell me more|more|go on|continue|elaborate|can you elaborate|explain( that| more| further)?|"
+    r"why|how so|what do you mean|such as|like what|(any|for) examples?|"
+    r"what about (that|this|it|those|them)|more details?|say more|and)\b"
+)
+REFERENCES = {"it", "that", "this", "those", "them", "these", "they"}
+# Words after a follow-up opener that do not name a new topic ("why is that so good?")
+FILLER = {
+    "about", "more", "tell", "explain", "mean", "again", "also", "else", "further", "exactly",
+    "really", "just", "please", "other", "good", "bad", "safe", "work", "works", "true",
+    "example", "examples", "detail", "details"
+}
+
+def normalize(query: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9']+", query.lower()))
+
+def last_user_message(conversation_context: str) -> str:
+    """Most recent user line of the conversation history"""
+    for line in reversed(conversation_context.splitlines()):
+        if line.startswith("User: "):
+            return line[len("User: "):]
+    return ""
+
+def new_terms(text: str, previous: str) -> set:
+    """Content terms of text that the previous question did not mention"""
+    seen = set(tokenize(previous))
+    return {term for term in tokenize(text) if term not in seen and term not in FILLER and term not in REFERENCES}
+
+def plan_retrieval(query: str, confidence: float, conversation_context: str = "", has_previous: bool = False) -> dict:
+    """
+    Decide how to retrieve for a query.
+    Returns: {"action": "retrieve"|"reuse"|"skip", "top_k", "query", "reason"}
+    ("query" is the text to search with - follow-ups borrow the previous question)
+    """
+    plan = {"action": "retrieve", "top_k": RETRIEVAL_TOP_K, "query": query, "reason": "default"}
+    if not RETRIEVAL_PLANNER_ENABLED:
+        return plan
+
+    text = normalize(query)
+    words = text.split()
+    if not words or SMALL_TALK.match(text):
+        return {**plan, "action": "skip", "top_k": 0, "reason": "small talk"}
+
+    previous = last_user_message(conversation_context)
+    opener = FOLLOW_UP.match(text)
+    # "why" / "more ..." / "and ..." only continue the previous turn when the
+    # rest of the message brings no new topic ("why is magnesium good for sleep" is a new question)
+    is_follow_up = bool(opener) and len(words) <= 6 and not new_terms(text[opener.end():], previous)
+    if not is_follow_up and len(words) <= 5 and confidence <= DEFAULT_CONFIDENCE:
+        # "is it safe?" - refers back without naming a topic
+        is_follow_up = any(word in REFERENCES for word in words)
+    if conversation_context and is_follow_up:
+        if has_previous:
+            return {**plan, "action": "reuse", "top_k": 0, "reason": "follow-up to previous turn"}
+        if previous:
+            return {**plan, "query": f"{previous} {query}", "reason": "follow-up, searching with previous question"}
+
+    top_k = RETRIEVAL_TOP_K
+    reasons = []
+    if confidence >= 0.85 and len(words) <= 12:
+        top_k -= 2
+        reasons.append("focused query")
+    elif confidence <= DEFAULT_CONFIDENCE:
+        top_k += 2
+        reasons.append("low router confidence")
+    if len(words) > 30 or query.count("?") > 1:
+        top_k += 3
+        reasons.append("multi-part query")
+    top_k = max(RETRIEVAL_MIN_K, min(RETRIEVAL_MAX_K, top_k))
+    return {**plan, "top_k": top_k, "reason": ", ".join(reasons) or "default"}
+
+def fit_plan_to_budget(plan: dict, budget: float, expected: Optional[float] = None) -> dict:
+    """
+    Shrink a plan to the time left for retrieval: skip it when less than
+    RETRIEVAL_MIN_BUDGET remains, fetch RETRIEVAL_MIN_K chunks when a typical
+    retrieval (expected seconds, e.g. p95) would not fit
+    """
+    if plan["action"] != "retrieve":
+        return plan
+    if budget < RETRIEVAL_MIN_BUDGET:
+        return {**plan, "action": "skip", "top_k": 0, "reason": f"{plan['reason']}; no time left for retrieval"}
+    if expected is not None and expected > budget and plan["top_k"] > RETRIEVAL_MIN_K:
+        return {**plan, "top_k": RETRIEVAL_MIN_K, "reason": f"{plan['reason']}; short on time"}
+    return plan
+
+class RetrievalPlanStats:
+    """Per-action counts and estimated retrieval time saved (per process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.actions = {"retrieve": 0, "reuse": 0, "skip": 0}
+        self.top_k_total = 0
+        self.seconds_saved = 0.0
+
+    def record(self, plan: dict, seconds_saved: float = 0.0):
+        with self._lock:
+            self.actions[plan["action"]] = self.actions.get(plan["action"], 0) + 1
+            if plan["action"] == "retrieve":
+                self.top_k_total += plan["top_k"]
+            self.seconds_saved += seconds_saved or 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.actions.values())
+            retrieved = self.actions.get("retrieve", 0)
+            return {
+                "plans": total,
+                "actions": dict(self.actions),
+                "avoided_rate": round(1 - retrieved / total, 4) if total else None,
+                "avg_top_k": round(self.top_k_total / retrieved, 2) if retrieved else None,
+                "estimated_seconds_saved": round(self.seconds_saved, 3)
+            }
+
+retrieval_plan_stats = RetrievalPlanStats()
+
+def get_retrieval_plan_stats() -> dict:
+    return retrieval_plan_stats.stats()
@@ -0,0 +1,59 @@
+"""
+Post-retrieval re-ranking: score floor and maximal marginal relevance (MMR).
+MMR picks chunks one at a time, trading relevance to the query against
+similarity to chunks already picked, so five near-identical passages don't
+crowd out a second useful document:
+    argmax_i  lambda * relevance[i] - (1 - lambda) * max_j sim(i, j selected)
+"""
+from typing import List, Optional
+import numpy as np
+
+def mmr_select(relevance: np.ndarray, embeddings: Optional[np.ndarray], k: int, lambda_: float = 0.7) -> List[int]:
+    """
+    Indices of k items chosen by MMR, in pick order.
+    relevance: (n,) scores in [0, 1]; embeddings: (n, d) rows (NaN rows have
+    no vector and are never penalized as redundant), or None for relevance order.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if embeddings is None or n <= 1:
+        return [int(i) for i in np.argsort(-relevance)[:k]]
+
+    has_vector = ~np.isnan(embeddings).any(axis=1)
+    vectors = np.nan_to_num(embeddings.astype(np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.maximum(norms, 1e-12)
+    similarity = vectors @ vectors.T
+    similarity[~has_vector, :] = 0.0
+    similarity[:, ~has_vector] = 0.0
+
+    selected = []
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(k):
+        scores = lambda_ * relevance - (1 - lambda_) * max_similarity
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        max_similarity = np.maximum(max_similarity, similarity[pick])
+    return selected
+
+def rerank(matches: List[dict], k: int, lambda_: float = 0.7) -> List[dict]:
+    """
+    MMR over matches carrying "relevance" (0-1) and optional "values" (embedding).
+    Returns the k chosen matches in pick order.
+    """
+    if not matches:
+        return []
+    relevance = np.asarray([match["relevance"] for match in matches], dtype=np.float32)
+    embeddings = None
+    dimension = next((len(match["values"]) for match in matches if match.get("values")), 0)
+    if dimension:
+        embeddings = np.full((len(matches), dimension), np.nan, dtype=np.float32)
+        for i, match in enumerate(matches):
+            if match.get("values"):
+                embeddings[i] = match["values"]
+    return [matches[i] for i in mmr_select(relevance, embeddings, k, lambda_)]
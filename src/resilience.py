@@ -0,0 +1,228 @@
+"""
+Resilience helpers shared by retrieval, generation and ingestion.
+- Deadline: a request's remaining time budget, passed down to every call so
+  timeouts and retries never outlive the request
+- CircuitBreaker: per dependency; after repeated transient failures the
+  dependency is skipped (fail fast) until a probe call succeeds. Rate limits
+  are not failures: callers back off instead
+- call(): bounded retries with full-jitter backoff through the breaker
+Callers degrade on CircuitOpenError / DeadlineExceeded (e.g. answer without
+retrieval) instead of waiting out a dead dependency.
+"""
+from src.config import (
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_TIME,
+    RETRY_MAX_ATTEMPTS, RETRY_BACKOFF_BASE
+)
+from typing import Callable, Optional
+import random
+import threading
+import time
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out"""
+
+class CircuitOpenError(Exception):
+    """The dependency's circuit breaker is open - not calling it"""
+
+class Deadline:
+    """Absolute point in time a request must finish by"""
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return self.budget - (self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Remaining time, capped at a per-call timeout"""
+        remaining = self.remaining()
+        return remaining if cap is None else min(cap, remaining)
+
+    def shortened(self, seconds: float) -> "Deadline":
+        """A deadline ending seconds earlier, keeping that time for later stages"""
+        deadline = Deadline(0)
+        deadline.budget = self.budget
+        deadline.expires_at = self.expires_at - seconds
+        return deadline
+
+    def check(self, stage: str = ""):
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline exceeded{' before ' + stage if stage else ''}")
+
+def call_timeout(deadline: Optional[Deadline], cap: float) -> float:
+    """Timeout for one call: cap, or less if the deadline is closer"""
+    return deadline.timeout(cap) if deadline else cap
+
+# === Error classification ===
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status carried by a Cohere/Pinecone/Groq client exception, if any"""
+    for attr in ("status_code", "status"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+def is_rate_limited(error: Exception) -> bool:
+    message = str(error).lower()
+    return error_status(error) == 429 or "rate limit" in message or "too many requests" in message
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors, timeouts and network failures are worth retrying"""
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    if is_rate_limited(error):
+        return True
+    status = error_status(error)
+    if status is not None:
+        return status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    message = str(error).lower()
+    return "timeout" in message or "timed out" in message or "connection" in message or "temporar" in message
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+# === Circuit breakers ===
+
+class CircuitBreaker:
+    """
+    closed -> open after failure_threshold consecutive transient failures;
+    open -> half_open after recovery_time, letting one probe call through;
+    the probe's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, recovery_time: float = BREAKER_RECOVERY_TIME):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.recovery_time:
+                return "half_open"
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go ahead now"""
+        with self._lock:
+            if self._state == "open":
+                if time.monotonic() - self._opened_at < self.recovery_time:
+                    self.rejected += 1
+                    return False
+                self._state = "half_open"
+                self._probe_in_flight = False
+            if self._state == "half_open":
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self.opened += 1
+                    print(f"Circuit breaker '{self.name}' opened after {self._failures} failures")
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "times_opened": self.opened,
+                "rejected_calls": self.rejected
+            }
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(dependency: str) -> CircuitBreaker:
+    """The process-wide breaker for a dependency (created on first use)"""
+    with _breakers_lock:
+        breaker = _breakers.get(dependency)
+        if breaker is None:
+            breaker = _breakers[dependency] = CircuitBreaker(dependency)
+        return breaker
+
+def breaker_states() -> dict:
+    """State of every breaker, for /api/health"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.stats() for name, breaker in sorted(breakers.items())}
+
+# === Calls ===
+
+def call(
+    dependency: str,
+    func: Callable[[float], object],
+    timeout: float,
+    deadline: Optional[Deadline] = None,
+    retries: int = RETRY_MAX_ATTEMPTS,
+    backoff_base: float = RETRY_BACKOFF_BASE,
+    on_retry: Optional[Callable[[Exception], None]] = None
+):
+    """
+    Call func(attempt_timeout) through the dependency's circuit breaker,
+    retrying transient failures up to retries times with full-jitter backoff.
+    attempt_timeout is timeout capped by the deadline; func must apply it to
+    the client call. Raises CircuitOpenError (breaker open), DeadlineExceeded
+    (no time left) or the last error.
+    """
+    breaker = get_breaker(dependency)
+    attempt = 0
+    while True:
+        if deadline:
+            deadline.check(dependency)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{dependency} circuit breaker is open")
+        try:
+            result = func(call_timeout(deadline, timeout))
+        except Exception as e:
+            if is_retryable(e) and not is_rate_limited(e):
+                breaker.record_failure()
+            else:
+                # The dependency answered (e.g. a 400, or a 429 asking us to
+                # slow down - backoff handles that) - it is up
+                breaker.record_success()
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, backoff_base)
+            if deadline and delay >= deadline.remaining():
+                raise
+            if on_retry:
+                on_retry(e)
+            time.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
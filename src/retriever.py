@@ -1,88 +1,337 @@
-from pinecone import Pinecone
-import cohere
-from src.config import PINECONE_API_KEY, COHERE_API_KEY
-from typing import Tuple, List
+import numpy as np
+from src.config import (
+    EMBED_MODEL,
+    CACHE_DIR, EMBEDDING_CACHE_MAX_MB, EMBEDDING_CACHE_TTL,
+    HYBRID_SEARCH_ENABLED, HYBRID_CANDIDATES, RRF_K,
+    RETRIEVAL_FETCH_K, RETRIEVAL_MIN_SCORE, MMR_ENABLED, MMR_LAMBDA,
+    SESSION_CACHE_MIN_OVERLAP, COHERE_TIMEOUT, VECTOR_STORE_TIMEOUT
+)
+from src.cache import TieredCache
+from src.vector_store import get_vector_store
+from src.clients import get_cohere_client
+from src.bm25 import get_bm25_index
+from src.monitoring import get_latency_tracker
+from src.context import assemble_context
+from src.rerank import rerank
+from src.planner import retrieval_plan_stats
+from src.session_cache import get_session_cache
+from src.resilience import Deadline, get_breaker, is_rate_limited, call as resilient_call
+from src.scheduler import get_cohere_scheduler, INTERACTIVE
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, List
+import hashlib
+import math
+import os
 import time
 
-print("Initializing Pinecone retriever...")
-
-# Initialize Pinecone
-try:
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    index = pc.Index("ombee-holistic")
-    print("Pinecone connected")
-except Exception as e:
-    print(f"Pinecone initialization failed: {e}")
-    index = None
-
-# Initialize Cohere
-try:
-    co = cohere.Client(api_key=COHERE_API_KEY)
-    print("Cohere connected")
-except Exception as e:
-    print(f"Cohere initialization failed: {e}")
-    co = None
+# The vector store (Pinecone index PINECONE_INDEX_NAME, or the local index)
+# and the Cohere client are created on first use, inside the breaker-guarded
+# calls below: a failed connection counts as a dependency failure and is
+# retried on a later request.
 
-def retrieve_context(query: str, n_results: int = 5) -> Tuple[str, List[str], float]:
+latency_tracker = get_latency_tracker()
+
+# Register the breakers up front so /api/health lists them before first use
+get_breaker("cohere")
+get_breaker("vector_store")
+
+session_cache = get_session_cache()
+cohere_scheduler = get_cohere_scheduler()
+
+def previous_turn_chunks(session_id: Optional[str]) -> List[dict]:
+    """Chunks used for the session's recent turns (empty if unknown or expired)"""
+    return session_cache.chunks(session_id)
+
+# Keyword search runs here while dense search runs on the caller's thread
+_lexical_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bm25")
+
+# Query embedding cache: float32 arrays bounded by bytes, optionally shared
+# across workers through a SQLite file in OMBEE_CACHE_DIR
+embedding_cache = TieredCache(
+    name="query_embeddings",
+    max_size=int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024),
+    ttl=EMBEDDING_CACHE_TTL,
+    getsizeof=lambda vector: vector.nbytes,
+    disk_path=os.path.join(CACHE_DIR, "embeddings.sqlite3") if CACHE_DIR else None,
+    serialize=lambda vector: vector.tobytes(),
+    deserialize=lambda blob: np.frombuffer(blob, dtype=np.float32)
+)
+
+def normalize_query(query: str) -> str:
+    """Normalize query text for cache keys (case and whitespace insensitive)"""
+    return " ".join(query.split()).casefold()
+
+def embed_query(query: str, model: str = EMBED_MODEL, deadline: Optional[Deadline] = None) -> np.ndarray:
     """
-    Retrieve relevant context for a query from Pinecone.
-    Returns: (context_string, list_of_sources, retrieval_time_seconds)
+    Embed a search query with Cohere, using the query embedding cache.
+    The call is bounded by COHERE_TIMEOUT (and the deadline), retried and
+    guarded by the "cohere" circuit breaker, and queues on the Cohere
+    scheduler at interactive priority (ahead of ingestion).
+    Returns: float32 vector
     """
-    print("Retrieving context from Pinecone...")
-    start = time.time()
+    normalized = normalize_query(query)
+    key = hashlib.sha256(f"{model}\x00search_query\x00{normalized}".encode("utf-8")).hexdigest()
+
+    cached = embedding_cache.get(key)
+    if cached is not None:
+        return cached
+
+    def attempt(timeout):
+        with cohere_scheduler.slot(priority=INTERACTIVE, deadline=deadline) as ticket:
+            try:
+                return get_cohere_client().embed(
+                    texts=[normalized],
+                    model=model,
+                    input_type="search_query",
+                    request_options={"timeout_in_seconds": max(1, math.ceil(timeout)), "max_retries": 0}
+                ).embeddings[0]
+            except Exception as e:
+                ticket["rate_limited"] = is_rate_limited(e)
+                raise
+
+    embedding = resilient_call("cohere", attempt, COHERE_TIMEOUT, deadline=deadline)
+    vector = np.asarray(embedding, dtype=np.float32)
+    embedding_cache.set(key, vector)
+    return vector
+
+def get_embedding_cache_stats() -> dict:
+    """Hit/miss counters for the query embedding cache"""
+    return embedding_cache.stats()
+
+def dense_search(query: str, top_k: int, include_values: bool = False, deadline: Optional[Deadline] = None) -> List[dict]:
+    """Vector search: [{"id", "score", "metadata"(, "values")}, ...] best first"""
+    vector = embed_query(query, deadline=deadline)
+    results = resilient_call(
+        "vector_store",
+        lambda timeout: get_vector_store().query(
+            vector=vector, top_k=top_k, include_metadata=True, include_values=include_values, timeout=timeout
+        ),
+        VECTOR_STORE_TIMEOUT,
+        deadline=deadline
+    )
+    matches = []
+    for match in results["matches"]:
+        entry = {"id": match["id"], "score": match["score"], "metadata": match["metadata"] or {}}
+        if include_values:
+            entry["values"] = match["values"] or None
+        matches.append(entry)
+    return matches
+
+def lexical_search(query: str, top_k: int) -> List[dict]:
+    """BM25 keyword search: [{"id", "score", "metadata"}, ...] best first"""
+    return get_bm25_index().search(query, top_k)
+
+def _timed(metric: str, func, *args):
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        latency_tracker.record(metric, time.perf_counter() - start)
+
+def reciprocal_rank_fusion(dense: List[dict], lexical: List[dict], k: int = RRF_K) -> List[dict]:
+    """
+    Merge two ranked lists by reciprocal rank: sum of 1 / (k + rank).
+    Fused matches keep the dense (cosine) score when the chunk had one.
+    """
+    fused = {}
+    for retriever_name, matches in (("dense", dense), ("lexical", lexical)):
+        for rank, match in enumerate(matches, start=1):
+            entry = fused.get(match["id"])
+            if entry is None:
+                entry = fused[match["id"]] = {
+                    "id": match["id"],
+                    "score": None,
+                    "metadata": match["metadata"],
+                    "rrf_score": 0.0,
+                    "retrievers": []
+                }
+            if retriever_name == "dense":
+                entry["score"] = match["score"]
+                entry["values"] = match.get("values")
+            entry["rrf_score"] += 1.0 / (k + rank)
+            entry["retrievers"].append(retriever_name)
+    return sorted(fused.values(), key=lambda entry: entry["rrf_score"], reverse=True)
+
+def rerank_matches(matches: List[dict], n_results: int) -> List[dict]:
+    """
+    MMR over the over-fetched candidates so near-identical chunks don't fill
+    every slot. Relevance is the cosine score for vector-only results and the
+    normalized fusion score for hybrid results.
+    """
+    if not MMR_ENABLED or len(matches) <= n_results:
+        return matches[:n_results]
+    if "rrf_score" in matches[0]:
+        best = matches[0]["rrf_score"]
+        candidates = [{**match, "relevance": match["rrf_score"] / best} for match in matches]
+    else:
+        candidates = [{**match, "relevance": match["score"]} for match in matches]
+    return rerank(candidates, n_results, MMR_LAMBDA)
+
+def format_source(match: dict) -> str:
+    source = match["metadata"].get("source", "Unknown")
+    if match.get("score") is None:
+        return f"{source} (keyword match)"
+    return f"{source} (score: {match['score']:.2f})"
+
+def search_chunks(query: str, n_results: int = 5, deadline: Optional[Deadline] = None) -> List[dict]:
+    """
+    Ranked chunks for a query: dense vector search, fused with BM25 keyword
+    search (run concurrently) when hybrid search is enabled. Vector matches
+    below RETRIEVAL_MIN_SCORE are dropped, then MMR picks n_results from the
+    over-fetched candidates. If vector search fails (timeout, open breaker)
+    the keyword results are used alone.
+    Per-retriever timings go to the latency tracker (retrieval.dense/lexical).
+    Returns: [{"id", "text", "score", "source", "metadata"}, ...] best first
+    """
+    lexical_future = None
+    if HYBRID_SEARCH_ENABLED:
+        lexical_candidates = max(n_results, HYBRID_CANDIDATES)
+        lexical_future = _lexical_pool.submit(_timed, "retrieval.lexical", lexical_search, query, lexical_candidates)
+    
+    print("Searching vector store...")
+    candidates = max(n_results, RETRIEVAL_FETCH_K) if MMR_ENABLED or HYBRID_SEARCH_ENABLED else n_results
+    dense = []
+    dense_error = None
+    try:
+        dense = _timed("retrieval.dense", dense_search, query, candidates, MMR_ENABLED, deadline)
+    except Exception as e:
+        dense_error = e
+    fetched = len(dense)
+    dense = [match for match in dense if match["score"] >= RETRIEVAL_MIN_SCORE]
+    
+    lexical = []
+    if lexical_future is not None:
+        try:
+            lexical = lexical_future.result()
+        except Exception as e:
+            print(f"Keyword search failed, using vector results only: {e}")
+    
+    if dense_error is not None:
+        if not lexical:
+            raise dense_error
+        print(f"Vector search failed, using keyword results only: {dense_error}")
+    
+    if lexical:
+        matches = reciprocal_rank_fusion(dense, lexical)
+    else:
+        matches = dense
+    matches = rerank_matches(matches, n_results)
+    print(
+        f"Found {len(matches)} results ({len(dense)}/{fetched} vector above {RETRIEVAL_MIN_SCORE}, "
+        f"{len(lexical)} keyword candidates)"
+    )
     
-    if index is None:
-        print("Pinecone index not available!")
-        return "Error: Pinecone not initialized. Check API key.", [], 0.0
+    return [
+        {
+            "id": match["id"],
+            "text": match["metadata"].get("text", ""),
+            "score": match["score"],
+            "source": format_source(match),
+            "metadata": match["metadata"]
+        }
+        for match in matches
+    ]
+
+def degraded_context(conversation_context: str, reason: str) -> Tuple[str, dict]:
+    """
+    Prompt context without documents, for answering when retrieval is
+    unavailable; the report carries the reason under "degraded"
+    """
+    context, _, report = assemble_context([], conversation_context)
+    report["degraded"] = reason
+    return context, report
+
+def retrieve_prompt_context(
+    query: str,
+    conversation_context: str = "",
+    n_results: int = 5,
+    session_id: Optional[str] = None,
+    deadline: Optional[Deadline] = None
+) -> Tuple[str, List[str], float, Optional[dict]]:
+    """
+    Retrieve chunks and assemble the prompt context (conversation history +
+    deduplicated documents) under the context token budget.
+    Returns: (context_string, list_of_sources, retrieval_time_seconds, budget_report)
+    Sources only list chunks that made it into the context.
+    With a session_id, chunks cached from the session's recent turns that
+    match the query count towards n_results: the vector store is skipped when
+    they cover it and only asked for the remainder otherwise. The chunks used
+    are cached for the next turn.
+    When retrieval fails (dependency down, breaker open, deadline spent) the
+    context has no documents and budget_report["degraded"] says why, so the
+    turn is still answered.
+    """
+    print("Retrieving context from vector store...")
+    start = time.time()
     
-    if co is None:
-        print("Cohere client not available!")
-        return "Error: Cohere not initialized.", [], 0.0
+    cached = []
+    if session_id:
+        cached = session_cache.relevant(session_id, query, SESSION_CACHE_MIN_OVERLAP)[:n_results]
+        session_cache.record(len(cached), n_results)
     
     try:
-        # Embed the query
-        print("Embedding query...")
-        query_embedding = co.embed(
-            texts=[query],
-            model="embed-english-v3.0",
-            input_type="search_query"
-        ).embeddings[0]
-        print(f"Query embedded")
-        
-        # Search Pinecone
-        print("Searching Pinecone...")
-        results = index.query(
-            vector=query_embedding,
-            top_k=n_results,
-            include_metadata=True
-        )
-        print(f"Found {len(results['matches'])} results")
-        
-        # Extract context and sources
-        contexts = []
-        sources = []
-        
-        for match in results['matches']:
-            text = match['metadata'].get('text', '')
-            source = match['metadata'].get('source', 'Unknown')
-            score = match['score']
-            
-            contexts.append(text)
-            sources.append(f"{source} (score: {score:.2f})")
-        
-        if contexts:
-            context = "\n\n---\n\n".join(contexts)
+        if len(cached) >= n_results:
+            print(f"Session cache covers the query ({len(cached)} chunks), skipping search")
+            chunks = cached
         else:
-            context = "No relevant information found."
+            fresh = search_chunks(query, n_results - len(cached), deadline)
+            fresh_ids = {chunk["id"] for chunk in fresh}
+            chunks = fresh + [chunk for chunk in cached if chunk["id"] not in fresh_ids]
+            if cached:
+                print(f"Merged {len(fresh)} fresh chunks with {len(cached)} from the session cache")
+        context, kept, report = assemble_context(chunks, conversation_context)
+        sources = [chunk["source"] for chunk in kept]
+        session_cache.add_turn(session_id, kept)
+        print(f"Context: {report['tokens_after']} tokens ({report['tokens_saved']} saved, {report['duplicates_dropped']} duplicates dropped)")
         
         end = time.time()
         retrieval_time = end - start
-        return context, sources, retrieval_time
+        if len(cached) < n_results:
+            latency_tracker.record("retrieval.total", retrieval_time)
+        return context, sources, retrieval_time, report
     
     except Exception as e:
-        print(f"Error during retrieval: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Retrieval failed, answering without documents: {e}")
         end = time.time()
         retrieval_time = end - start
-        return f"Error: {str(e)}", [], retrieval_time
\ No newline at end of file
+        if cached:
+            context, kept, report = assemble_context(cached, conversation_context)
+            report["degraded"] = f"search failed, used session cache: {e}"
+            return context, [chunk["source"] for chunk in kept], retrieval_time, report
+        context, report = degraded_context(conversation_context, str(e))
+        return context, [], retrieval_time, report
+
+def retrieve_planned_context(
+    query: str,
+    plan: dict,
+    conversation_context: str = "",
+    session_id: Optional[str] = None,
+    deadline: Optional[Deadline] = None
+) -> Tuple[str, List[str], Optional[float], Optional[dict]]:
+    """
+    Build the prompt context as decided by the retrieval planner
+    (src.planner.plan_retrieval): retrieve plan["top_k"] chunks for
+    plan["query"], reuse the session's previous chunks, or skip retrieval.
+    Returns: same as retrieve_prompt_context (retrieval_time is None when
+    nothing was retrieved)
+    """
+    if plan["action"] == "retrieve":
+        result = retrieve_prompt_context(plan["query"], conversation_context, plan["top_k"], session_id, deadline)
+        retrieval_plan_stats.record(plan)
+        return result
+
+    chunks = previous_turn_chunks(session_id) if plan["action"] == "reuse" else []
+    context, kept, report = assemble_context(chunks, conversation_context)
+    session_cache.add_turn(session_id, kept)
+    # A skipped search saves roughly a typical retrieval
+    saved = latency_tracker.percentile("retrieval.total", 50) or 0.0
+    retrieval_plan_stats.record(plan, saved)
+    return context, [chunk["source"] for chunk in kept], None, report
+
+def retrieve_context(query: str, n_results: int = 5) -> Tuple[str, List[str], float]:
+    """
+    Retrieve relevant context for a query (see retrieve_prompt_context).
+    Returns: (context_string, list_of_sources, retrieval_time_seconds)
+    """
+    context, sources, retrieval_time, _ = retrieve_prompt_context(query, n_results=n_results)
+    return context, sources, retrieval_time
\ No newline at end of file
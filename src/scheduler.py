@@ -0,0 +1,233 @@
+"""
+Outbound scheduler for Groq and Cohere calls.
+Bursts of chat requests used to fire completions all at once, hit Groq's rate
+limits and fail together. Calls now queue for a slot instead:
+- global and per-user concurrency caps
+- token buckets for requests/minute and tokens/minute (Groq RPM/TPM limits)
+- interactive calls are admitted before background work (chat query
+  embeddings go ahead of ingestion's document embeds on the Cohere scheduler)
+Excess load waits in the queue (shaped) and only fails after queue_timeout.
+Queue depth and wait times are reported for /api/metrics.
+"""
+from src.config import (
+    GROQ_MAX_CONCURRENCY, GROQ_MAX_CONCURRENCY_PER_USER,
+    GROQ_RPM_LIMIT, GROQ_TPM_LIMIT, GROQ_QUEUE_TIMEOUT,
+    COHERE_MAX_CONCURRENCY, COHERE_RPM_LIMIT, COHERE_QUEUE_TIMEOUT
+)
+from src.monitoring import get_latency_tracker
+from collections import Counter
+from contextlib import contextmanager
+import bisect
+import itertools
+import threading
+import time
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+class SchedulerTimeout(Exception):
+    """A call waited longer than the queue timeout for a slot"""
+
+class TokenBucket:
+    """Refills rate_per_minute units per minute up to one minute's worth (0 disables)"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount units are available (0 if they are now)"""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if self.enabled:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Give back (positive) or charge (negative) units after the fact"""
+        if self.enabled:
+            self._refill()
+            self.tokens = max(-self.capacity, min(self.capacity, self.tokens + amount))
+
+    def drain(self):
+        """Empty the bucket (the upstream reported a rate limit anyway)"""
+        if self.enabled:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+class OutboundScheduler:
+    """Priority queue + concurrency caps + RPM/TPM token buckets, shared by all threads"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = GROQ_MAX_CONCURRENCY,
+        max_per_user: int = GROQ_MAX_CONCURRENCY_PER_USER,
+        rpm: float = GROQ_RPM_LIMIT,
+        tpm: float = GROQ_TPM_LIMIT,
+        queue_timeout: float = GROQ_QUEUE_TIMEOUT
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.queue_timeout = queue_timeout
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._queue = []  # sorted (priority, seq, ticket)
+        self._seq = itertools.count()
+        self._active = 0
+        self._active_by_user = Counter()
+        self._latency = get_latency_tracker()
+
+        self.admitted = Counter()
+        self.delayed = 0
+        self.timeouts = 0
+        self.rate_limited = 0
+        self.max_queue_depth = 0
+
+    def _user_has_room(self, user_id) -> bool:
+        return user_id is None or self.max_per_user <= 0 or self._active_by_user[user_id] < self.max_per_user
+
+    def _next_ticket(self):
+        """First queued ticket whose user is under the per-user cap"""
+        for _, _, ticket in self._queue:
+            if self._user_has_room(ticket["user_id"]):
+                return ticket
+        return None
+
+    def _remove(self, entry):
+        index = bisect.bisect_left(self._queue, entry)
+        if index < len(self._queue) and self._queue[index] is entry:
+            del self._queue[index]
+        else:
+            self._queue.remove(entry)
+
+    def acquire(self, user_id: str = None, priority: int = INTERACTIVE, tokens: int = 0, deadline=None) -> dict:
+        """
+        Wait for a slot. tokens is the estimated prompt + completion size.
+        Returns a ticket for release(); raises SchedulerTimeout after queue_timeout,
+        or sooner if the request's deadline (resilience.Deadline) ends first.
+        """
+        ticket = {"user_id": user_id, "priority": priority, "tokens": tokens, "enqueued": time.monotonic()}
+        entry = (priority, next(self._seq), ticket)
+        wait_limit = self.queue_timeout if deadline is None else min(self.queue_timeout, deadline.remaining())
+        give_up_at = ticket["enqueued"] + wait_limit
+        with self._cond:
+            bisect.insort(self._queue, entry)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            waited = False
+            while True:
+                delay = None
+                if self._next_ticket() is ticket and (self.max_concurrency <= 0 or self._active < self.max_concurrency):
+                    delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if delay <= 0:
+                        break
+                remaining = give_up_at - time.monotonic()
+                if remaining <= 0:
+                    self._remove(entry)
+                    self.timeouts += 1
+                    self._cond.notify_all()
+                    raise SchedulerTimeout(f"{self.name}: no slot after {wait_limit:.1f}s in queue")
+                waited = True
+                self._cond.wait(timeout=min(delay, remaining) if delay else remaining)
+
+            self._remove(entry)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self._active += 1
+            self._active_by_user[user_id] += 1
+            self.admitted[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            if waited:
+                self.delayed += 1
+            # The next ticket in line may be admissible now
+            self._cond.notify_all()
+
+        wait = time.monotonic() - ticket["enqueued"]
+        self._latency.record(f"{self.name}.queue_wait", wait)
+        ticket["wait"] = wait
+        return ticket
+
+    def release(self, ticket: dict, used_tokens: int = None, rate_limited: bool = False):
+        """Free a slot; used_tokens corrects the TPM estimate with the real usage"""
+        with self._cond:
+            self._active -= 1
+            self._active_by_user[ticket["user_id"]] -= 1
+            if self._active_by_user[ticket["user_id"]] <= 0:
+                del self._active_by_user[ticket["user_id"]]
+            if used_tokens is not None:
+                self.tokens.adjust(ticket["tokens"] - used_tokens)
+            if rate_limited:
+                self.rate_limited += 1
+                self.requests.drain()
+                self.tokens.drain()
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, user_id: str = None, priority: int = INTERACTIVE, tokens: int = 0, deadline=None):
+        """with scheduler.slot(...) as ticket: - set ticket["used_tokens"] / ticket["rate_limited"] to report back"""
+        ticket = self.acquire(user_id, priority, tokens, deadline)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket, ticket.get("used_tokens"), ticket.get("rate_limited", False))
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = Counter(PRIORITY_NAMES.get(priority, str(priority)) for priority, _, _ in self._queue)
+            return {
+                "active": self._active,
+                "max_concurrency": self.max_concurrency,
+                "max_per_user": self.max_per_user,
+                "queue_depth": len(self._queue),
+                "queued": dict(queued),
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": dict(self.admitted),
+                "delayed": self.delayed,
+                "timeouts": self.timeouts,
+                "rate_limited": self.rate_limited,
+                "rpm_available": round(self.requests.tokens, 1) if self.requests.enabled else None,
+                "tpm_available": round(self.tokens.tokens) if self.tokens.enabled else None,
+                "wait_ms_p50": _ms(self._latency.percentile(f"{self.name}.queue_wait", 50)),
+                "wait_ms_p99": _ms(self._latency.percentile(f"{self.name}.queue_wait", 99))
+            }
+
+def _ms(seconds):
+    return round(seconds * 1000.0, 1) if seconds is not None else None
+
+groq_scheduler = OutboundScheduler("groq")
+
+def get_groq_scheduler() -> OutboundScheduler:
+    return groq_scheduler
+
+# Embeddings are limited by calls, not tokens; no per-user cap (ingestion has no user)
+cohere_scheduler = OutboundScheduler(
+    "cohere",
+    max_concurrency=COHERE_MAX_CONCURRENCY,
+    max_per_user=0,
+    rpm=COHERE_RPM_LIMIT,
+    tpm=0,
+    queue_timeout=COHERE_QUEUE_TIMEOUT
+)
+
+def get_cohere_scheduler() -> OutboundScheduler:
+    return cohere_scheduler
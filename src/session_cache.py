@@ -0,0 +1,141 @@
+"""
+Per-session retrieval cache: the chunks used for each session's last few
+turns. Follow-up questions usually hit the same documents, so the retriever
+answers from these (or asks the vector store for fewer new chunks) instead of
+re-embedding and re-querying every turn.
+Memory is bounded by approximate bytes (TTL + LRU across sessions, like the
+TieredCache memory tier); deleting a session evicts its entry.
+
+The cache is per process. With several workers (WEB_CONCURRENCY > 1) each one
+holds its own copy:
+- a turn served by another worker is not in this worker's cache, so it
+  misses more often (a miss is just a normal search).
+- deleting a session only evicts it in the worker that handled the delete.
+  The other copies are never served, because chat turns for a deleted session
+  404 before retrieval, and they expire after SESSION_CACHE_TTL.
+- a knowledge base update (bump_kb_version, shared through OMBEE_CACHE_DIR)
+  drops every worker's cached chunks on its next lookup, as in the answer cache.
+"""
+from src.config import SESSION_CACHE_TURNS, SESSION_CACHE_MAX_MB, SESSION_CACHE_TTL
+from src.bm25 import tokenize
+from src.answer_cache import kb_version
+from cachetools import TTLCache
+from typing import List, Optional
+import threading
+
+CHUNK_OVERHEAD_BYTES = 200  # dict, id and term set bookkeeping per chunk
+
+def _turn_size(turn: tuple) -> int:
+    return sum(len(chunk["text"]) + len(chunk["id"]) + CHUNK_OVERHEAD_BYTES for chunk in turn)
+
+def _session_size(turns: tuple) -> int:
+    return sum(_turn_size(turn) for turn in turns)
+
+class SessionRetrievalCache:
+    """Last max_turns turns of retrieved chunks per session"""
+
+    def __init__(self, max_turns: int = SESSION_CACHE_TURNS, max_mb: float = SESSION_CACHE_MAX_MB, ttl: float = SESSION_CACHE_TTL):
+        self.max_turns = max_turns
+        self._sessions = TTLCache(maxsize=max(1, int(max_mb * 1024 * 1024)), ttl=ttl, getsizeof=_session_size)
+        self._lock = threading.Lock()
+        self._kb_version = kb_version()
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_kb_version(self):
+        # Caller holds the lock: chunks from an older knowledge base are dropped
+        current = kb_version()
+        if current != self._kb_version:
+            self._sessions.clear()
+            self._kb_version = current
+            self.invalidations += 1
+
+    def add_turn(self, session_id: Optional[str], chunks: List[dict]):
+        """Remember a turn's chunks ({"id", "text", "source", ...}); newest turn first"""
+        if not session_id or not chunks:
+            return
+        turn = tuple(
+            {
+                "id": chunk.get("id") or chunk["source"],
+                "text": chunk["text"],
+                "source": chunk["source"],
+                "score": chunk.get("score"),
+                "terms": frozenset(tokenize(chunk["text"]))
+            }
+            for chunk in chunks
+        )
+        with self._lock:
+            self._check_kb_version()
+            turns = (turn,) + self._sessions.get(session_id, ())[:self.max_turns - 1]
+            try:
+                self._sessions[session_id] = turns
+            except ValueError:
+                # A single session larger than the whole cache
+                self._sessions.pop(session_id, None)
+
+    def chunks(self, session_id: Optional[str]) -> List[dict]:
+        """Cached chunks for a session, newest turn first, without repeats"""
+        if not session_id:
+            return []
+        with self._lock:
+            self._check_kb_version()
+            turns = self._sessions.get(session_id, ())
+        seen = set()
+        merged = []
+        for turn in turns:
+            for chunk in turn:
+                if chunk["id"] not in seen:
+                    seen.add(chunk["id"])
+                    merged.append(chunk)
+        return merged
+
+    def relevant(self, session_id: Optional[str], query: str, min_overlap: float) -> List[dict]:
+        """
+        Cached chunks containing at least min_overlap of the query's terms,
+        best overlap first (ties keep the newest turn first)
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scored = []
+        for chunk in self.chunks(session_id):
+            overlap = len(terms & chunk["terms"]) / len(terms)
+            if overlap >= min_overlap:
+                scored.append((overlap, chunk))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [chunk for _, chunk in scored]
+
+    def record(self, cached: int, needed: int):
+        """Count a lookup that found cached of the needed chunks"""
+        with self._lock:
+            if cached >= needed:
+                self.hits += 1
+            elif cached:
+                self.partial_hits += 1
+            else:
+                self.misses += 1
+
+    def evict(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.partial_hits + self.misses
+            return {
+                "sessions": len(self._sessions),
+                "memory_bytes": int(self._sessions.currsize),
+                "max_bytes": int(self._sessions.maxsize),
+                "hits": self.hits,
+                "partial_hits": self.partial_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round((self.hits + self.partial_hits) / lookups, 4) if lookups else None
+            }
+
+session_retrieval_cache = SessionRetrievalCache()
+
+def get_session_cache() -> SessionRetrievalCache:
+    return session_retrieval_cache
@@ -0,0 +1,80 @@
+"""
+Token counting and text chunking helpers
+Counts are an offline estimate of BPE tokenizers (Cohere, Llama): one token
+per punctuation mark and roughly one per four characters of a word. That is
+close enough for chunk sizing and prompt budgets without a network call or
+a model-specific tokenizer download.
+"""
+import re
+from typing import List
+
+CHARS_PER_TOKEN = 4
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_PATTERN = re.compile(r"[^.!?\n]+(?:[.!?]+|\n+|$)")
+
+def _piece_tokens(piece: str) -> int:
+    return max(1, -(-len(piece) // CHARS_PER_TOKEN))
+
+def count_tokens(text: str) -> int:
+    """Estimated token count for text"""
+    if not text:
+        return 0
+    return sum(_piece_tokens(piece) for piece in _TOKEN_PATTERN.findall(text))
+
+def _split_long(sentence: str, max_tokens: int) -> List[str]:
+    """Split one over-long sentence into pieces of at most max_tokens"""
+    pieces = []
+    start = None
+    used = 0
+    last_end = 0
+    for match in _TOKEN_PATTERN.finditer(sentence):
+        tokens = _piece_tokens(match.group())
+        if start is None:
+            start = match.start()
+        elif used + tokens > max_tokens:
+            pieces.append(sentence[start:last_end].strip())
+            start, used = match.start(), 0
+        used += tokens
+        last_end = match.end()
+    if start is not None:
+        pieces.append(sentence[start:last_end].strip())
+    return [piece for piece in pieces if piece]
+
+def chunk_text(text: str, max_tokens: int = 400, overlap_tokens: int = 60) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens, breaking at sentence
+    boundaries where possible. Consecutive chunks share up to overlap_tokens
+    of trailing sentences so facts spanning a boundary stay retrievable.
+    """
+    sentences = []
+    for match in _SENTENCE_PATTERN.finditer(text):
+        sentence = match.group().strip()
+        if not sentence:
+            continue
+        tokens = count_tokens(sentence)
+        if tokens > max_tokens:
+            sentences.extend((piece, count_tokens(piece)) for piece in _split_long(sentence, max_tokens))
+        else:
+            sentences.append((sentence, tokens))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence, tokens in sentences:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(s for s, _ in current))
+            # Carry trailing sentences forward as overlap
+            overlap = []
+            overlap_used = 0
+            for prev_sentence, prev_tokens in reversed(current):
+                if overlap_used + prev_tokens > overlap_tokens or overlap_used + prev_tokens + tokens > max_tokens:
+                    break
+                overlap.insert(0, (prev_sentence, prev_tokens))
+                overlap_used += prev_tokens
+            current, current_tokens = overlap, overlap_used
+        current.append((sentence, tokens))
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(s for s, _ in current))
+    return chunks
@@ -0,0 +1,396 @@
+"""
+Vector store backends for retrieval and ingestion.
+Both backends speak the subset of the Pinecone Index API the app uses
+(upsert / delete / update / query / describe_index_stats), plus records() to
+page through everything stored, so the retriever
+and the ingestion pipeline work unchanged against either:
+- PineconeStore: the hosted index named by PINECONE_INDEX_NAME
+- LocalVectorStore: float32 matrix memory-mapped from disk with exact
+  dot-product search and an optional IVF (inverted file) approximate index,
+  for small/medium corpora, offline runs, tests and benchmarks
+Select with VECTOR_STORE=pinecone|local.
+"""
+from src.config import (
+    PINECONE_INDEX_NAME, VECTOR_STORE, require_setting,
+    LOCAL_VECTOR_STORE_PATH, LOCAL_VECTOR_STORE_NLIST, LOCAL_VECTOR_STORE_NPROBE
+)
+from abc import ABC, abstractmethod
+from typing import Iterator, List
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+
+class VectorStore(ABC):
+    """Interface shared by the vector store backends"""
+
+    @abstractmethod
+    def upsert(self, vectors: List[dict], timeout: float = None):
+        """Insert or replace {"id", "values", "metadata"} records"""
+
+    @abstractmethod
+    def delete(self, ids: List[str], timeout: float = None):
+        """Remove records by id (unknown ids are ignored)"""
+
+    @abstractmethod
+    def update(self, id: str, set_metadata: dict, timeout: float = None):
+        """Merge set_metadata into a stored record's metadata"""
+
+    @abstractmethod
+    def query(self, vector, top_k: int = 5, include_metadata: bool = True, include_values: bool = False, timeout: float = None) -> dict:
+        """
+        Returns: {"matches": [{"id", "score", "metadata"[, "values"]}, ...]}, best first
+        timeout (seconds) bounds a remote call; local stores ignore it
+        (as for every method taking one)
+        """
+
+    @abstractmethod
+    def describe_index_stats(self) -> dict:
+        """Record count and index settings"""
+
+    @abstractmethod
+    def records(self, batch_size: int = 100) -> Iterator[List[dict]]:
+        """Every stored record as batches of {"id", "metadata"} (for rebuilding derived indexes)"""
+
+def _request_options(timeout: float = None) -> dict:
+    """Pinecone client kwargs bounding one request"""
+    return {"_request_timeout": timeout} if timeout else {}
+
+class PineconeStore(VectorStore):
+    """Hosted Pinecone index"""
+
+    def __init__(self, index_name: str = PINECONE_INDEX_NAME, api_key: str = None):
+        from pinecone import Pinecone
+
+        self.index_name = index_name
+        self.index = Pinecone(api_key=api_key or require_setting("PINECONE_API_KEY")).Index(index_name)
+
+    def upsert(self, vectors: List[dict], timeout: float = None):
+        return self.index.upsert(vectors=vectors, **_request_options(timeout))
+
+    def delete(self, ids: List[str], timeout: float = None):
+        return self.index.delete(ids=ids, **_request_options(timeout))
+
+    def update(self, id: str, set_metadata: dict, timeout: float = None):
+        return self.index.update(id=id, set_metadata=set_metadata, **_request_options(timeout))
+
+    def query(self, vector, top_k: int = 5, include_metadata: bool = True, include_values: bool = False, timeout: float = None) -> dict:
+        if isinstance(vector, np.ndarray):
+            vector = vector.tolist()
+        options = _request_options(timeout)
+        return self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=include_metadata,
+            include_values=include_values,
+            **options
+        )
+
+    def describe_index_stats(self) -> dict:
+        return self.index.describe_index_stats()
+
+    def records(self, batch_size: int = 100) -> Iterator[List[dict]]:
+        # list() pages through ids (serverless indexes); fetch() returns their metadata
+        for ids in self.index.list(limit=batch_size):
+            vectors = self.index.fetch(ids=list(ids)).vectors
+            yield [{"id": id_, "metadata": dict(vector.metadata or {})} for id_, vector in vectors.items()]
+
+class LocalVectorStore(VectorStore):
+    """
+    On-disk vector index: vectors.f32 holds a row-major float32 matrix
+    (memory-mapped, grown by doubling) and index.sqlite3 maps ids to rows and
+    holds metadata. Rows stay dense: deleting moves the last row into the gap.
+    Vectors are L2-normalized on write when metric="cosine", so the dot
+    product is the cosine score Pinecone would return.
+
+    One process writes at a time (ingestion); readers in other processes
+    notice commits through SQLite's data_version and remap.
+
+    nlist > 0 enables an IVF index: spherical k-means centroids, and a query
+    scans only the nprobe closest lists. It is trained once the store holds
+    ~40 vectors per list and retrained after the store doubles.
+    """
+
+    def __init__(self, path: str = LOCAL_VECTOR_STORE_PATH, metric: str = "cosine", nlist: int = LOCAL_VECTOR_STORE_NLIST, nprobe: int = LOCAL_VECTOR_STORE_NPROBE):
+        self.path = path
+        self.metric = metric
+        self.nlist = nlist
+        self.nprobe = max(1, nprobe)
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._centroids_path = os.path.join(path, "centroids.npy")
+
+        self._db = sqlite3.connect(os.path.join(path, "index.sqlite3"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS vectors (id TEXT PRIMARY KEY, row INTEGER UNIQUE NOT NULL, metadata TEXT NOT NULL)")
+        self._db.commit()
+        self._load()
+
+    # === Storage ===
+
+    def _setting(self, key: str, default=None):
+        row = self._db.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_setting(self, key: str, value):
+        self._db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _data_version(self) -> int:
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load(self):
+        """(Re)read ids, dimension and matrix mapping from disk"""
+        self.dimension = self._setting("dimension")
+        self.capacity = self._setting("capacity", 0)
+        self.trained_at = self._setting("trained_at", 0)
+        self.ids = [None] * self.count_rows()
+        for id_, row in self._db.execute("SELECT id, row FROM vectors"):
+            self.ids[row] = id_
+        self.rows = {id_: row for row, id_ in enumerate(self.ids)}
+        self._map()
+        self.centroids = None
+        self.assignments = None
+        if self.nlist and os.path.exists(self._centroids_path) and self.trained_at:
+            self.centroids = np.load(self._centroids_path)
+            self.assignments = self._assign(self.matrix[:len(self.ids)])
+        self._version = self._data_version()
+
+    def count_rows(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def _map(self):
+        if self.dimension and self.capacity:
+            self.matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dimension))
+        else:
+            self.matrix = np.empty((0, self.dimension or 0), dtype=np.float32)
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self.capacity:
+            return
+        capacity = max(1024, self.capacity)
+        while capacity < rows:
+            capacity *= 2
+        if isinstance(self.matrix, np.memmap):
+            self.matrix.flush()
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self.capacity = capacity
+        self._set_setting("capacity", capacity)
+        self._map()
+
+    def _refresh(self):
+        """Pick up writes committed by another process"""
+        if self._data_version() != self._version:
+            self._load()
+
+    def _normalize(self, values: np.ndarray) -> np.ndarray:
+        if self.metric != "cosine":
+            return values
+        norms = np.linalg.norm(values, axis=-1, keepdims=True)
+        return values / np.maximum(norms, 1e-12)
+
+    # === IVF ===
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        if self.centroids is None or len(vectors) == 0:
+            return np.empty(0, dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _maybe_train(self):
+        count = len(self.ids)
+        if not self.nlist or count < self.nlist * 40:
+            return
+        if self.centroids is not None and count < self.trained_at * 2:
+            return
+        self.train()
+
+    def train(self, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        """Fit nlist spherical k-means centroids and assign every row"""
+        with self._lock:
+            count = len(self.ids)
+            if not self.nlist or count < self.nlist:
+                return
+            data = self.matrix[:count]
+            rng = np.random.default_rng(seed)
+            sample = data[rng.choice(count, size=min(count, sample_size), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for k in range(self.nlist):
+                    members = sample[labels == k]
+                    if len(members):
+                        centroids[k] = members.mean(axis=0)
+                centroids = self._normalize(centroids)
+            self.centroids = centroids.astype(np.float32)
+            np.save(self._centroids_path, self.centroids)
+            self.assignments = self._assign(data)
+            self.trained_at = count
+            self._set_setting("trained_at", count)
+            self._db.commit()
+            self._version = self._data_version()
+
+    # === VectorStore API ===
+
+    def upsert(self, vectors: List[dict], timeout: float = None):
+        if not vectors:
+            return {"upserted_count": 0}
+        with self._lock:
+            self._refresh()
+            values = self._normalize(np.asarray([v["values"] for v in vectors], dtype=np.float32))
+            if self.dimension is None:
+                self.dimension = int(values.shape[1])
+                self._set_setting("dimension", self.dimension)
+            elif values.shape[1] != self.dimension:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {self.dimension}")
+
+            new_ids = [v["id"] for v in vectors if v["id"] not in self.rows]
+            self._ensure_capacity(len(self.ids) + len(set(new_ids)))
+            touched = []
+            for vector, row_values in zip(vectors, values):
+                row = self.rows.get(vector["id"])
+                if row is None:
+                    row = len(self.ids)
+                    self.ids.append(vector["id"])
+                    self.rows[vector["id"]] = row
+                self.matrix[row] = row_values
+                touched.append(row)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO vectors (id, row, metadata) VALUES (?, ?, ?)",
+                    (vector["id"], row, json.dumps(vector.get("metadata") or {}))
+                )
+            self.matrix.flush()
+            if self.centroids is not None:
+                # Route new/changed rows to their nearest existing list
+                assignments = np.zeros(len(self.ids), dtype=np.int32)
+                assignments[:len(self.assignments)] = self.assignments[:len(self.ids)]
+                touched = np.asarray(touched)
+                assignments[touched] = self._assign(self.matrix[touched])
+                self.assignments = assignments
+            self._db.commit()
+            self._version = self._data_version()
+            self._maybe_train()
+            return {"upserted_count": len(vectors)}
+
+    def delete(self, ids: List[str], timeout: float = None):
+        with self._lock:
+            self._refresh()
+            for id_ in ids:
+                row = self.rows.pop(id_, None)
+                if row is None:
+                    continue
+                self._db.execute("DELETE FROM vectors WHERE id = ?", (id_,))
+                last = len(self.ids) - 1
+                if row != last:
+                    # Keep rows dense: move the last vector into the gap
+                    moved_id = self.ids[last]
+                    self.matrix[row] = self.matrix[last]
+                    self.ids[row] = moved_id
+                    self.rows[moved_id] = row
+                    self._db.execute("UPDATE vectors SET row = ? WHERE id = ?", (row, moved_id))
+                    if self.assignments is not None and len(self.assignments) > last:
+                        self.assignments[row] = self.assignments[last]
+                self.ids.pop()
+                if self.assignments is not None and len(self.assignments) > len(self.ids):
+                    self.assignments = self.assignments[:len(self.ids)]
+            if isinstance(self.matrix, np.memmap):
+                self.matrix.flush()
+            self._db.commit()
+            self._version = self._data_version()
+            return {}
+
+    def update(self, id: str, set_metadata: dict, timeout: float = None):
+        with self._lock:
+            row = self._db.execute("SELECT metadata FROM vectors WHERE id = ?", (id,)).fetchone()
+            if row is None:
+                return {}
+            metadata = json.loads(row[0])
+            metadata.update(set_metadata)
+            self._db.execute("UPDATE vectors SET metadata = ? WHERE id = ?", (json.dumps(metadata), id))
+            self._db.commit()
+            self._version = self._data_version()
+            return {}
+
+    def query(self, vector, top_k: int = 5, include_metadata: bool = True, include_values: bool = False, timeout: float = None) -> dict:
+        with self._lock:
+            self._refresh()
+            count = len(self.ids)
+            if count == 0 or top_k <= 0:
+                return {"matches": []}
+            query = self._normalize(np.asarray(vector, dtype=np.float32))
+
+            if self.centroids is not None and self.assignments is not None and len(self.assignments) == count:
+                probe = np.argsort(self.centroids @ query)[-self.nprobe:]
+                candidates = np.flatnonzero(np.isin(self.assignments, probe))
+                if len(candidates) < top_k:
+                    candidates = None  # Too few in the probed lists: exact scan
+            else:
+                candidates = None
+
+            if candidates is not None:
+                scores = self.matrix[candidates] @ query
+            else:
+                scores = self.matrix[:count] @ query
+
+            k = min(top_k, len(scores))
+            if k == 0:
+                return {"matches": []}
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            rows = candidates[best] if candidates is not None else best
+
+            matches = [{"id": self.ids[row], "score": float(scores[i])} for i, row in zip(best, rows)]
+            if include_values:
+                for match, row in zip(matches, rows):
+                    match["values"] = self.matrix[row].tolist()
+            if include_metadata:
+                placeholders = ",".join("?" * len(matches))
+                metadata = dict(self._db.execute(
+                    f"SELECT id, metadata FROM vectors WHERE id IN ({placeholders})",
+                    [match["id"] for match in matches]
+                ).fetchall())
+                for match in matches:
+                    match["metadata"] = json.loads(metadata.get(match["id"], "{}"))
+            return {"matches": matches}
+
+    def describe_index_stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "total_vector_count": len(self.ids),
+                "dimension": self.dimension,
+                "backend": "local",
+                "metric": self.metric,
+                "ivf_lists": len(self.centroids) if self.centroids is not None else 0,
+                "nprobe": self.nprobe
+            }
+
+    def records(self, batch_size: int = 100) -> Iterator[List[dict]]:
+        last_id = ""
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, metadata FROM vectors WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [{"id": id_, "metadata": json.loads(metadata)} for id_, metadata in rows]
+            last_id = rows[-1][0]
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_vector_store() -> VectorStore:
+    """The configured vector store (created on first use, shared per process)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if VECTOR_STORE == "local":
+                    _store = LocalVectorStore()
+                else:
+                    _store = PineconeStore()
+    return _store
@@ -0,0 +1,24 @@
+"""Context budgeter: merged chunks are ranked by score before dedup and truncation"""
+from src.context import assemble_context
+from src.tokens import count_tokens
+
+FRESH = {"id": "fresh", "text": "Apples and pears are a source of fibre for digestion.", "score": 0.41}
+KEYWORD = {"id": "keyword", "text": "Zinc lozenges are sometimes taken at the first sign of a cold.", "score": None}
+CACHED = {"id": "cached", "text": "Magnesium glycinate taken in the evening may improve sleep quality.", "score": 0.83}
+CACHED_COPY = {"id": "cached-copy", "text": "Magnesium glycinate taken in the evening may improve sleep quality!", "score": 0.80}
+
+def test_budget_goes_to_the_highest_scored_chunk():
+    # Fresh results come first in the merged list, cached ones after
+    budget = count_tokens(CACHED["text"])
+    _, kept, _ = assemble_context([FRESH, KEYWORD, CACHED], budget=budget)
+    assert [chunk["id"] for chunk in kept] == ["cached"]
+
+def test_duplicates_keep_the_higher_scored_copy():
+    _, kept, report = assemble_context([CACHED_COPY, FRESH, CACHED])
+    assert [chunk["id"] for chunk in kept] == ["cached", "fresh"]
+    assert report["duplicates_dropped"] == 1
+
+def test_unscored_chunks_follow_in_their_given_order():
+    other = {**KEYWORD, "id": "keyword-2", "text": "Elderberry syrup is a traditional winter remedy."}
+    _, kept, _ = assemble_context([KEYWORD, FRESH, other])
+    assert [chunk["id"] for chunk in kept] == ["fresh", "keyword", "keyword-2"]
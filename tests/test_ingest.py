@@ -0,0 +1,114 @@
+"""Incremental re-ingestion: editing one chunk must not touch the others"""
+from types import SimpleNamespace
+
+import pytest
+
+from src.ingest import IngestionManifest, build_chunks, ingest_document
+from src.scheduler import get_cohere_scheduler
+from src.tokens import count_tokens
+from src.vector_store import LocalVectorStore
+
+FILENAME = "herbs.txt"
+
+class FakeCohere:
+    """Cohere stand-in that counts embed calls and returns fixed-size vectors"""
+
+    def __init__(self):
+        self.calls = 0
+        self.texts = 0
+
+    def embed(self, texts, model, input_type, request_options=None):
+        self.calls += 1
+        self.texts += len(texts)
+        return SimpleNamespace(embeddings=[[float(len(text) % 7 + 1), 1.0, 0.5, 0.25] for text in texts])
+
+class CountingStore(LocalVectorStore):
+    """Local store that counts the writes an ingestion makes"""
+
+    def __init__(self, path):
+        super().__init__(path, nlist=0)
+        self.upserted = 0
+        self.updates = 0
+
+    def upsert(self, vectors, timeout=None):
+        self.upserted += len(vectors)
+        return super().upsert(vectors, timeout=timeout)
+
+    def update(self, id, set_metadata, timeout=None):
+        self.updates += 1
+        return super().update(id, set_metadata, timeout=timeout)
+
+def large_document(sentences=120):
+    return " ".join(f"Sentence {i} says that herb number {i} helps with rest." for i in range(sentences))
+
+@pytest.fixture
+def store(tmp_path):
+    return CountingStore(str(tmp_path / "vectors"))
+
+def test_editing_one_chunk_reembeds_only_that_chunk(store, tmp_path):
+    co = FakeCohere()
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    original = large_document()
+    first = ingest_document(store, co, FILENAME, original, manifest=manifest)
+    chunks = build_chunks(FILENAME, original)
+    assert len(chunks) > 3
+    assert first["embedded"] == len(chunks)
+
+    # Edit a sentence that sits in exactly one chunk, keeping its token count
+    # so no chunk boundary moves
+    sentence = next(
+        f"herb number {i} helps"
+        for i in range(len(chunks), 120)
+        if sum(f"herb number {i} helps" in chunk["text"] for chunk in chunks) == 1
+    )
+    replacement = sentence.replace("helps", "soothes")
+    assert count_tokens(sentence) == count_tokens(replacement)
+    edited = original.replace(sentence, replacement)
+
+    co.calls = co.texts = 0
+    store.upserted = store.updates = 0
+    second = ingest_document(store, co, FILENAME, edited, manifest=manifest)
+
+    assert second["embedded"] == 1
+    assert second["deleted"] == 1
+    assert co.calls == 1 and co.texts == 1
+    assert store.upserted == 1
+    assert store.updates == 0
+
+def test_growing_document_does_not_rewrite_existing_chunks(store, tmp_path):
+    co = FakeCohere()
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    original = large_document()
+    ingest_document(store, co, FILENAME, original, manifest=manifest)
+    grown = original + " " + " ".join(f"Appendix note {i} covers chamomile tea." for i in range(40))
+    before = {chunk["hash"] for chunk in build_chunks(FILENAME, original)}
+    after = build_chunks(FILENAME, grown)
+    assert len(after) > len(before)
+
+    co.texts = 0
+    store.upserted = store.updates = 0
+    result = ingest_document(store, co, FILENAME, grown, manifest=manifest)
+
+    changed = [chunk for chunk in after if chunk["hash"] not in before]
+    assert result["embedded"] == len(changed) == co.texts == store.upserted
+    assert store.updates == 0
+
+def test_embeds_queue_as_background_work(store, tmp_path):
+    co = FakeCohere()
+    before = get_cohere_scheduler().stats()["admitted"].get("background", 0)
+
+    ingest_document(store, co, FILENAME, large_document(), manifest=IngestionManifest(str(tmp_path / "manifest.json")))
+
+    assert get_cohere_scheduler().stats()["admitted"].get("background", 0) - before == co.calls
+
+def test_unchanged_document_is_skipped(store, tmp_path):
+    co = FakeCohere()
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    ingest_document(store, co, FILENAME, large_document(), manifest=manifest)
+    co.calls = 0
+    store.upserted = 0
+
+    result = ingest_document(store, co, FILENAME, large_document(), manifest=manifest)
+
+    assert result["skipped"]
+    assert co.calls == 0 and store.upserted == 0
@@ -0,0 +1,21 @@
+"""Retrieval planner: follow-up detection must not swallow new questions"""
+import pytest
+
+from src.planner import plan_retrieval
+
+CONVERSATION = "User: How can I improve my sleep quality?\nAssistant: Keep a regular bedtime routine."
+
+@pytest.mark.parametrize("query", [
+    "why is magnesium good for sleep",
+    "and what about zinc for immunity?",
+    "more protein sources for vegans",
+])
+def test_new_question_after_follow_up_opener_is_retrieved(query):
+    plan = plan_retrieval(query, 0.9, CONVERSATION, has_previous=True)
+    assert plan["action"] == "retrieve"
+    assert plan["query"] == query
+
+@pytest.mark.parametrize("query", ["why?", "tell me more", "why is that"])
+def test_bare_follow_up_reuses_previous_chunks(query):
+    plan = plan_retrieval(query, 0.9, CONVERSATION, has_previous=True)
+    assert plan["action"] == "reuse"